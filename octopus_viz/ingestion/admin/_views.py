@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from django import urls
 from django.contrib.admin import ModelAdmin
 from django.db.models import Count
@@ -47,7 +49,7 @@ class MPANAdminView(ModelAdmin):
             attached_api_key_count=Count('api_key'),
             attached_meter_count=Count('meter'),
         )
-        return queryset
+        return MeterFilters.annotate_readings(queryset)
 
     @classmethod
     def has_api_key(cls, obj: models.MPAN):
@@ -61,14 +63,11 @@ class MPANAdminView(ModelAdmin):
     @classmethod
     def readings_link(cls, obj: models.MPAN):
         url = urls.reverse(f'admin:{obj._meta.app_label}_consumption_changelist') + f'?q={obj.mpan}'
-        # TODO(tr) as part of the query instead of post query
-        number_of_readings = models.Consumption.objects.filter(meter__mpan=obj).count()
-        return format_html(f'<a class="viewlink" href="{url}">{number_of_readings} readings</a>')
+        return format_html(f'<a class="viewlink" href="{url}">{obj.reading_count} readings</a>')
 
     @classmethod
-    def last_reading(cls, obj: models.MPAN) -> models.Consumption:
-        # TODO(tr) as part of the query instead of post query
-        return MeterFilters(obj).get_latest_consumption().interval_start
+    def last_reading(cls, obj: models.MPAN) -> datetime | None:
+        return obj.last_reading
 
 
 class MeterAdminView(ModelAdmin):
@@ -88,10 +87,7 @@ class MeterAdminView(ModelAdmin):
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            reading_count=Count('consumption'),
-        )
-        return queryset
+        return MeterFilters.annotate_readings(queryset)
 
     @classmethod
     def mpan_link(cls, obj: models.Meter):
@@ -101,13 +97,11 @@ class MeterAdminView(ModelAdmin):
     @classmethod
     def readings_link(cls, obj: models.MPAN):
         url = urls.reverse(f'admin:{obj._meta.app_label}_consumption_changelist') + f'?q={obj.serial}'
-        # number_of_readings = models.Consumption.objects.filter(meter=obj).count()
         return format_html(f'<a class="viewlink" href="{url}">{obj.reading_count} readings</a>')
 
     @classmethod
-    def last_reading(cls, obj: models.Meter):
-        # TODO(tr) as part of the query instead of post query
-        return MeterFilters(obj).get_latest_consumption().interval_start
+    def last_reading(cls, obj: models.Meter) -> datetime | None:
+        return obj.last_reading
 
 
 class ConsumptionAdminView(ModelAdmin):
@@ -117,7 +111,7 @@ class ConsumptionAdminView(ModelAdmin):
         '-interval_start',
         'meter__serial',
     )
-    list_select_related = ('meter', 'meter__mpan', 'rate')
+    list_select_related = ('meter', 'meter__mpan', 'tariff')
     readonly_fields = [field.name for field in models.Consumption._meta.get_fields()]
 
     @classmethod
@@ -156,9 +150,9 @@ class ConsumptionAdminView(ModelAdmin):
 
     @classmethod
     def unit_rate(cls, obj: models.Consumption):
-        if obj.rate:
-            return f'{obj.rate.unit_rate:.4f}'
-        elif obj.tariff:
+        if obj.rate_id is not None and obj.unit_rate is not None:
+            return f'{obj.unit_rate:.4f}'
+        elif obj.tariff_id is not None:
             return 'default rate'
         return None
 
@@ -181,9 +175,16 @@ class TariffAdminView(ModelAdmin):
         'direction',
     )
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        queryset = queryset.annotate(
+            rate_count=Count('rate'),
+        )
+        return queryset
+
     @classmethod
     def rates(cls, obj: models.Tariff):
-        n_rates = models.Rate.objects.filter(tariff=obj).count()
+        n_rates = obj.rate_count
         label = f'{n_rates} rates'
         if n_rates < 0:
             return label
@@ -208,8 +209,8 @@ class RateAdminView(ModelAdmin):
 
     @classmethod
     def tariff_link(cls, obj: models.Rate):
-        url = urls.reverse(f'admin:{obj._meta.app_label}_tariff_changelist') + f'q={obj.tariff.name}'
-        return format_html(f'<a class="viewlink" href="{url}">{obj.tariff}')
+        url = urls.reverse(f'admin:{obj._meta.app_label}_tariff_changelist') + f'?q={obj.tariff.name}'
+        return format_html(f'<a class="viewlink" href="{url}">{obj.tariff}</a>')
 
     @classmethod
     def tariff_currency(cls, obj: models.Rate):
@@ -1,4 +1,5 @@
 import abc
+import dataclasses
 from typing import Iterable, Self
 
 from django.utils.translation import gettext as _
@@ -75,8 +76,44 @@ class TariffAggregator(ConsumptionAggregator):
         self.by_price = by_price
 
     def _key(self, row: models.Consumption) -> str:
+        if row.rate is None:
+            # like PeriodAggregator, the readings without a rate are not priced
+            return _('detached')
         if self.by_price:
             return format_currency(row.rate.unit_rate, row.tariff.currency)
         st = row.rate.interval_from.strftime(self.interval_from_fmt)
         ed = row.rate.interval_end.strftime(self.interval_from_fmt)
         return f'{st} - {ed}'
+
+
+class NetAggregator(ConsumptionAggregator):
+    """The imported minus the exported, per key of the aggregators of the 2 directions.
+
+    The price is the cost of the import minus the earnings of the export: the net position.
+    """
+
+    def _key(self, row: models.Consumption):
+        raise TypeError('The net is computed from the aggregated directions, see `subtract`')
+
+    def subtract(self, importing: ConsumptionAggregator, exporting: ConsumptionAggregator) -> Self:
+        for key in importing.data.keys() | exporting.data.keys():
+            imported, exported = importing.data.get(key), exporting.data.get(key)
+            if imported is None:
+                item = ConsumptionPrice(0.0, exported.metric_unit, exported.earliest, exported.latest, None, None)
+            else:
+                item = dataclasses.replace(imported)
+            if exported is not None:
+                if item.metric_unit != exported.metric_unit:
+                    raise ValueError(f'Cannot subtract different units: {item.metric_unit} and {exported.metric_unit}')
+                item.consumption -= exported.consumption
+                item.earliest = min(item.earliest, exported.earliest)
+                item.latest = max(item.latest, exported.latest)
+                if exported.price is not None:
+                    item.price = (item.price or 0.0) - exported.price
+                if item.currency is None:
+                    item.currency = exported.currency
+            self.data[key] = item
+
+        self._metric_unit = importing.metric_unit or exporting.metric_unit
+        self._currency = importing.currency or exporting.currency
+        return self
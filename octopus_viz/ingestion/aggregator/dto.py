@@ -25,7 +25,7 @@ class ConsumptionPrice:
         self.latest = max(self.latest, other.latest)
 
         if other.price is not None:
-            self.price += other.price
+            self.price = other.price if self.price is None else self.price + other.price
         if self.currency is None:
             self.currency = other.currency
 
@@ -0,0 +1,135 @@
+import datetime
+from typing import Self
+
+from django.db import models as db_models
+from django.db.models import F, Max, Min, QuerySet, Sum
+from django.db.models.functions import TruncTime
+from django.utils.translation import gettext as _
+
+from ingestion import models
+from ingestion.aggregator.consumption import PeriodAggregator, TariffAggregator
+from ingestion.aggregator.dto import ConsumptionPrice
+from ingestion.utils import format_currency
+
+
+class SqlAggregatorMixin:
+    """Aggregate with a single GROUP BY query instead of converting every row.
+
+    Works on Consumption and ConsumptionRollup querysets and fills `data` with the same keys and
+    ConsumptionPrice values as the python aggregator it is mixed with. `process_directions` reads
+    both directions in the same query.
+    """
+
+    @classmethod
+    def _columns(cls, model: type[db_models.Model]) -> dict:
+        if model is models.ConsumptionRollup:
+            return {
+                'slot': F('slot'),
+                'cost': F('cost'),
+                'earliest': 'earliest',
+                'latest': 'latest',
+                'direction': F('direction'),
+            }
+        return {
+            # like interval_start.strftime() on the datetime from the database
+            'slot': TruncTime('interval_start', tzinfo=datetime.UTC),
+            'cost': F('cost'),
+            'earliest': 'interval_start',
+            'latest': 'interval_end',
+            'direction': F('meter__mpan__direction'),
+        }
+
+    def _group_by(self, columns: dict) -> dict:
+        """Expressions of the GROUP BY clause, in addition to the unit and currency"""
+        raise NotImplementedError()
+
+    def _group_key(self, group: dict) -> str:
+        raise NotImplementedError()
+
+    @classmethod
+    def _groups(cls, data: QuerySet, columns: dict, group_by: dict) -> QuerySet:
+        return (
+            data
+            .order_by()
+            .annotate(**group_by)
+            .values(*group_by, 'meter__metric_unit', 'tariff__currency')
+            .annotate(
+                total_consumption=Sum('consumption'),
+                total_cost=Sum(columns['cost']),
+                first_interval=Min(columns['earliest']),
+                last_interval=Max(columns['latest']),
+            )
+        )
+
+    def _add(self, group: dict):
+        item = ConsumptionPrice(
+            group['total_consumption'],
+            models.MetricUnit(group['meter__metric_unit']).label,
+            group['first_interval'],
+            group['last_interval'],
+            group['total_cost'],
+            group['tariff__currency'],
+        )
+        key = self._group_key(group)
+        present = self.data.get(key)
+        if present is None:
+            self.data[key] = item
+        else:
+            present += item
+
+        if self._metric_unit is None:
+            self._metric_unit = item.metric_unit
+        if self._currency is None:
+            self._currency = item.currency
+
+    def process(self, data: QuerySet) -> Self:
+        columns = self._columns(data.model)
+        for group in self._groups(data, columns, self._group_by(columns)):
+            self._add(group)
+        return self
+
+    @classmethod
+    def process_directions(cls, data: QuerySet, **kwargs) -> dict[models.Direction, Self]:
+        """An aggregator per direction, from a single query grouped by direction as well.
+
+        kwargs are given to the constructor of the aggregators.
+        """
+        aggregators = {direction: cls(**kwargs) for direction in models.Direction}
+        columns = cls._columns(data.model)
+        group_by = aggregators[models.Direction.IMPORTING]._group_by(columns)
+        group_by['group_direction'] = columns['direction']
+        for group in cls._groups(data, columns, group_by):
+            aggregators[group['group_direction']]._add(group)
+        return aggregators
+
+
+class SqlPeriodAggregator(SqlAggregatorMixin, PeriodAggregator):
+    def _group_by(self, columns: dict) -> dict:
+        return {
+            'group_slot': columns['slot'],
+            'group_rate': F('rate_id'),
+        }
+
+    def _group_key(self, group: dict) -> str:
+        if group['group_rate'] is None:
+            return _('detached')
+        return group['group_slot'].strftime(self.interval_start_fmt)
+
+
+class SqlTariffAggregator(SqlAggregatorMixin, TariffAggregator):
+    def _group_by(self, columns: dict) -> dict:
+        return {
+            'group_rate': F('rate_id'),
+            'group_unit_rate': F('rate__unit_rate'),
+            'group_interval_from': F('rate__interval_from'),
+            'group_interval_end': F('rate__interval_end'),
+        }
+
+    def _group_key(self, group: dict) -> str:
+        if group['group_rate'] is None:
+            return _('detached')
+        if self.by_price:
+            return format_currency(group['group_unit_rate'], group['tariff__currency'])
+        st = group['group_interval_from'].strftime(self.interval_from_fmt)
+        ed = group['group_interval_end'].strftime(self.interval_from_fmt)
+        return f'{st} - {ed}'
@@ -0,0 +1,248 @@
+import abc
+import dataclasses
+import itertools
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime
+from typing import ClassVar
+
+from django.db.models import QuerySet, Sum
+from django.utils import timezone
+
+from ingestion import models
+
+# (seconds since epoch, value)
+Sample = tuple[float, float]
+
+
+class Downsampler(abc.ABC):
+    """Reduce samples ordered by time to at most `points` samples, in a single pass.
+
+    [start ; end[ is split into buckets of the same duration, only the samples of the last one
+    or two buckets are kept in memory. No more than `points` samples are returned unchanged.
+    """
+
+    MIN_POINTS = 4
+
+    def __init__(self, start: float, end: float, points: int):
+        if points < self.MIN_POINTS:
+            raise ValueError(f'At least {self.MIN_POINTS} points are required, not {points}')
+        if end <= start:
+            raise ValueError(f'The end {end} is not after the start {start}')
+        self.start = start
+        self.end = end
+        self.points = points
+        self.buckets = self._buckets()
+        self.width = (end - start) / self.buckets
+
+    @abc.abstractmethod
+    def _buckets(self) -> int: ...
+
+    def bucket(self, t: float) -> int:
+        return min(int((t - self.start) / self.width), self.buckets - 1)
+
+    def _bucketed(self, samples: Iterable[Sample]) -> Iterator[list[Sample]]:
+        """The samples of each bucket which has any, in order"""
+        current: list[Sample] = []
+        current_bucket = None
+        for sample in samples:
+            bucket = self.bucket(sample[0])
+            if bucket != current_bucket and current:
+                yield current
+                current = []
+            current_bucket = bucket
+            current.append(sample)
+        if current:
+            yield current
+
+    @abc.abstractmethod
+    def _process(self, samples: Iterable[Sample]) -> Iterator[Sample]: ...
+
+    def process(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        iterator = iter(samples)
+        head = list(itertools.islice(iterator, self.points + 1))
+        if len(head) <= self.points:
+            yield from head
+        else:
+            yield from self._process(itertools.chain(head, iterator))
+
+
+class MinMaxDownsampler(Downsampler):
+    """The lowest and highest sample of each bucket, in time order: keeps the peaks"""
+
+    def _buckets(self) -> int:
+        return self.points // 2
+
+    def _process(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        for bucket in self._bucketed(samples):
+            low = min(bucket, key=lambda sample: sample[1])
+            high = max(bucket, key=lambda sample: sample[1])
+            if low is high:
+                yield low
+            else:
+                yield from sorted((low, high))
+
+
+class LttbDownsampler(Downsampler):
+    """Largest-Triangle-Three-Buckets: the first and last samples, then in each bucket the sample
+    making the largest triangle with the sample kept for the previous bucket and the average of the
+    next bucket. Keeps the shape of the line.
+    """
+
+    def _buckets(self) -> int:
+        return self.points - 2
+
+    @classmethod
+    def _average(cls, bucket: list[Sample]) -> Sample:
+        return sum(t for t, _ in bucket) / len(bucket), sum(y for _, y in bucket) / len(bucket)
+
+    @classmethod
+    def _largest_triangle(cls, previous: Sample, bucket: list[Sample], following: Sample) -> Sample:
+        (at, ay), (ct, cy) = previous, following
+        return max(bucket, key=lambda b: abs((at - ct) * (b[1] - ay) - (at - b[0]) * (cy - ay)))
+
+    def _process(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        iterator = iter(samples)
+        first = next(iterator, None)
+        if first is None:
+            return
+        yield first
+
+        previous = first
+        pending: list[Sample] | None = None
+        for bucket in self._bucketed(iterator):
+            if pending is not None:
+                previous = self._largest_triangle(previous, pending, self._average(bucket))
+                yield previous
+            pending = bucket
+
+        if pending is None:
+            return
+        last = pending.pop()
+        if pending:
+            yield self._largest_triangle(previous, pending, last)
+        yield last
+
+
+DOWNSAMPLERS: dict[str, type[Downsampler]] = {
+    'lttb': LttbDownsampler,
+    'minmax': MinMaxDownsampler,
+}
+
+
+@dataclasses.dataclass
+class TimeSeries:
+    """A line of the readings of a direction between 2 days, downsampled while it is read.
+
+    The buckets of all the meters are summed per start by the database and streamed ordered by
+    time, the memory does not depend on the length of the period. They are read from the level of
+    the pyramid given by resolution, or picked by `downsample()` from the points requested when it
+    is None: the number of rows read depends on the points, not on the period.
+    """
+
+    direction: models.Direction
+    start: date
+    end: date
+    show_price: bool = False
+    resolution: models.Resolution | None = None
+    chunk_size: ClassVar[int] = 5000
+
+    # computed while reading the samples
+    total_consumption: float = dataclasses.field(default=0.0, init=False)
+    total_price: float = dataclasses.field(default=0.0, init=False)
+    slots: int = dataclasses.field(default=0, init=False)
+
+    @classmethod
+    def moment(cls, day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def buckets(self, resolution: models.Resolution) -> int | None:
+        """Number of buckets of the level between start and end, None if they are not aligned"""
+        days = (self.end - self.start).days
+        if resolution == models.Resolution.HALF_HOUR:
+            return days * 48
+        if resolution == models.Resolution.HOUR:
+            return days * 24
+        if resolution == models.Resolution.DAY:
+            return days
+        if resolution == models.Resolution.WEEK:
+            if self.start.weekday() == 0 and self.end.weekday() == 0:
+                return days // 7
+            return None
+        if self.start.day == 1 and self.end.day == 1:
+            return (self.end.year - self.start.year) * 12 + self.end.month - self.start.month
+        return None
+
+    def pick_resolution(self, points: int) -> models.Resolution:
+        """The coarsest level with at least points buckets, so that the line keeps the pixels.
+
+        The weeks and months are used only when the period starts and ends on their boundaries,
+        their buckets would hold readings out of the period otherwise.
+        """
+        for resolution in reversed(models.PyramidConsumption.LEVELS):
+            buckets = self.buckets(resolution)
+            if buckets is not None and buckets >= points:
+                return resolution
+        return models.Resolution.HALF_HOUR
+
+    def queryset(self) -> QuerySet:
+        """(seconds since epoch, consumption, cost) of each bucket of the level, ordered by time"""
+        if self.resolution not in (None, models.Resolution.HALF_HOUR):
+            return (
+                models.ConsumptionLevel.objects
+                .filter(
+                    resolution=self.resolution,
+                    direction=self.direction,
+                    start__gte=self.moment(self.start),
+                    start__lt=self.moment(self.end),
+                )
+                .order_by()
+                .values(epoch=models.UnixEpoch('start'))
+                .annotate(consumption=Sum('consumption'), cost=Sum('cost'))
+                .order_by('epoch')
+                .values_list('epoch', 'consumption', 'cost')
+            )
+        return (
+            models.Consumption.objects
+            .filter(
+                interval_start__gte=self.moment(self.start),
+                interval_start__lt=self.moment(self.end),
+                meter__mpan__direction=self.direction,
+            )
+            .order_by()
+            .values(epoch=models.UnixEpoch('interval_start'))
+            .annotate(consumption=Sum('consumption'), cost=Sum('cost'))
+            .order_by('epoch')
+            .values_list('epoch', 'consumption', 'cost')
+        )
+
+    def samples(self) -> Iterator[Sample]:
+        """Consumption or price of each bucket, the totals are computed on the way"""
+        for epoch, consumption, cost in self.queryset().iterator(chunk_size=self.chunk_size):
+            self.slots += 1
+            self.total_consumption += consumption
+            self.total_price += cost or 0.0
+            if self.show_price:
+                if cost is not None:
+                    yield epoch, cost
+            else:
+                yield epoch, consumption
+
+    def downsample(self, points: int, method: str = 'lttb') -> list[Sample]:
+        if self.resolution is None:
+            self.resolution = self.pick_resolution(points)
+        downsampler = DOWNSAMPLERS[method](
+            self.moment(self.start).timestamp(),
+            self.moment(self.end).timestamp(),
+            points,
+        )
+        return list(downsampler.process(self.samples()))
+
+    def metric_unit(self) -> str:
+        metric_unit = (
+            models.Meter.objects.filter(mpan__direction=self.direction).values_list('metric_unit', flat=True).first()
+        )
+        return models.MetricUnit(metric_unit).label if metric_unit is not None else ''
+
+    def currency(self) -> str:
+        currency = models.Tariff.objects.filter(direction=self.direction).values_list('currency', flat=True).first()
+        return currency or ''
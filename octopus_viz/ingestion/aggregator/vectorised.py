@@ -0,0 +1,178 @@
+import dataclasses
+import datetime
+from typing import Self
+
+from django.db.models import QuerySet
+from django.utils.translation import gettext as _
+
+from ingestion import models
+from ingestion.aggregator.consumption import PeriodAggregator, TariffAggregator
+from ingestion.aggregator.dto import ConsumptionPrice
+from ingestion.utils import format_currency
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed by these aggregators
+    np = None
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+@dataclasses.dataclass
+class ConsumptionColumns:
+    """Readings loaded as parallel arrays, one element per reading"""
+
+    start: 'np.ndarray'  # interval_start as seconds since epoch
+    end: 'np.ndarray'  # interval_end as seconds since epoch
+    consumption: 'np.ndarray'
+    unit_price: 'np.ndarray'  # nan when the reading has no price
+    rate_id: 'np.ndarray'  # -1 when detached
+    has_tariff: 'np.ndarray'
+    meter_id: 'np.ndarray'
+    metric_unit: str | None = None
+    currency: str | None = None
+
+    def __len__(self):
+        return len(self.consumption)
+
+    @classmethod
+    def from_queryset(cls, queryset: QuerySet) -> Self:
+        if np is None:
+            raise RuntimeError('numpy is required for the vectorised aggregators: pip install numpy')
+
+        rows = queryset.values_list(
+            models.UnixEpoch('interval_start'),
+            models.UnixEpoch('interval_end'),
+            'consumption',
+            'unit_rate',
+            'rate_id',
+            'tariff_id',
+            'meter_id',
+            'meter__metric_unit',
+            'tariff__currency',
+        )
+        # transpose the rows into one tuple per column
+        transposed = list(zip(*rows.iterator(chunk_size=10_000))) or [()] * 9
+        start, end, consumption, unit_rate, rate_id, tariff_id, meter_id, metric_units, currencies = transposed
+
+        has_tariff = np.array([t is not None for t in tariff_id], dtype=bool)
+
+        return cls(
+            start=np.array(start, dtype=np.int64),
+            end=np.array(end, dtype=np.int64),
+            consumption=np.array(consumption, dtype=float),
+            unit_price=np.array(unit_rate, dtype=float),
+            rate_id=np.array([-1 if r is None else r for r in rate_id], dtype=np.int64),
+            has_tariff=has_tariff,
+            meter_id=np.array(meter_id, dtype=np.int64),
+            metric_unit=models.MetricUnit(metric_units[0]).label if metric_units else None,
+            currency=next((c for c in currencies if c is not None), None),
+        )
+
+
+class VectorisedAggregatorMixin:
+    """Aggregate columns of readings with numpy instead of one ConsumptionPrice per row.
+
+    Each reading gets an integer group code, the readings are sorted by code and every group is
+    reduced with `ufunc.reduceat`. Assumes a single metric unit and currency like the python
+    aggregators do.
+    """
+
+    def _codes(self, columns: ConsumptionColumns) -> tuple['np.ndarray', list[str]]:
+        """The group code of every reading and the key of every code"""
+        raise NotImplementedError()
+
+    def process(self, data: QuerySet) -> Self:
+        return self.process_columns(ConsumptionColumns.from_queryset(data))
+
+    def process_columns(self, columns: ConsumptionColumns) -> Self:
+        if not len(columns):
+            return self
+
+        codes, keys = self._codes(columns)
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+
+        cost = columns.consumption[order] * columns.unit_price[order]
+        priced = ~np.isnan(cost)
+        consumption = np.add.reduceat(columns.consumption[order], bounds)
+        prices = np.add.reduceat(np.where(priced, cost, 0.0), bounds)
+        n_priced = np.add.reduceat(priced.astype(np.int64), bounds)
+        n_tariff = np.add.reduceat(columns.has_tariff[order].astype(np.int64), bounds)
+        earliest = np.minimum.reduceat(columns.start[order], bounds)
+        latest = np.maximum.reduceat(columns.end[order], bounds)
+
+        for i, code in enumerate(codes[bounds]):
+            item = ConsumptionPrice(
+                float(consumption[i]),
+                columns.metric_unit,
+                datetime.datetime.fromtimestamp(int(earliest[i]), datetime.UTC),
+                datetime.datetime.fromtimestamp(int(latest[i]), datetime.UTC),
+                float(prices[i]) if n_priced[i] else None,
+                columns.currency if n_tariff[i] else None,
+            )
+            key = keys[code]
+            present = self.data.get(key)
+            if present is None:
+                self.data[key] = item
+            else:
+                present += item
+
+        if self._metric_unit is None:
+            self._metric_unit = columns.metric_unit
+        if self._currency is None:
+            self._currency = columns.currency
+        return self
+
+
+class VectorisedPeriodAggregator(VectorisedAggregatorMixin, PeriodAggregator):
+    """PeriodAggregator with buckets of any width (30 minutes by default) and optionally per month.
+
+    With by_month the keys are prefixed by the month (e.g. "2024-03 02:00") to compare months.
+    """
+
+    def __init__(self, interval_start_fmt: str = '%H:%M', *, bucket_minutes: int = 30, by_month: bool = False):
+        super().__init__(interval_start_fmt)
+        if bucket_minutes < 1 or (24 * 60) % bucket_minutes:
+            raise ValueError(f'A day must be split into buckets of whole minutes, not {bucket_minutes}')
+        self.bucket_seconds = bucket_minutes * 60
+        self.by_month = by_month
+
+    def _codes(self, columns: ConsumptionColumns) -> tuple['np.ndarray', list[str]]:
+        buckets_per_day = SECONDS_PER_DAY // self.bucket_seconds
+        slot_keys = [
+            (datetime.datetime.min + datetime.timedelta(seconds=i * self.bucket_seconds)).strftime(
+                self.interval_start_fmt,
+            )
+            for i in range(buckets_per_day)
+        ]
+        # last code is for the readings without rate
+        slots = np.where(
+            columns.rate_id < 0,
+            buckets_per_day,
+            (columns.start % SECONDS_PER_DAY) // self.bucket_seconds,
+        )
+        detached = _('detached')
+        if not self.by_month:
+            return slots, [*slot_keys, detached]
+
+        months = columns.start.astype('datetime64[s]').astype('datetime64[M]')
+        unique_months, month_codes = np.unique(months, return_inverse=True)
+        keys = [f'{month} {slot}' for month in unique_months.astype(str) for slot in [*slot_keys, detached]]
+        return month_codes * (buckets_per_day + 1) + slots, keys
+
+
+class VectorisedTariffAggregator(VectorisedAggregatorMixin, TariffAggregator):
+    def _rate_key(self, rate: models.Rate) -> str:
+        if self.by_price:
+            return format_currency(rate.unit_rate, rate.tariff.currency)
+        st = rate.interval_from.strftime(self.interval_from_fmt)
+        ed = rate.interval_end.strftime(self.interval_from_fmt)
+        return f'{st} - {ed}'
+
+    def _codes(self, columns: ConsumptionColumns) -> tuple['np.ndarray', list[str]]:
+        rate_ids, codes = np.unique(columns.rate_id, return_inverse=True)
+        rates = models.Rate.objects.select_related('tariff').in_bulk([int(r) for r in rate_ids if r >= 0])
+        keys = [self._rate_key(rates[int(r)]) if r >= 0 else _('detached') for r in rate_ids]
+        return codes, keys
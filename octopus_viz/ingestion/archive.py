@@ -0,0 +1,224 @@
+import logging
+import os
+import uuid
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from ingestion import models
+from ingestion.utils import in_batches
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # optional dependency, only needed by the archives
+    pa = None
+
+PARTITION_COLUMNS = ('serial', 'mpan', 'month')
+
+
+class ConsumptionArchive:
+    """Readings stored as parquet files partitioned by meter and month.
+
+    The layout is `<root>/serial=<serial>/mpan=<mpan>/month=<YYYY-MM>/part-*.parquet` (the local
+    month of interval_start, like the graphs). Exporting from the database replaces the months it
+    writes, appending from the API adds files: the loader upserts so overlapping files are fine.
+    Reading and writing go through record batches of batch_size rows, the memory does not depend
+    on the size of the archive.
+    """
+
+    DEFAULT_BATCH_SIZE = 50_000
+
+    def __init__(self, root: str, *, batch_size: int = DEFAULT_BATCH_SIZE, logger: logging.Logger | None = None):
+        if pa is None:
+            raise RuntimeError('pyarrow is required for the consumption archives: pip install pyarrow')
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.root = root
+        self.batch_size = batch_size
+        self.logger = logger
+
+    @classmethod
+    def partitioning(cls) -> 'ds.Partitioning':
+        # explicit strings, otherwise a numeric MPAN would be read back as an integer
+        return ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor='hive')
+
+    @classmethod
+    def schema(cls) -> 'pa.Schema':
+        return pa.schema([
+            ('serial', pa.string()),
+            ('mpan', pa.string()),
+            ('month', pa.string()),
+            ('interval_start', pa.timestamp('s', tz='UTC')),
+            ('interval_end', pa.timestamp('s', tz='UTC')),
+            ('consumption', pa.float64()),
+        ])
+
+    @classmethod
+    def record_batch(
+        cls,
+        serials: list[str],
+        mpans: list[str],
+        starts: list[int],
+        ends: list[int],
+        consumptions: list[float],
+    ) -> 'pa.RecordBatch':
+        """Batch of readings, interval_start and interval_end as seconds since epoch"""
+        interval_start = pa.array(starts, pa.int64()).cast(pa.timestamp('s', tz='UTC'))
+        local_start = interval_start.cast(pa.timestamp('s', tz=settings.TIME_ZONE))
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(serials, pa.string()),
+                pa.array(mpans, pa.string()),
+                pc.strftime(local_start, format='%Y-%m'),
+                interval_start,
+                pa.array(ends, pa.int64()).cast(pa.timestamp('s', tz='UTC')),
+                pa.array(consumptions, pa.float64()),
+            ],
+            schema=cls.schema(),
+        )
+
+    def _partition_files(self) -> dict[tuple[str, str, str], list[str]]:
+        """The files of each (serial, mpan, month) already in the archive"""
+        files: dict[tuple[str, str, str], list[str]] = {}
+        if not os.path.isdir(self.root):
+            return files
+        for fragment in self.dataset().get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            files.setdefault(tuple(keys[name] for name in PARTITION_COLUMNS), []).append(fragment.path)
+        return files
+
+    def _write(self, batches: Iterable['pa.RecordBatch'], *, replace: bool):
+        """Write the batches one by one from this thread.
+
+        Arrow pulls a reader from its own threads, the batches read from the database would then be
+        read by another connection, outside of the transaction. When replacing, the files of a month
+        are deleted before the first batch of that month is written.
+        """
+        previous = self._partition_files() if replace else {}
+        token = uuid.uuid4().hex
+        for n, batch in enumerate(batches):
+            for partition in set(zip(*(batch.column(name).to_pylist() for name in PARTITION_COLUMNS))):
+                for path in previous.pop(partition, []):
+                    os.remove(path)
+            ds.write_dataset(
+                batch,
+                self.root,
+                format='parquet',
+                partitioning=self.partitioning(),
+                basename_template=f'part-{token}-{n}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore',
+                file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+            )
+
+    def _counted(self, batches: Iterable['pa.RecordBatch']) -> tuple[Iterator['pa.RecordBatch'], list[int]]:
+        written = [0]
+
+        def count():
+            for batch in batches:
+                written[0] += batch.num_rows
+                self.logger.debug(f'  Archiving {batch.num_rows} rows ({written[0]} so far)')
+                yield batch
+
+        return count(), written
+
+    def append_results(self, meter: models.Meter, results: Iterable[dict]) -> int:
+        """Write the results of `OctopusAPI.get_consumption_data` as they are downloaded"""
+
+        def batches():
+            for batch in in_batches(results, self.batch_size):
+                yield self.record_batch(
+                    [meter.serial] * len(batch),
+                    [meter.mpan.mpan] * len(batch),
+                    [int(datetime.fromisoformat(data['interval_start']).timestamp()) for data in batch],
+                    [int(datetime.fromisoformat(data['interval_end']).timestamp()) for data in batch],
+                    [float(data['consumption']) for data in batch],
+                )
+
+        counted, written = self._counted(batches())
+        self._write(counted, replace=False)
+        return written[0]
+
+    def export(self, queryset: QuerySet) -> int:
+        """Write the readings of queryset, replacing the months already in the archive.
+
+        Every month of the exported meters should be complete in queryset, the other readings of a
+        month written are deleted.
+        """
+        rows = (
+            queryset
+            .order_by('meter_id', 'interval_start')
+            .values_list(
+                'meter__serial',
+                'meter__mpan__mpan',
+                models.UnixEpoch('interval_start'),
+                models.UnixEpoch('interval_end'),
+                'consumption',
+            )
+            .iterator(chunk_size=self.batch_size)
+        )
+
+        def batches():
+            for batch in in_batches(rows, self.batch_size):
+                yield self.record_batch(*map(list, zip(*batch)))
+
+        counted, written = self._counted(batches())
+        self._write(counted, replace=True)
+        return written[0]
+
+    def dataset(self) -> 'ds.Dataset':
+        return ds.dataset(self.root, format='parquet', partitioning=self.partitioning())
+
+    def meter_readings(self) -> Iterator[tuple[str, str, Iterator['pa.RecordBatch']]]:
+        """(serial, mpan, batches of readings) of each file of the archive"""
+        for fragment in self.dataset().get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            yield (
+                keys['serial'],
+                keys['mpan'],
+                fragment.to_batches(
+                    batch_size=self.batch_size,
+                    columns=['interval_start', 'interval_end', 'consumption'],
+                ),
+            )
+
+    @classmethod
+    def consumption_rows(cls, meter: models.Meter, batches: Iterable['pa.RecordBatch']) -> Iterator[models.Consumption]:
+        for batch in batches:
+            for interval_start, interval_end, consumption in zip(
+                batch.column('interval_start').to_pylist(),
+                batch.column('interval_end').to_pylist(),
+                batch.column('consumption').to_pylist(),
+            ):
+                yield models.Consumption(
+                    consumption=consumption,
+                    interval_start=interval_start,
+                    interval_end=interval_end,
+                    meter=meter,
+                )
+
+    @classmethod
+    def find_meter(cls, serial: str, mpan: str) -> models.Meter:
+        meter = models.Meter.objects.select_related('mpan').filter(serial=serial, mpan__mpan=mpan).first()
+        if meter is None:
+            raise RuntimeError(f'Could not find meter {serial} with MPAN {mpan}: create it before loading the archive')
+        return meter
+
+    def load(self, ingest: 'models.IngestConsumption') -> int:
+        """Upsert the readings with the bulk path of ingest, one transaction per file"""
+        update_rows = models.UpdateConsumption(self.logger)
+        meters: dict[tuple[str, str], models.Meter] = {}
+        total_rows = 0
+        for serial, mpan, batches in self.meter_readings():
+            meter = meters.get((serial, mpan))
+            if meter is None:
+                meter = meters[serial, mpan] = self.find_meter(serial, mpan)
+            total_rows += ingest.upsert_rows(
+                meter,
+                self.consumption_rows(meter, batches),
+                update_rows=update_rows,
+            )
+        return total_rows
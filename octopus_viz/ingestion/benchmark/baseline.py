@@ -0,0 +1,87 @@
+import collections
+import dataclasses
+import json
+import os.path
+from typing import Self
+
+from ingestion.benchmark.timing import Timing
+
+
+class Baseline:
+    """Timings of a previous run of the benchmarks stored as JSON, to spot the regressions of a run.
+
+    The timings are keyed by case and label. A timing regresses when it runs more queries than in
+    the baseline, or when it is slower or its peak memory higher by more than tolerance (a fraction
+    of the baseline) and more than the noise floors. Only the runs with the same parameters
+    (dataset, memory tracing) are compared, the timings of another dataset are not comparable.
+    Usage:
+    ```
+    baseline = Baseline.load('baseline.json', {'years': 3, 'meters': 4}, tolerance=0.5)
+    regressions = baseline.compare('rerating', timing)
+    baseline.save()
+    ```
+    """
+
+    # differences under these are noise, whatever the tolerance
+    MIN_SECONDS = 0.05
+    MIN_MEMORY = 2**20
+
+    def __init__(self, path: str, parameters: dict, *, tolerance: float, previous: dict | None = None):
+        self.path = path
+        self.parameters = parameters
+        self.tolerance = tolerance
+        # timings of the baseline, None when there is no comparable baseline
+        self.previous: dict[str, dict] | None = previous
+        self.current: dict[str, dict] = {}
+        # occurrences of the labels of each case, a label measured twice gets a suffix
+        self._seen: collections.Counter = collections.Counter()
+
+    @classmethod
+    def load(cls, path: str, parameters: dict, *, tolerance: float) -> Self:
+        previous = None
+        if os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            if data['parameters'] == parameters:
+                previous = data['timings']
+        return cls(path, parameters, tolerance=tolerance, previous=previous)
+
+    @property
+    def comparable(self) -> bool:
+        return self.previous is not None
+
+    def key(self, case: str, label: str) -> str:
+        self._seen[case, label] += 1
+        occurrence = self._seen[case, label]
+        return f'{case}/{label}' if occurrence == 1 else f'{case}/{label} #{occurrence}'
+
+    def _exceeds(self, value: float | None, previous: float | None, floor: float) -> bool:
+        if value is None or previous is None:
+            return False
+        return value > previous * (1 + self.tolerance) and value - previous > floor
+
+    def compare(self, case: str, timing: Timing) -> list[str]:
+        """Record timing of case and describe how it regressed, if it did"""
+        key = self.key(case, timing.label)
+        self.current[key] = dataclasses.asdict(timing)
+        if self.previous is None or key not in self.previous:
+            return []
+
+        previous = Timing(**self.previous[key])
+        regressions = []
+        if timing.queries > previous.queries:
+            regressions.append(f'{key}: {timing.queries} queries instead of {previous.queries}')
+        if self._exceeds(timing.seconds, previous.seconds, self.MIN_SECONDS):
+            regressions.append(f'{key}: {timing.seconds:.3f}s instead of {previous.seconds:.3f}s')
+        if self._exceeds(timing.peak_memory, previous.peak_memory, self.MIN_MEMORY):
+            regressions.append(f'{key}: peak {timing.peak_memory:,} B instead of {previous.peak_memory:,} B')
+        return regressions
+
+    def save(self):
+        """Write the timings recorded, keeping the ones of the cases not run from the baseline"""
+        run = {case for case, _ in self._seen}
+        timings = {key: value for key, value in (self.previous or {}).items() if key.split('/')[0] not in run}
+        timings |= self.current
+        with open(self.path, 'w') as file:
+            json.dump({'parameters': self.parameters, 'timings': timings}, file, indent=2, sort_keys=True)
+            file.write('\n')
@@ -0,0 +1,843 @@
+import contextlib
+import functools
+import io
+import json
+import logging
+import math
+import os.path
+import tempfile
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, date, datetime, timedelta
+
+import requests
+from django import urls
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import F, Max, Min, Model, Sum
+from django.http import HttpRequest, JsonResponse
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from ingestion import models
+from ingestion.aggregator.consumption import ConsumptionAggregator, NetAggregator, PeriodAggregator, TariffAggregator
+from ingestion.aggregator.dto import ConsumptionPrice
+from ingestion.aggregator.sql import SqlPeriodAggregator, SqlTariffAggregator
+from ingestion.aggregator.timeseries import TimeSeries
+from ingestion.aggregator.vectorised import VectorisedPeriodAggregator, VectorisedTariffAggregator
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.benchmark.fake_api import FakeOctopusAPI, StubOctopusAPI
+from ingestion.benchmark.legacy import LegacyAttachment
+from ingestion.benchmark.timing import Timing, measure
+from ingestion.forms.graphs import MonthlyGraphForm, TimeSeriesGraphForm
+from ingestion.graph_cache import GraphCache, month_start, next_month
+from ingestion.octopus_client.client import OctopusHttpClient
+from ingestion.views.graphs import GraphDataView, MonthlyGraphData, TariffGraphData, TimeSeriesGraphData
+from ingestion.views.home import HealthSnapshot, HomeView
+from ingestion.views.payload import GraphPayload
+
+BenchmarkCase = Callable[[SyntheticDataset, logging.Logger], list[Timing]]
+
+
+def _detach_all():
+    models.Consumption.objects.update(tariff=None, rate=None)
+
+
+def _assignment() -> dict[int, tuple[int | None, int | None, float | None, float | None]]:
+    return {
+        row_id: (tariff_id, rate_id, unit_rate, cost)
+        for row_id, tariff_id, rate_id, unit_rate, cost in models.Consumption.objects.values_list(
+            'id',
+            'tariff_id',
+            'rate_id',
+            'unit_rate',
+            'cost',
+        )
+    }
+
+
+def _quiet_logger() -> logging.Logger:
+    quiet = logging.getLogger('ingestion.benchmark.quiet')
+    quiet.setLevel(logging.ERROR)
+    return quiet
+
+
+def _aggregation_differences(expected: ConsumptionAggregator, found: ConsumptionAggregator) -> list[str]:
+    """Keys whose values are not the same, up to floating point summation errors"""
+    if expected.data.keys() != found.data.keys():
+        return sorted(set(expected.data) ^ set(found.data))
+
+    different = []
+    for key, item in expected.data.items():
+        other = found.data[key]
+        same_price = (item.price is None and other.price is None) or (
+            item.price is not None and other.price is not None and math.isclose(item.price, other.price)
+        )
+        if not (
+            same_price
+            and math.isclose(item.consumption, other.consumption)
+            and (item.earliest, item.latest, item.metric_unit, item.currency)
+            == (other.earliest, other.latest, other.metric_unit, other.currency)
+        ):
+            different.append(key)
+    return different
+
+
+def rate_attachment(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """Row by row attachment (as it used to be done, see `LegacyAttachment`) against the set-based
+    `attach_rates`
+    """
+    rows = models.Consumption.objects.count()
+    quiet = _quiet_logger()
+
+    _detach_all()
+    with measure('row by row attachment', rows) as row_by_row:
+        LegacyAttachment().attach_row_by_row(models.UpdateConsumption.all_rows())
+    expected = _assignment()
+
+    _detach_all()
+    with measure('set-based attachment', rows) as set_based:
+        models.UpdateConsumption(quiet).gather_and_update_rows(all_rows=True)
+    found = _assignment()
+
+    different = sum(1 for row_id, attached in expected.items() if found.get(row_id) != attached)
+    if different:
+        raise RuntimeError(f'Set-based attachment differs from the row by row attachment for {different} rows')
+    logger.info(f'  same assignment for all {rows} rows, speedup x{row_by_row.seconds / set_based.seconds:.1f}')
+    return [row_by_row, set_based]
+
+
+def rerating(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """`gather_and_update_rows(all_rows=True)` on detached readings, then again on rated ones"""
+    rows = models.Consumption.objects.count()
+    quiet = _quiet_logger()
+
+    _detach_all()
+    with measure('rating of all rows', rows) as rating:
+        models.UpdateConsumption(quiet).gather_and_update_rows(all_rows=True)
+    expected = _assignment()
+
+    with measure('re-rating of all rows', rows) as rerated:
+        models.UpdateConsumption(quiet).gather_and_update_rows(all_rows=True)
+    if _assignment() != expected:
+        raise RuntimeError('Re-rating the rows changed their rates')
+    rated = sum(1 for _, rate_id, _, _ in expected.values() if rate_id is not None)
+    logger.info(f'  {rated} of {rows} rows rated, the same after re-rating')
+    return [rating, rerated]
+
+
+def rate_resolution(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """Queries per day and direction (`LegacyAttachment`) against the in-memory `TariffResolver`"""
+    readings = list(models.Consumption.objects.values_list('interval_start', 'interval_end', 'meter__mpan__direction'))
+
+    with measure('queried resolution', len(readings)) as queried:
+        legacy = LegacyAttachment()
+        expected = [legacy.resolve(direction, start, end) for start, end, direction in readings]
+
+    with measure('resolver', len(readings)) as resolved:
+        resolver = models.TariffResolver()
+        found = [resolver.resolve(direction, start, end) for start, end, direction in readings]
+
+    different = sum(1 for one, other in zip(expected, found) if one != other)
+    if different:
+        raise RuntimeError(f'TariffResolver differs from the queries for {different} readings')
+    speedup = queried.seconds / resolved.seconds
+    logger.info(f'  same resolution for all {len(readings)} readings, speedup x{speedup:.1f}')
+    return [queried, resolved]
+
+
+def vectorised_aggregation(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """Python aggregators timed against their numpy counterparts on all the readings"""
+    models.UpdateConsumption(_quiet_logger()).gather_and_update_rows(all_rows=True)
+    readings = models.Consumption.objects.select_related('meter', 'rate', 'tariff')
+    rows = readings.count()
+
+    timings = []
+    for label, python_aggregator, numpy_aggregator in (
+        ('period', PeriodAggregator(), VectorisedPeriodAggregator()),
+        ('tariff by price', TariffAggregator(by_price=True), VectorisedTariffAggregator(by_price=True)),
+        ('tariff by interval', TariffAggregator(by_price=False), VectorisedTariffAggregator(by_price=False)),
+    ):
+        with measure(f'python {label} aggregation', rows) as python_timing:
+            python_aggregator.process(readings.all())
+        with measure(f'numpy {label} aggregation', rows) as numpy_timing:
+            numpy_aggregator.process(readings.all())
+        logger.info(f'  {label} aggregation speedup x{python_timing.seconds / numpy_timing.seconds:.1f}')
+        timings.extend((python_timing, numpy_timing))
+    return timings
+
+
+def python_aggregation(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """`PeriodAggregator` and `TariffAggregator` on all the rated readings"""
+    models.UpdateConsumption(_quiet_logger()).gather_and_update_rows(all_rows=True)
+    readings = models.Consumption.objects.select_related('meter', 'rate', 'tariff')
+    rows = readings.count()
+    total = readings.aggregate(total=Sum('consumption'))['total']
+
+    timings = []
+    for label, aggregator in (
+        ('period', PeriodAggregator()),
+        ('tariff by price', TariffAggregator(by_price=True)),
+        ('tariff by interval', TariffAggregator(by_price=False)),
+    ):
+        with measure(f'{label} aggregation', rows) as timing:
+            aggregator.process(readings.all())
+        timings.append(timing)
+
+        found = sum(item.consumption for item in aggregator.data.values())
+        if not math.isclose(found, total, rel_tol=1e-9):
+            raise RuntimeError(f'The {label} aggregation totals {found}, not {total}')
+        logger.info(f'  {label} aggregation: {len(aggregator.data)} items')
+    return timings
+
+
+def _readings() -> list[tuple]:
+    return sorted(models.Consumption.objects.values_list('meter_id', 'interval_start', 'interval_end', 'consumption'))
+
+
+def _write_cache_files(directory: str) -> list[str]:
+    """One cache file per meter, in the format read by cache_ingestion"""
+    paths = []
+    for meter in models.Meter.objects.select_related('mpan'):
+        direction = models.Direction(meter.mpan.direction)
+        unit = f'{meter.energy_type_enum.name}_{direction.name}_{models.MetricUnit(meter.metric_unit).name}'.lower()
+        path = os.path.join(directory, f'{meter.serial}_{meter.mpan.mpan}_start_end')
+        with open(path, 'w') as fout:
+            for interval_start, interval_end, consumption in (
+                models.Consumption.objects.filter(meter=meter).values_list(
+                    'interval_start',
+                    'interval_end',
+                    'consumption',
+                )
+            ).iterator():
+                line = {
+                    'consumption': consumption,
+                    'interval_start': interval_start.isoformat(),
+                    'interval_end': interval_end.isoformat(),
+                    'unit': unit,
+                }
+                fout.write(json.dumps(line) + '\n')
+        paths.append(path)
+    return paths
+
+
+CACHE_INGESTION_JOBS = 4
+
+
+def cache_file_ingestion(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """cache_ingestion of one file per meter, parsed while written then by other processes, then
+    again when all the lines are already present
+    """
+    expected = _readings()
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = _write_cache_files(directory)
+        for label, jobs in (
+            ('cache_ingestion', 1),
+            (f'cache_ingestion --jobs {CACHE_INGESTION_JOBS}', CACHE_INGESTION_JOBS),
+        ):
+            models.Consumption.objects.all().delete()
+            with measure(label, len(expected)) as ingestion:
+                call_command('cache_ingestion', *paths, '--jobs', str(jobs), stdout=io.StringIO())
+            if _readings() != expected:
+                raise RuntimeError(f'{label} did not load the same readings')
+            timings.append(ingestion)
+
+        with measure('cache_ingestion of present lines', len(expected)) as present:
+            call_command('cache_ingestion', *paths, stdout=io.StringIO())
+        timings.append(present)
+    logger.info(f'  same {len(expected)} readings loaded from {len(paths)} files')
+    return timings
+
+
+def _directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def parquet_archive(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """export_archive of all the readings, load_archive into an empty table then of present ones"""
+    rows = models.Consumption.objects.count()
+    with tempfile.TemporaryDirectory() as directory:
+        with measure('export_archive', rows) as exported:
+            call_command('export_archive', directory, stdout=io.StringIO())
+        size = _directory_size(directory)
+        models.Consumption.objects.all().delete()
+
+        with measure('load_archive', rows) as loaded:
+            call_command('load_archive', directory, stdout=io.StringIO())
+        with measure('load_archive of present readings', rows) as present:
+            call_command('load_archive', directory, stdout=io.StringIO())
+    logger.info(f'  {rows} readings archived in {size:,} B')
+    return [exported, loaded, present]
+
+
+def _api_results() -> dict[tuple[str, str], list[dict]]:
+    """The readings as results of the consumption endpoint, per (mpan, serial)"""
+    results = {}
+    for mpan, serial, interval_start, interval_end, consumption in (
+        models.Consumption.objects
+        .order_by('meter_id', 'interval_start')
+        .values_list('meter__mpan__mpan', 'meter__serial', 'interval_start', 'interval_end', 'consumption')
+        .iterator()
+    ):
+        results.setdefault((mpan, serial), []).append({
+            'consumption': consumption,
+            'interval_start': interval_start.isoformat(),
+            'interval_end': interval_end.isoformat(),
+        })
+    return results
+
+
+def _ingest_with_retries(
+    dataset: SyntheticDataset,
+    logger: logging.Logger,
+    runs: list[tuple[str, dict]],
+) -> list[Timing]:
+    """Ingest from a local fake API answering a 429 or a 503 to one request in 5, once per
+    (label, IngestConsumption options) of runs.
+    """
+    expected = _readings()
+    timings = []
+    with (
+        FakeOctopusAPI(_api_results(), fail_every=5) as server,
+        override_settings(OCTOPUS_API_URL=server.url, OCTOPUS_HTTP_BACKOFF_SECONDS=0.01),
+    ):
+        for label, options in runs:
+            models.Consumption.objects.all().delete()
+            # new clients, with the settings above
+            OctopusHttpClient.close_all()
+            before = server.requests, server.injected, server.connections
+            ingest = models.IngestConsumption(
+                _quiet_logger(),
+                batch_size=models.IngestConsumption.BULK_BATCH_SIZE,
+                **options,
+            )
+            with measure(label, len(expected)) as timing:
+                ingest.ingest(dataset.start, dataset.end)
+            timings.append(timing)
+
+            metrics = ingest.http_metrics
+            sent, injected, connections = (
+                after - start for after, start in zip((server.requests, server.injected, server.connections), before)
+            )
+            if _readings() != expected:
+                raise RuntimeError(f'The {label} did not load the same readings')
+            if (metrics.requests, metrics.retries, metrics.failures) != (sent, injected, 0):
+                raise RuntimeError(f'The {label} reported {metrics} for {sent} requests and {injected} errors')
+            if connections >= sent:
+                raise RuntimeError(f'The {label} opened {connections} connections for {sent} requests')
+            logger.info(f'  {label}: {metrics} over {connections} connections')
+    OctopusHttpClient.close_all()
+    return timings
+
+
+def http_retries(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """data_ingestion from a fake API injecting errors, sequential then with workers"""
+    return _ingest_with_retries(
+        dataset,
+        logger,
+        [
+            ('ingestion with retries', {}),
+            ('concurrent ingestion with retries', {'workers': 4, 'shard_days': 92}),
+        ],
+    )
+
+
+def async_ingestion(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """data_ingestion --async from a fake API injecting errors, needs aiohttp"""
+    return _ingest_with_retries(
+        dataset,
+        logger,
+        [
+            ('async ingestion with retries', {'use_async': True}),
+            ('sharded async ingestion with retries', {'use_async': True, 'shard_days': 92}),
+        ],
+    )
+
+
+def resumed_ingestion(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """data_ingestion --checkpoint-pages interrupted by an error half-way, then --resume"""
+    expected = _readings()
+    results = _api_results()
+    page_size = 1000
+    checkpoint_pages = 5
+    total_pages = sum(math.ceil(len(meter_results) / page_size) for meter_results in results.values())
+    models.Consumption.objects.all().delete()
+
+    with (
+        FakeOctopusAPI(results, page_size=page_size, fail_every=total_pages // 2) as server,
+        override_settings(OCTOPUS_API_URL=server.url, OCTOPUS_HTTP_RETRIES=0),
+    ):
+        OctopusHttpClient.close_all()
+        with measure('interrupted ingestion', len(expected)) as interrupted:
+            try:
+                models.IngestConsumption(
+                    _quiet_logger(),
+                    batch_size=models.IngestConsumption.BULK_BATCH_SIZE,
+                    checkpoint_pages=checkpoint_pages,
+                ).ingest(
+                    dataset.start,
+                    dataset.end,
+                )
+            except requests.HTTPError:
+                pass
+            else:
+                raise RuntimeError('The ingestion was not interrupted')
+        committed = models.Consumption.objects.count()
+
+        server.fail_every = 0
+        with measure('resumed ingestion', len(expected) - committed) as resumed:
+            models.IngestConsumption(
+                _quiet_logger(),
+                batch_size=models.IngestConsumption.BULK_BATCH_SIZE,
+                checkpoint_pages=checkpoint_pages,
+                resume=True,
+            ).ingest(
+                dataset.start,
+                dataset.end,
+            )
+        OctopusHttpClient.close_all()
+
+    if _readings() != expected:
+        raise RuntimeError('The resumed ingestion did not load the same readings')
+    downloaded_again = server.requests - server.injected - total_pages
+    if not 0 <= downloaded_again < checkpoint_pages:
+        raise RuntimeError(f'{downloaded_again} pages were downloaded again after resuming')
+    logger.info(
+        f'  {committed} of {len(expected)} readings committed before the error, '
+        f'{downloaded_again} pages downloaded again by --resume',
+    )
+    return [interrupted, resumed]
+
+
+def db_ingestion(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """`_ingest_in_db` (a row at a time) and `_upsert_in_db` (batches) of the results of a stubbed
+    `OctopusAPI`, without any HTTP, then the batches again when all the rows are present
+    """
+    expected = _readings()
+    results = _api_results()
+    meters = list(models.Meter.objects.select_related('mpan__api_key'))
+    quiet = _quiet_logger()
+
+    timings = []
+    for label, batch_size, present in (
+        ('row by row ingestion', None, False),
+        ('batched ingestion', models.IngestConsumption.BULK_BATCH_SIZE, False),
+        ('batched ingestion of present rows', models.IngestConsumption.BULK_BATCH_SIZE, True),
+    ):
+        if not present:
+            models.Consumption.objects.all().delete()
+        ingest = models.IngestConsumption(quiet, batch_size=batch_size)
+        write = ingest._upsert_in_db if batch_size else ingest._ingest_in_db
+        with measure(label, len(expected)) as timing:
+            for meter in meters:
+                write(
+                    meter,
+                    dataset.start,
+                    dataset.end,
+                    api_connection=StubOctopusAPI(meter, results, logger=quiet),
+                    update_rows=models.UpdateConsumption(quiet),
+                )
+        timings.append(timing)
+        if _readings() != expected:
+            raise RuntimeError(f'The {label} did not load the same readings')
+    logger.info(f'  same {len(expected)} readings loaded for {len(meters)} meters')
+    return timings
+
+
+# Models whose admin changelist is timed by admin_changelists
+ADMIN_CHANGELISTS = (models.APIKey, models.MPAN, models.Meter, models.Tariff, models.Rate, models.Consumption)
+
+
+def _superuser_request(url: str) -> HttpRequest:
+    request = RequestFactory().get(url)
+    request.user = User(username='benchmark', is_active=True, is_staff=True, is_superuser=True)
+    return request
+
+
+def _render_changelist(model: type[Model]) -> None:
+    url = urls.reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+    admin.site.get_model_admin(model).changelist_view(_superuser_request(url)).render()
+
+
+def _render_home() -> None:
+    HomeView.as_view()(_superuser_request(urls.reverse('home'))).render()
+
+
+def _timed_pages(
+    dataset: SyntheticDataset,
+    pages: list[tuple[str, type[Model], Callable[[], None]]],
+) -> list[Timing]:
+    """Render the pages, double the dataset and render them again.
+
+    Each (label, model, render) is timed with the number of rows of model.
+    """
+    timings = []
+    for label, model, render in pages:
+        with measure(label, model.objects.count()) as timing:
+            render()
+        timings.append(timing)
+
+    more = SyntheticDataset(start=dataset.end, years=1, meters=dataset.meters, seed=dataset.seed, name='benchmark-more')
+    more.build()
+
+    for label, model, render in pages:
+        with measure(label, model.objects.count()) as timing:
+            render()
+        timings.append(timing)
+    return timings
+
+
+def admin_changelists(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """The admin changelists, before and after doubling the rows (ingestion/tests/test_admin.py
+    checks that they run as many queries)
+    """
+    pages = [
+        (f'{model._meta.verbose_name} changelist', model, functools.partial(_render_changelist, model))
+        for model in ADMIN_CHANGELISTS
+    ]
+    return _timed_pages(dataset, pages)
+
+
+def home_dashboard(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """The home page before and after doubling the rows, then cached (ingestion/tests/test_home.py
+    checks its queries)
+    """
+
+    def render_uncached():
+        HealthSnapshot.invalidate()
+        _render_home()
+
+    timings = _timed_pages(dataset, [('home page', models.Consumption, render_uncached)])
+    with measure('cached home page', models.Consumption.objects.count()) as cached:
+        _render_home()
+    return [*timings, cached]
+
+
+@contextlib.contextmanager
+def _traced():
+    """Trace the allocations of the block, unless they are already traced (benchmark --memory)"""
+    if tracemalloc.is_tracing():
+        yield
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+def timeseries_downsampling(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """The time series endpoint for a year then the dataset: payload and memory should not grow"""
+    points = 1000
+    models.RollupConsumption(_quiet_logger()).rebuild()
+    expected = dict(
+        models.Consumption.objects
+        .order_by()
+        .values('meter__mpan__direction')
+        .annotate(total=Sum('consumption'))
+        .values_list('meter__mpan__direction', 'total'),
+    )
+    timings = []
+    peaks = {}
+    first_year = dataset.start.replace(year=dataset.start.year + 1)
+    for end in (first_year, dataset.end):
+        for method in ('lttb', 'minmax'):
+            request = RequestFactory().get(
+                urls.reverse('timeseries_graph_data'),
+                {'start': dataset.start.isoformat(), 'end': end.isoformat(), 'points': points, 'method': method},
+            )
+            label = f'{method} time series until {end}'
+            rows = models.Consumption.objects.filter(interval_start__lt=TimeSeries.moment(end)).count()
+            with _traced(), measure(label, rows) as timing:
+                response = TimeSeriesGraphData.as_view()(request)
+            peaks[end, method] = timing.peak_memory
+            timings.append(timing)
+
+            data = json.loads(response.content)
+            lengths = [len(trace['x']) for trace in data['graph']]
+            if not lengths or max(lengths) > points:
+                raise RuntimeError(f'The {label} has {lengths} points for {points} requested')
+            logger.info(f'  {label}: {lengths} points, {len(response.content)} bytes, peak {peaks[end, method]:,} B')
+            if end == dataset.end:
+                for direction, info in zip((models.Direction.IMPORTING, models.Direction.EXPORTING), data['info']):
+                    if not math.isclose(float(info['total_consumption']), expected[direction], rel_tol=1e-6):
+                        raise RuntimeError(f'The {label} totals {info["total_consumption"]}, not {expected[direction]}')
+
+    for method in ('lttb', 'minmax'):
+        # the same number of buckets for a longer period, only a chunk of rows is in memory
+        if peaks[dataset.end, method] > 2 * peaks[first_year, method]:
+            raise RuntimeError(
+                f'The {method} time series used {peaks[dataset.end, method]:,} B until {dataset.end} '
+                f'but {peaks[first_year, method]:,} B for the first year',
+            )
+    return timings
+
+
+def _pyramid() -> list[tuple]:
+    levels = models.ConsumptionLevel.objects.order_by('meter_id', 'resolution', 'start')
+    return list(levels.values_list('meter_id', 'resolution', 'start', 'end', 'consumption', 'cost', 'readings'))
+
+
+def timeseries_pyramid(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """The time series read from the pyramid against the readings, then a day refreshed"""
+    points = 1000
+    with measure('pyramid rebuild', models.Consumption.objects.count()) as rebuild:
+        models.RollupConsumption(_quiet_logger()).rebuild()
+    timings = [rebuild]
+
+    for end in (dataset.start + timedelta(days=31), dataset.start.replace(year=dataset.start.year + 1), dataset.end):
+        raw = TimeSeries(models.Direction.IMPORTING, dataset.start, end, resolution=models.Resolution.HALF_HOUR)
+        with measure(f'readings until {end}') as raw_timing:
+            raw.downsample(points)
+        raw_timing.rows = raw.slots
+
+        series = TimeSeries(models.Direction.IMPORTING, dataset.start, end)
+        resolution = series.pick_resolution(points)
+        with measure(f'{resolution.label} buckets until {end}') as timing:
+            samples = series.downsample(points)
+        timing.rows = series.slots
+        timings += [raw_timing, timing]
+
+        if len(samples) > points or not math.isclose(series.total_consumption, raw.total_consumption, rel_tol=1e-9):
+            raise RuntimeError(
+                f'The {resolution.label} buckets until {end} give {len(samples)} points and '
+                f'{series.total_consumption}, not {raw.total_consumption}',
+            )
+        # the next level has fewer buckets than points: at most a day of hours per point
+        if series.slots > 24 * points:
+            raise RuntimeError(f'{series.slots} buckets of {resolution.label} were read for {points} points')
+        logger.info(f'  until {end}: {raw.slots} half-hours or {series.slots} buckets of {resolution.label}')
+
+    # a day changed by an ingestion: only its weeks and months are computed again
+    day = dataset.start + timedelta(days=400)
+    meter = models.Meter.objects.filter(mpan__direction=models.Direction.IMPORTING).first()
+    readings = models.Consumption.objects.filter(
+        meter=meter,
+        interval_start__gte=TimeSeries.moment(day),
+        interval_start__lt=TimeSeries.moment(day + timedelta(days=1)),
+    )
+    readings.update(consumption=F('consumption') + 1)
+    earliest, latest = readings.aggregate(Min('interval_start'), Max('interval_start')).values()
+    with measure(f'pyramid refresh of {day}') as refresh:
+        refresh.rows = models.RollupConsumption(_quiet_logger()).refresh(meter.id, earliest, latest)
+    refreshed = _pyramid()
+    models.RollupConsumption(_quiet_logger()).rebuild()
+    if refreshed != _pyramid():
+        raise RuntimeError(f'The pyramid refreshed for {day} is not the rebuilt one')
+    return [*timings, refresh]
+
+
+def _legacy_payload(data: dict) -> dict:
+    """The payload as it was sent before the columns: a dict per point and the values as strings"""
+    tz = timezone.get_current_timezone()
+    metric_unit, currency = data['header']['metric_unit'], data['header']['currency']
+    graph = []
+    for trace in data['graph']:
+        legacy = {key: value for key, value in trace.items() if key != 'columns'}
+        columns = trace.get('columns')
+        if columns is None:
+            # x is the local time read as UTC
+            legacy['x'] = [
+                datetime.fromtimestamp(x * trace['x_scale'] / 1000, UTC).strftime('%Y-%m-%d %H:%M') for x in trace['x']
+            ]
+            del legacy['x_scale']
+            legacy['y'] = [round(y, 4) for y in trace['y']]
+        else:
+            legacy['y'] = [f'{y or 0:.4f}' for y in trace['y']]
+            legacy['customdata'] = [
+                ConsumptionPrice(
+                    consumption,
+                    metric_unit,
+                    datetime.fromtimestamp(earliest, tz),
+                    datetime.fromtimestamp(latest, tz),
+                    price,
+                    currency,
+                ).as_dict()
+                for consumption, price, earliest, latest in zip(
+                    columns['consumption'],
+                    columns['price'],
+                    columns['earliest'],
+                    columns['latest'],
+                )
+            ]
+        graph.append(legacy)
+    info = [item | {'metric_unit': metric_unit, 'currency': currency} for item in data['info']]
+    return {'graph': graph, 'info': info, 'layout': data['layout']}
+
+
+def graph_payload(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """Size and encoding time of the graph payloads: dicts per point against columns"""
+    models.UpdateConsumption(_quiet_logger()).gather_and_update_rows(all_rows=True)
+    month = f'{dataset.end.year - 1}-06'
+    repeat = 20
+    graphs = (
+        ('monthly', MonthlyGraphData, MonthlyGraphForm, 'monthly_graph_data', {'month': month}),
+        ('tariff', TariffGraphData, MonthlyGraphForm, 'tariff_graph_data', {'month': month, 'show_price': 'on'}),
+        (
+            'time series',
+            TimeSeriesGraphData,
+            TimeSeriesGraphForm,
+            'timeseries_graph_data',
+            {'start': dataset.start.isoformat(), 'end': dataset.end.isoformat(), 'points': 5000, 'method': 'minmax'},
+        ),
+    )
+    timings = []
+    for name, view, form_class, url_name, params in graphs:
+        url = urls.reverse(url_name)
+        data = view().process_form(form_class(params))
+        points = sum(len(trace['y']) for trace in data['graph'])
+
+        legacy = _legacy_payload(data)
+        with measure(f'{name} dicts per point x{repeat}', points * repeat) as legacy_timing:
+            for _ in range(repeat):
+                legacy_content = JsonResponse(legacy).content
+        sizes = {'dicts': len(legacy_content), 'dicts gzip': len(GraphPayload.compress_content(legacy_content, 'gzip'))}
+
+        for binary in (False, True):
+            request = RequestFactory().get(url, params | ({'binary': '1'} if binary else {}))
+            label = f'{name} {"typed arrays" if binary else "columns"}'
+            with measure(f'{label} x{repeat}', points * repeat) as timing:
+                for _ in range(repeat):
+                    content = GraphPayload.response(request, data).content
+            sizes[label] = len(content)
+            for encoding in GraphPayload.ENCODINGS:
+                sizes[f'{label} {encoding}'] = len(GraphPayload.compress_content(content, encoding))
+            timings.append(timing)
+            if not binary and json.loads(content)['graph'][0]['y'][:10] != [
+                float(y) for y in legacy['graph'][0]['y'][:10]
+            ]:
+                raise RuntimeError(f'The {label} do not have the values of the dicts per point')
+        timings.append(legacy_timing)
+        logger.info(f'  {name} ({points} points): ' + ', '.join(f'{key} {size:,} B' for key, size in sizes.items()))
+        # a bar per half-hour of the day, the tariff graph has a few bars only
+        if name == 'monthly' and sizes[f'{name} columns'] * 2 > sizes['dicts']:
+            raise RuntimeError(f'The {name} columns are {sizes[f"{name} columns"]:,} B for {sizes["dicts"]:,} B')
+
+    # compression negotiated with Accept-Encoding, the graph cache must not keep the synthetic data
+    request = RequestFactory().get(urls.reverse('monthly_graph_data'), {'month': month}, HTTP_ACCEPT_ENCODING='gzip')
+    with override_settings(OCTOPUS_GRAPH_CACHE='default'):
+        response = MonthlyGraphData.as_view()(request)
+    if response.headers.get('Content-Encoding') != 'gzip' or 'Accept-Encoding' not in response.headers['Vary']:
+        raise RuntimeError(f'The graph data was not compressed: {dict(response.headers)}')
+    return timings
+
+
+def net_flow_graph(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """Both directions of the monthly graphs from one query against a query per direction"""
+    models.UpdateConsumption(_quiet_logger()).gather_and_update_rows(all_rows=True)
+    months = []
+    month = dataset.start
+    while month < dataset.end:
+        months.append(month)
+        month = next_month(month)
+
+    timings = []
+    for name, aggregator, kwargs in (
+        ('period', SqlPeriodAggregator, {}),
+        ('tariff', SqlTariffAggregator, {'by_price': False}),
+    ):
+        rows = models.ConsumptionRollup.objects.count()
+        with measure(f'{name} graphs, a query per direction', rows) as separate_timing:
+            separate = [
+                {
+                    direction: aggregator(**kwargs).process(
+                        GraphDataView.gather_rollup(month, next_month(month), direction),
+                    )
+                    for direction in models.Direction
+                }
+                for month in months
+            ]
+        with measure(f'{name} graphs, both directions at once', rows) as combined_timing:
+            combined = [
+                aggregator.process_directions(GraphDataView.gather_rollup(month, next_month(month)), **kwargs)
+                for month in months
+            ]
+        timings += [separate_timing, combined_timing]
+
+        for month, expected, found in zip(months, separate, combined):
+            for direction in models.Direction:
+                differences = _aggregation_differences(expected[direction], found[direction])
+                if differences:
+                    raise RuntimeError(f'The {name} graph of {month} ({direction.label}) differs for {differences}')
+            net = NetAggregator().subtract(found[models.Direction.IMPORTING], found[models.Direction.EXPORTING])
+            for key, item in net.data.items():
+                imported = found[models.Direction.IMPORTING].data.get(key)
+                exported = found[models.Direction.EXPORTING].data.get(key)
+                value = (imported.consumption if imported else 0.0) - (exported.consumption if exported else 0.0)
+                if not math.isclose(item.consumption, value, abs_tol=1e-9):
+                    raise RuntimeError(f'The net of {key} in {month} is {item.consumption}, not {value}')
+        if combined_timing.queries * 2 != separate_timing.queries:
+            raise RuntimeError(
+                f'The {name} graphs ran {combined_timing.queries} queries for both directions '
+                f'and {separate_timing.queries} for each one',
+            )
+    return timings
+
+
+def graph_views(dataset: SyntheticDataset, logger: logging.Logger) -> list[Timing]:
+    """monthly_graph_data and tariff_graph_data for each month of the last year, computed then from
+    the graph cache
+    """
+    models.UpdateConsumption(_quiet_logger()).gather_and_update_rows(all_rows=True)
+    first_month = month_start(dataset.end.replace(year=dataset.end.year - 1))
+    months = []
+    month = first_month
+    while month < dataset.end:
+        months.append(month)
+        month = next_month(month)
+    rows = models.Consumption.objects.filter(
+        interval_start__gte=TimeSeries.moment(first_month),
+        interval_start__lt=TimeSeries.moment(dataset.end),
+    ).count()
+
+    timings = []
+    # the graph cache must not keep the synthetic data
+    with override_settings(OCTOPUS_GRAPH_CACHE='default'):
+        GraphCache.invalidate_all()
+        for name, view, url_name, params in (
+            ('monthly', MonthlyGraphData, 'monthly_graph_data', {}),
+            ('tariff', TariffGraphData, 'tariff_graph_data', {'show_price': 'on'}),
+        ):
+            month_requests = [
+                RequestFactory().get(urls.reverse(url_name), params | {'month': f'{month:%Y-%m}'}) for month in months
+            ]
+            for label in (f'{name} graph data', f'cached {name} graph data'):
+                with measure(f'{label} of {len(months)} months', rows) as timing:
+                    responses = [view.as_view()(request) for request in month_requests]
+                timings.append(timing)
+                failed = [response.status_code for response in responses if response.status_code != 200]
+                if failed:
+                    raise RuntimeError(f'The {label} answered {failed}')
+            if timings[-1].queries:
+                raise RuntimeError(f'The cached {name} graph data ran {timings[-1].queries} queries')
+        GraphCache.invalidate_all()
+    logger.info(f'  {len(months)} months of each graph, no query once cached')
+    return timings
+
+
+CASES: dict[str, BenchmarkCase] = {
+    'admin_changelists': admin_changelists,
+    'async_ingestion': async_ingestion,
+    'cache_file_ingestion': cache_file_ingestion,
+    'db_ingestion': db_ingestion,
+    'graph_payload': graph_payload,
+    'graph_views': graph_views,
+    'home_dashboard': home_dashboard,
+    'http_retries': http_retries,
+    'net_flow_graph': net_flow_graph,
+    'parquet_archive': parquet_archive,
+    'python_aggregation': python_aggregation,
+    'rate_attachment': rate_attachment,
+    'rate_resolution': rate_resolution,
+    'rerating': rerating,
+    'resumed_ingestion': resumed_ingestion,
+    'timeseries_downsampling': timeseries_downsampling,
+    'timeseries_pyramid': timeseries_pyramid,
+    'vectorised_aggregation': vectorised_aggregation,
+}
+
+
+def default_start(years: int) -> date:
+    return date(date.today().year - years, 1, 1)
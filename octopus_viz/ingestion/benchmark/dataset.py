@@ -0,0 +1,114 @@
+import dataclasses
+import random
+from datetime import UTC, date, datetime, timedelta
+
+from ingestion import models
+from ingestion.management.tariff_management import NewFluxTariff, add_new_flux_tariff
+
+HALF_HOUR = timedelta(minutes=30)
+
+
+@dataclasses.dataclass
+class SyntheticDataset:
+    """Fake meters, flux tariffs and half-hourly readings to measure the hot paths on.
+
+    Half the meters are importing and the other half exporting, there is one flux tariff per
+    direction and per year.
+    Expected to be built inside a transaction that is rolled back afterward.
+    The readings span days when given (small datasets for the tests), years otherwise.
+    """
+
+    start: date
+    years: int = 3
+    meters: int = 4
+    seed: int = 0
+    batch_size: int = 5000
+    # prefix of the API key, MPAN and serial names
+    name: str = 'benchmark'
+    days: int | None = None
+
+    @property
+    def end(self) -> date:
+        if self.days is not None:
+            return self.start + timedelta(days=self.days)
+        return self.start.replace(year=self.start.year + self.years)
+
+    @classmethod
+    def directions(cls) -> tuple[models.Direction, models.Direction]:
+        return models.Direction.IMPORTING, models.Direction.EXPORTING
+
+    def build_tariffs(self) -> list[str]:
+        names = []
+        for direction in self.directions():
+            for year in range(self.years):
+                start_date = self.start.replace(year=self.start.year + year)
+                names.append(
+                    add_new_flux_tariff(
+                        NewFluxTariff(
+                            start_date=start_date,
+                            end_date=start_date.replace(year=start_date.year + 1),
+                            direction=direction,
+                            low_rate=0.07 + year / 100,
+                            base_rate=0.19 + year / 100,
+                            peak_rate=0.32 + year / 100,
+                        ),
+                    ),
+                )
+        return names
+
+    def build_meters(self) -> list[models.Meter]:
+        api_key = models.APIKey.objects.create(name=self.name, api_key=f'sk_{self.name}')
+        meters = []
+        for i in range(self.meters):
+            mpan = models.MPAN.objects.create(
+                mpan=f'{self.name}-{i:04d}',
+                direction=self.directions()[i % 2],
+                api_key=api_key,
+            )
+            meters.append(
+                models.Meter.objects.create(
+                    serial=f'{self.name}-serial-{i:04d}',
+                    energy_type=models.EnergyType.ELECTRICITY,
+                    metric_unit=models.MetricUnit.KWH,
+                    mpan=mpan,
+                ),
+            )
+        return meters
+
+    def readings(self) -> list[tuple[datetime, datetime, float]]:
+        """The same (interval_start, interval_end, consumption) series for every meter"""
+        rng = random.Random(self.seed)
+        current = datetime.combine(self.start, datetime.min.time(), tzinfo=UTC)
+        end = datetime.combine(self.end, datetime.min.time(), tzinfo=UTC)
+        series = []
+        while current < end:
+            series.append((current, current + HALF_HOUR, round(rng.uniform(0.0, 1.5), 3)))
+            current += HALF_HOUR
+        return series
+
+    def build_consumption(self, meters: list[models.Meter]) -> int:
+        series = self.readings()
+        total = 0
+        counters = models.ReadingCounters()
+        for meter in meters:
+            created = models.Consumption.objects.bulk_create(
+                (
+                    models.Consumption(
+                        consumption=consumption,
+                        interval_start=interval_start,
+                        interval_end=interval_end,
+                        meter=meter,
+                    )
+                    for interval_start, interval_end, consumption in series
+                ),
+                batch_size=self.batch_size,
+            )
+            total += len(created)
+            counters.inserted(meter.id, len(created), series[-1][0] if series else None)
+        counters.flush()
+        return total
+
+    def build(self) -> int:
+        """Create everything and return the number of consumption rows"""
+        self.build_tariffs()
+        return self.build_consumption(self.build_meters())
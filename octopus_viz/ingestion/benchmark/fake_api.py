@@ -0,0 +1,204 @@
+import bisect
+import json
+import re
+import threading
+from collections.abc import Iterable
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Self
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.utils import timezone
+
+from ingestion import models
+from ingestion.octopus_client.api import ConsumptionPage, OctopusAPI
+
+CONSUMPTION_PATH = re.compile(
+    r'^/v1/(electricity|gas)-meter-points/(?P<mpan>[^/]+)/meters/(?P<serial>[^/]+)/consumption/?$',
+)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the clients close their connections when they are done
+        pass
+
+
+class FakeOctopusAPI:
+    """A local HTTP server answering the consumption endpoint of the Octopus API.
+
+    Serves readings given as {(mpan, serial): [result, ...]} (ordered by interval_start) by pages
+    of page_size, the latest first unless `order_by=period` is asked like the API. Injects a
+    transient error every fail_every requests: alternately a 429 with a `Retry-After` header of
+    retry_after (none if None) and a 503 without header. Point OCTOPUS_API_URL to `url` to use it.
+    Usage:
+    ```
+    with FakeOctopusAPI(readings, fail_every=5) as server:
+        with override_settings(OCTOPUS_API_URL=server.url):
+            ...
+    ```
+    """
+
+    def __init__(
+        self,
+        readings: dict[tuple[str, str], list[dict]],
+        *,
+        page_size: int = 1000,
+        fail_every: int = 0,
+        retry_after: str | None = '0',
+    ):
+        self.readings = readings
+        self.starts = {
+            key: [self._moment(result['interval_start']) for result in results] for key, results in readings.items()
+        }
+        self.page_size = page_size
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.injected = 0
+        # each connection is a new handler: fewer than requests means the connections were reused
+        self.connections = 0
+        self._server: _QuietServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def __enter__(self) -> Self:
+        self._server = _QuietServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-octopus-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def _inject(self) -> int | None:
+        """Status of the error to answer with, if any"""
+        with self.lock:
+            self.requests += 1
+            if not self.fail_every or self.requests % self.fail_every:
+                return None
+            self.injected += 1
+            return 429 if self.injected % 2 else 503
+
+    @classmethod
+    def _moment(cls, value: str) -> datetime:
+        moment = datetime.fromisoformat(value)
+        return moment if moment.tzinfo is not None else timezone.make_aware(moment)
+
+    def page(self, path: str, query: dict[str, list[str]]) -> dict | None:
+        match = CONSUMPTION_PATH.match(path)
+        if match is None:
+            return None
+        key = match['mpan'], match['serial']
+        results = self.readings.get(key, [])
+        starts = self.starts.get(key, [])
+        first, last = 0, len(results)
+        if 'period_from' in query:
+            first = bisect.bisect_left(starts, self._moment(query['period_from'][0]))
+        if 'period_to' in query:
+            last = bisect.bisect_left(starts, self._moment(query['period_to'][0]))
+        results = results[first:last]
+        if query.get('order_by', ['-period'])[0] != 'period':
+            results = results[::-1]
+
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * self.page_size
+        next_url = None
+        if start + self.page_size < len(results):
+            next_query = {name: values[0] for name, values in query.items()} | {'page': page + 1}
+            next_url = f'{self.url}{path.removeprefix("/v1")}?{urlencode(next_query)}'
+        return {'count': len(results), 'next': next_url, 'results': results[start : start + self.page_size]}
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, like the real API
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def _send(self, status: int, body: dict, headers: dict[str, str] | None = None):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                status = server._inject()
+                if status == 429:
+                    headers = {'Retry-After': server.retry_after} if server.retry_after is not None else {}
+                    self._send(429, {'detail': 'Request was throttled.'}, headers)
+                    return
+                if status is not None:
+                    self._send(status, {'detail': 'Service unavailable'})
+                    return
+
+                url = urlsplit(self.path)
+                body = server.page(url.path, parse_qs(url.query))
+                if body is None:
+                    self._send(404, {'detail': 'Not found.'})
+                else:
+                    self._send(200, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class StubOctopusAPI(OctopusAPI):
+    """`OctopusAPI` of a meter answering from readings in memory instead of downloading them.
+
+    Takes the readings of all the meters like `FakeOctopusAPI`, and gives the pages of page_size
+    results of its meter without any HTTP: times what is done with the results only.
+    """
+
+    def __init__(self, meter: models.Meter, readings: dict[tuple[str, str], list[dict]], *, page_size=1000, **kwargs):
+        super().__init__(meter, **kwargs)
+        self.results = readings.get((meter.mpan.mpan, meter.serial), [])
+        self.starts = [FakeOctopusAPI._moment(result['interval_start']) for result in self.results]
+        self.page_size = page_size
+
+    @classmethod
+    def _moment(cls, moment: date | datetime) -> datetime:
+        if isinstance(moment, datetime):
+            return moment
+        return timezone.make_aware(datetime.combine(moment, datetime.min.time()))
+
+    def get_consumption_pages(
+        self,
+        period_from: date | datetime | None = None,
+        period_to: date | datetime | None = None,
+        *,
+        next_url: str | None = None,
+    ) -> Iterable[ConsumptionPage]:
+        first, last = 0, len(self.results)
+        if period_from is not None:
+            first = bisect.bisect_left(self.starts, self._moment(period_from))
+        if period_to is not None:
+            last = bisect.bisect_left(self.starts, self._moment(period_to))
+
+        for page, start in enumerate(range(first, last, self.page_size), start=1):
+            end = min(start + self.page_size, last)
+            next_page = f'{self.consumption_endpoint}?page={page + 1}' if end < last else None
+            # the rows are built by popping the fields of the results
+            yield ConsumptionPage([dict(result) for result in self.results[start:end]], next_page)
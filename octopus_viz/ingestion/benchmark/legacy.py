@@ -0,0 +1,82 @@
+from collections.abc import Iterable
+from datetime import date, datetime, time
+
+from django.db.models import Q, QuerySet
+
+from ingestion import models
+
+
+class LegacyAttachment:
+    """The attachment of the rates before `TariffResolver`, frozen as the reference of the
+    benchmarks and the tests: the valid tariffs and rates queried per day and direction, the best
+    rate found by a loop over the rates of the day and the rows saved one by one.
+
+    Do not change it with the resolver, it is what the resolver must give. Only the ties between
+    rates of the same interval are ordered by id, the queries left them to the database.
+    """
+
+    def __init__(self):
+        self.days: dict[tuple[date, models.Direction], tuple[models.Tariff | None, list[models.Rate]]] = {}
+
+    @classmethod
+    def _valid(cls, day: date, direction: models.Direction, prefix: str = '') -> Q:
+        return (
+            Q(**{f'{prefix}valid_from__lte': day})
+            & (Q(**{f'{prefix}valid_until__isnull': True}) | Q(**{f'{prefix}valid_until__gt': day}))
+            & Q(**{f'{prefix}direction': direction})
+        )
+
+    @classmethod
+    def day_rates(cls, day: date, direction: models.Direction) -> tuple[models.Tariff | None, list[models.Rate]]:
+        """Valid tariff and rates of a day"""
+        rates = list(
+            models.Rate.objects
+            .select_related('tariff')
+            .filter(cls._valid(day, direction, prefix='tariff__'))
+            .order_by('interval_from', 'interval_end', 'id'),
+        )
+        if rates:
+            return rates[0].tariff, rates
+        return models.Tariff.objects.filter(cls._valid(day, direction)).order_by('id').first(), rates
+
+    @classmethod
+    def best_rate(cls, rates: Iterable[models.Rate], start: time, end: time) -> models.Rate | None:
+        for rate in rates:
+            if rate.interval_from > start:
+                continue
+
+            if (rate.interval_end == time(0, 0) and start >= rate.interval_from) or rate.interval_end >= end:
+                return rate
+        return None
+
+    def resolve(
+        self,
+        direction: models.Direction,
+        interval_start: datetime,
+        interval_end: datetime,
+    ) -> tuple[models.Tariff | None, models.Rate | None]:
+        key = (interval_start.date(), direction)
+        if key not in self.days:
+            self.days[key] = self.day_rates(*key)
+        tariff, rates = self.days[key]
+        return tariff, self.best_rate(rates, interval_start.time(), interval_end.time())
+
+    def attach_row_by_row(self, queryset: QuerySet) -> int:
+        """Attach, price and save the rows one by one, the rows without rate keep theirs"""
+        saved = 0
+        for row in queryset.select_related('meter__mpan'):
+            direction = models.Direction(row.meter.mpan.direction)
+            tariff, rate = self.resolve(direction, row.interval_start, row.interval_end)
+            row.tariff = tariff
+            if rate is not None:
+                row.rate = rate
+            # the rate, otherwise the default rate of the tariff if not 0
+            unit_rate = None
+            if row.rate is not None:
+                unit_rate = row.rate.unit_rate
+            elif tariff is not None and tariff.default_rate:
+                unit_rate = tariff.default_rate
+            row.set_unit_rate(unit_rate)
+            row.save()
+            saved += 1
+        return saved
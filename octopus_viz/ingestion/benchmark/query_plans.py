@@ -0,0 +1,70 @@
+import dataclasses
+import re
+from collections.abc import Callable
+from datetime import date
+
+from django.db.models import QuerySet
+
+from ingestion import models
+from ingestion.aggregator.timeseries import TimeSeries
+from ingestion.models import MeterFilters, UpdateConsumption
+from ingestion.views.graphs import GraphDataView
+from ingestion.views.home import HomeView
+
+# Tables too large to be read entirely by a hot query
+LARGE_TABLES = (
+    models.Consumption._meta.db_table,
+    models.ConsumptionRollup._meta.db_table,
+)
+
+# e.g. "SCAN ingestion_consumption" and the scans in the order of an index like
+# "SCAN ingestion_consumption USING COVERING INDEX ...", which read every entry of the index
+_FULL_SCAN = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+def _month(direction: models.Direction) -> tuple[date, date, models.Direction]:
+    return date(2024, 3, 1), date(2024, 4, 1), direction
+
+
+# The hot queries, built by the code that runs them (the values do not matter to the plan)
+HOT_QUERIES: dict[str, Callable[[], QuerySet]] = {
+    'gather_data': lambda: GraphDataView.gather_data(*_month(models.Direction.IMPORTING)),
+    'gather_rollup': lambda: GraphDataView.gather_rollup(*_month(models.Direction.IMPORTING)),
+    'gather_rollup_directions': lambda: GraphDataView.gather_rollup(*_month(models.Direction.IMPORTING)[:2]),
+    'timeseries': lambda: TimeSeries(models.Direction.IMPORTING, *_month(models.Direction.IMPORTING)[:2]).queryset(),
+    'timeseries_pyramid': lambda: TimeSeries(
+        models.Direction.IMPORTING,
+        *_month(models.Direction.IMPORTING)[:2],
+        resolution=models.Resolution.HOUR,
+    ).queryset(),
+    'latest_consumption': lambda: MeterFilters(models.Meter(id=0)).latest_consumptions()[:1],
+    'last_entries': HomeView.last_entries,
+    'detached_rows': lambda: UpdateConsumption.gather_detached_rows(models.Consumption.objects.all()),
+}
+
+
+@dataclasses.dataclass
+class QueryPlan:
+    label: str
+    details: list[str]
+
+    @classmethod
+    def explain(cls, label: str, queryset: QuerySet) -> 'QueryPlan':
+        # sqlite rows of EXPLAIN QUERY PLAN are "id parent notused detail"
+        return cls(label, [line.split(maxsplit=3)[3] for line in queryset.explain().splitlines()])
+
+    @property
+    def full_scans(self) -> list[str]:
+        scans = []
+        for detail in self.details:
+            match = _FULL_SCAN.match(detail)
+            if match and match['table'] in LARGE_TABLES:
+                scans.append(match['table'])
+        return scans
+
+    def __str__(self):
+        return '\n'.join([f'{self.label}:', *(f'  {detail}' for detail in self.details)])
+
+
+def explain_hot_queries() -> list[QueryPlan]:
+    return [QueryPlan.explain(label, build()) for label, build in HOT_QUERIES.items()]
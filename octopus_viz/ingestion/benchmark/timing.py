@@ -0,0 +1,59 @@
+import contextlib
+import dataclasses
+import time
+import tracemalloc
+
+from django.db import connection
+
+
+@dataclasses.dataclass
+class Timing:
+    """Wall clock time, number of SQL statements and peak memory of a measured block"""
+
+    label: str
+    rows: int = 0
+    seconds: float = 0.0
+    queries: int = 0
+    # bytes allocated at most by the block, None when tracemalloc is not tracing
+    peak_memory: int | None = None
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.seconds:
+            return 0.0
+        return self.rows / self.seconds
+
+    def __str__(self):
+        peak = f', peak {self.peak_memory / 2**20:,.1f} MiB' if self.peak_memory is not None else ''
+        return (
+            f'{self.label}: {self.seconds:.3f}s for {self.rows} rows '
+            f'({self.rows_per_second:,.0f} rows/s, {self.queries} queries{peak})'
+        )
+
+
+@contextlib.contextmanager
+def measure(label: str, rows: int = 0):
+    """Time the block and count its queries, and its peak memory when tracemalloc is tracing.
+
+    Counts instead of capturing the queries so that measuring hundreds of thousands of statements
+    does not keep them all in memory. The peak memory is the one above the memory in use when the
+    block starts.
+    """
+    timing = Timing(label, rows=rows)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        in_use = tracemalloc.get_traced_memory()[0]
+
+    def count_queries(execute, sql, params, many, context):
+        timing.queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        started = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.seconds = time.perf_counter() - started
+            if tracing:
+                timing.peak_memory = tracemalloc.get_traced_memory()[1] - in_use
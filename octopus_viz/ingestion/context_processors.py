@@ -24,6 +24,10 @@ def navbar_menu(request: HttpRequest) -> dict:
                     url=urls.reverse('monthly_consumption_graph'),
                     label=_('Consumption'),
                 ),
+                SubmenuItem(
+                    url=urls.reverse('timeseries_graph'),
+                    label=_('Time series'),
+                ),
             ],
         ),
         NavbarItem.build_submenu(
@@ -1,4 +1,5 @@
-from django.forms import DateField, Form, BooleanField
+from django.core.exceptions import ValidationError
+from django.forms import BooleanField, ChoiceField, DateField, Form, IntegerField
 from django.utils.translation import gettext as _
 
 
@@ -9,3 +10,50 @@ class MonthlyGraphForm(Form):
         localize=True,
     )
     show_price = BooleanField(localize=True, required=False)
+    show_net = BooleanField(
+        localize=True,
+        required=False,
+        help_text=_('Add the net: imported minus exported'),
+    )
+
+
+class TimeSeriesGraphForm(Form):
+    DEFAULT_POINTS = 1000
+    MAX_POINTS = 5000
+
+    start = DateField(
+        input_formats=['%Y-%m-%d'],
+        help_text=_('The first day as YYYY-MM-DD'),
+        localize=True,
+    )
+    end = DateField(
+        input_formats=['%Y-%m-%d'],
+        help_text=_('The day after the last one as YYYY-MM-DD'),
+        localize=True,
+    )
+    points = IntegerField(
+        min_value=10,
+        max_value=MAX_POINTS,
+        required=False,
+        help_text=_('Maximum number of points of each line'),
+        localize=True,
+    )
+    method = ChoiceField(
+        choices=[
+            ('lttb', _('Keep the shape (largest triangle three buckets)')),
+            ('minmax', _('Keep the peaks (min and max per bucket)')),
+        ],
+        required=False,
+    )
+    show_price = BooleanField(localize=True, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('points'):
+            cleaned_data['points'] = self.DEFAULT_POINTS
+        if not cleaned_data.get('method'):
+            cleaned_data['method'] = 'lttb'
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start is not None and end is not None and end <= start:
+            raise ValidationError(_('The end has to be after the start'))
+        return cleaned_data
@@ -0,0 +1,109 @@
+import logging
+import time
+from collections.abc import Callable
+from datetime import date
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.utils import timezone, translation
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    if day.month < 12:
+        return day.replace(day=1, month=day.month + 1)
+    return day.replace(day=1, month=1, year=day.year + 1)
+
+
+class GraphCache:
+    """Cache of the graph data, keyed by the data version of the month.
+
+    Each month has a version (the time of its last change) and there is a global version for the
+    changes touching every month (tariffs, full rebuild of the rollup).
+    Invalidating only bumps the versions: the entries of the old versions are never read again
+    and expire on their own.
+
+    Note: the ingestion usually runs in a management command, use a cache shared by the processes
+    (e.g. file based) for the server to see the invalidation.
+    """
+
+    GLOBAL_VERSION_KEY = 'graph-version:all'
+
+    @classmethod
+    def cache(cls) -> BaseCache:
+        return caches[getattr(settings, 'OCTOPUS_GRAPH_CACHE', 'default')]
+
+    @classmethod
+    def _month_version_key(cls, month: date) -> str:
+        return f'graph-version:{month:%Y-%m}'
+
+    @classmethod
+    def versions(cls, month: date) -> tuple[str, float]:
+        """Version of the data of the month and the time of its last change"""
+        cache = cls.cache()
+        keys = [cls.GLOBAL_VERSION_KEY, cls._month_version_key(month_start(month))]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # first time seen (or evicted): any previous entry is stale
+                cache.add(key, time.time(), timeout=None)
+                found[key] = cache.get(key)
+
+        stamps = [found[key] for key in keys]
+        return '-'.join(f'{stamp:.6f}' for stamp in stamps), max(stamps)
+
+    @classmethod
+    def get_or_compute(
+        cls,
+        view_name: str,
+        month: date,
+        show_price: bool,
+        compute: Callable[[], Any],
+    ) -> tuple[Any, str, float]:
+        """Return the (data, etag, last_modified) of the view for the month"""
+        version, last_modified = cls.versions(month)
+        # the labels are translated
+        etag = f'{view_name}-{month:%Y-%m}-{int(show_price)}-{translation.get_language()}-{version}'
+        key = f'graph-data:{etag}'
+
+        cache = cls.cache()
+        data = cache.get(key)
+        if data is None:
+            data = compute()
+            cache.set(key, data)
+        return data, etag, last_modified
+
+    @classmethod
+    def _bump(cls, keys: list[str]):
+        cls.cache().set_many(dict.fromkeys(keys, time.time()), timeout=None)
+
+    @classmethod
+    def invalidate_all(cls):
+        logger.debug('Invalidate the graph cache of every month')
+        cls._bump([cls.GLOBAL_VERSION_KEY])
+
+    @classmethod
+    def invalidate_months(cls, first_day: date | None, last_day: date | None):
+        """Invalidate the months between the 2 days (inclusive)
+
+        An open start invalidates every month, an open end stops at the current month.
+        """
+        if first_day is None:
+            cls.invalidate_all()
+            return
+        if last_day is None:
+            last_day = timezone.localdate()
+
+        keys = []
+        month = month_start(first_day)
+        while month <= last_day:
+            keys.append(cls._month_version_key(month))
+            month = next_month(month)
+        logger.debug(f'Invalidate the graph cache from {first_day} to {last_day}')
+        cls._bump(keys)
@@ -0,0 +1,19 @@
+from django.core.cache import BaseCache, caches
+
+
+class HealthCache:
+    """Cache of the checks of the home page (`views.home.HealthSnapshot`).
+
+    Kept apart from the view, which imports the models, so that the models can drop it in the
+    same on_commit hooks as the graph cache (see `GraphCache`).
+    """
+
+    CACHE_KEY = 'home-health-snapshot'
+
+    @classmethod
+    def cache(cls) -> BaseCache:
+        return caches['default']
+
+    @classmethod
+    def invalidate(cls):
+        cls.cache().delete(cls.CACHE_KEY)
@@ -1,7 +1,15 @@
+import collections
 import logging
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TypeVar
 
+import django
 from django.core.management import BaseCommand
 
+T = TypeVar('T')
+R = TypeVar('R')
+
 
 class CommandAsLogger:
     """A very brittle Logger interface"""
@@ -29,3 +37,22 @@ class CommandAsLogger:
     def exception(self, *args, **kwargs):
         # TODO(tr) print the exception state
         self._command.stderr.write(*args, **kwargs)
+
+
+def parse_in_processes(parse: Callable[[T], R], items: Iterable[T], jobs: int) -> Iterator[tuple[T, Future[R]]]:
+    """Parse the items (files or parts of files) in a pool of jobs processes, yield (item, future)
+    in the order of items.
+
+    parse has to be a module level function. At most jobs items are parsed ahead of the caller so
+    the parsed items waiting to be written stay bounded, items is read as lazily.
+    future.result() raises the error of parse.
+    """
+    # the processes may be spawned (not forked): they need django to import the models
+    with ProcessPoolExecutor(jobs, initializer=django.setup) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append((item, executor.submit(parse, item)))
+            if len(pending) > jobs:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
@@ -0,0 +1,127 @@
+import tracemalloc
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from ingestion.benchmark.baseline import Baseline
+from ingestion.benchmark.cases import CASES, default_start
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.benchmark.timing import measure
+
+from ._utils import CommandAsLogger
+
+
+class Command(BaseCommand):
+    help = 'Time the hot paths on a synthetic dataset - everything is rolled back afterward'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'case',
+            type=str,
+            nargs='*',
+            help=f'The benchmarks to run, all of them by default. Choices: {", ".join(sorted(CASES))}',
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=3,
+            help='Years of half-hourly readings per meter',
+        )
+        parser.add_argument(
+            '--meters',
+            type=int,
+            default=4,
+            help='Number of meters, half importing and half exporting',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+        )
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Trace the allocations to report the peak memory of each timing - slower',
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            help='JSON file of the timings of a previous run: fail if a timing regressed since',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Write the timings of this run into the --baseline file',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='Fraction by which a timing can be slower or use more memory than the baseline',
+        )
+
+    def run_case(self, name: str, dataset: SyntheticDataset, baseline: Baseline | None) -> list[str]:
+        """Run the case on the dataset, rolled back afterward, and return its regressions"""
+        regressions = []
+        self.stdout.write(f'Benchmark {name} on {dataset.years} years x {dataset.meters} meters')
+        with transaction.atomic():
+            with measure('synthetic dataset') as timing:
+                timing.rows = dataset.build()
+            self.stdout.write(f'  {timing}')
+
+            for result in CASES[name](dataset, CommandAsLogger(self)):
+                self.stdout.write(f'  {result}')
+                if baseline is not None:
+                    for regression in baseline.compare(name, result):
+                        self.stderr.write(f'    regressed {regression}')
+                        regressions.append(regression)
+
+            transaction.set_rollback(True)
+        return regressions
+
+    def handle(
+        self,
+        case: list[str],
+        years: int,
+        meters: int,
+        seed: int,
+        memory: bool,
+        baseline: str | None,
+        save_baseline: bool,
+        tolerance: float,
+        **kwargs,
+    ):
+        unknown = set(case) - set(CASES)
+        if unknown:
+            raise CommandError(f'Unknown benchmark {", ".join(sorted(unknown))}')
+        if save_baseline and baseline is None:
+            raise CommandError('--save-baseline requires --baseline')
+
+        dataset = SyntheticDataset(start=default_start(years), years=years, meters=meters, seed=seed)
+        if baseline is not None:
+            parameters = {
+                'start': dataset.start.isoformat(),
+                'years': years,
+                'meters': meters,
+                'seed': seed,
+                'memory': memory,
+            }
+            baseline = Baseline.load(baseline, parameters, tolerance=tolerance)
+            if not baseline.comparable:
+                self.stderr.write(f'No baseline in {baseline.path} for {parameters}, nothing to compare')
+
+        regressions = []
+        if memory:
+            tracemalloc.start()
+        try:
+            for name in case or sorted(CASES):
+                regressions += self.run_case(name, dataset, baseline)
+        finally:
+            if memory:
+                tracemalloc.stop()
+
+        if save_baseline:
+            baseline.save()
+            self.stdout.write(f'Saved the timings into {baseline.path}')
+        if regressions:
+            raise CommandError(f'{len(regressions)} timings regressed since {baseline.path}')
@@ -1,14 +1,20 @@
 import dataclasses
+import itertools
 import json
 import logging
 import os.path
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Self
 
 from django.core.management import BaseCommand
-from django.db import transaction, IntegrityError
+from django.db import transaction
 
 from ingestion import models
+from ingestion.utils import in_batches
+
+from ._utils import CommandAsLogger, parse_in_processes
 
 
 logger = logging.getLogger(__name__)
@@ -41,7 +47,16 @@ class FileData:
         return f'{self.energy_type.value.lower()}_{self.direction.name.lower()}_{self.metric_unit.value.lower()}'
 
     @classmethod
-    def from_line(cls, line: str) -> Self:
+    def check_units(cls, entries: list[Self], *, unit_str: str, first_line: int = 1):
+        """Ensure all elements have the same unit"""
+        for line, entry in enumerate(entries, start=first_line):
+            if unit_str != entry.unit_str:
+                raise RuntimeError(
+                    f'Found elements with different units at line {line}, {unit_str=} vs {entry.unit_str=}',
+                )
+
+    @classmethod
+    def from_line(cls, line: str | bytes) -> Self:
         data = json.loads(line)
         consumption = float(data.pop('consumption'))
         energy_str, direction_str, metric_unit_str = data.pop('unit').split('_')
@@ -60,9 +75,52 @@ class FileData:
         )
 
 
+@dataclasses.dataclass(frozen=True)
+class FileChunk:
+    """Lines of the number-th file from a byte offset, parsed by the processes of --jobs"""
+
+    number: int
+    path: str
+    offset: int
+    lines: int
+
+    @classmethod
+    def split(cls, number: int, path: str, chunk_size: int) -> Iterator[Self]:
+        """The chunks of chunk_size lines of the file, found without parsing the lines.
+
+        A file without lines, or which cannot be read, is a chunk of no lines: its job raises the
+        error of the file or gives no lines.
+        """
+        offset = 0
+        try:
+            with open(path, 'rb') as fin:
+                while sizes := [len(line) for line in itertools.islice(fin, chunk_size)]:
+                    yield cls(number, path, offset, len(sizes))
+                    offset += sum(sizes)
+        except OSError:
+            # the error of a file which cannot be read at all is raised by its job
+            if offset:
+                raise
+        if offset == 0:
+            yield cls(number, path, 0, 0)
+
+
+def parse_chunk(chunk: FileChunk) -> list[FileData]:
+    """Parse the lines of a chunk, run by the processes of --jobs.
+
+    The units are checked by the writer, like for the files parsed while written, so that a file
+    fails with the same error whatever the number of jobs.
+    """
+    with open(chunk.path, 'rb') as fin:
+        fin.seek(chunk.offset)
+        return [FileData.from_line(line) for line in itertools.islice(fin, chunk.lines)]
+
+
 class Command(BaseCommand):
     help = 'Ingest data from a cache file generated by the old interface'
 
+    DEFAULT_CHUNK_SIZE = 5000
+
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
@@ -74,16 +132,24 @@ class Command(BaseCommand):
             '--create-missing-meter',
             action='store_true',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=self.DEFAULT_CHUNK_SIZE,
+            help='Lines read from the file and inserted at a time',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Parse the chunks of the files in that many other processes, the files are still written one by one.',
+        )
 
-    def _load_data(self, filename: str) -> list[FileData]:
-        data = []
+    @classmethod
+    def _load_data(cls, filename: str, chunk_size: int) -> Iterator[list[FileData]]:
+        """Parse the lines of the file lazily, chunk_size lines at a time"""
         with open(filename) as fin:
-            for line in fin:
-                data.append(FileData.from_line(line))
-        self.stdout.write(f'  {len(data)} objects loaded from file')
-        if not data:
-            raise RuntimeError('The file is empty')
-        return data
+            yield from in_batches(map(FileData.from_line, fin), chunk_size)
 
     @classmethod
     def meter_from_filename(cls, file_info: FilenameInfo) -> models.Meter | None:
@@ -140,46 +206,121 @@ class Command(BaseCommand):
 
         return meter
 
-    def _data_ingestion(self, meter: models.Meter, data: list[FileData]) -> int:
-        exp_unit_str = data[0].unit_str
+    def _data_ingestion(self, meter: models.Meter, chunks: Iterable[list[FileData]]) -> tuple[int, datetime, datetime]:
+        """Insert the chunks of the file, the lines already in the database are skipped.
 
+        :return: the number of inserted lines and the first and last interval_start of the file
+        """
+        exp_unit_str = None
         ingested = 0
-        for line, entry in enumerate(data, start=1):
-            # Ensure all elements have the same unit
-            if exp_unit_str != entry.unit_str:
-                # We are in a transaction - all is roll-backed
-                raise RuntimeError(
-                    f'Found elements with different units at line {line}, {exp_unit_str=} vs {entry.unit_str=}',
-                )
+        counters = models.ReadingCounters()
+        lines = 0
+        earliest = None
+        latest = None
+        for number, chunk in enumerate(chunks, start=1):
+            if exp_unit_str is None:
+                exp_unit_str = chunk[0].unit_str
+            # We are in a transaction - all is roll-backed
+            FileData.check_units(chunk, unit_str=exp_unit_str, first_line=lines + 1)
+            lines += len(chunk)
 
-            with transaction.atomic():
-                try:
-                    models.Consumption.objects.create(
+            chunk_earliest = min(entry.interval_start for entry in chunk)
+            chunk_latest = max(entry.interval_start for entry in chunk)
+            earliest = chunk_earliest if earliest is None else min(earliest, chunk_earliest)
+            latest = chunk_latest if latest is None else max(latest, chunk_latest)
+
+            # the rows of the chunk already present are ignored by the insert, count them around it
+            present = models.Consumption.objects.filter(
+                meter=meter,
+                interval_start__gte=chunk_earliest,
+                interval_start__lte=chunk_latest,
+            )
+            before = present.count()
+            models.Consumption.objects.bulk_create(
+                [
+                    models.Consumption(
                         consumption=entry.consumption,
                         interval_start=entry.interval_start,
                         interval_end=entry.interval_end,
                         meter=meter,
                         rate=None,
                     )
-                except IntegrityError:
-                    self.stdout.write(f'  skipping {entry} that is already present...')
-                else:
-                    ingested += 1
-        return ingested
+                    for entry in chunk
+                ],
+                ignore_conflicts=True,
+            )
+            inserted = present.count() - before
+            ingested += inserted
+            counters.inserted(meter.id, inserted, chunk_latest)
+            self.stdout.write(
+                f'  chunk {number}: {inserted} inserted, {len(chunk) - inserted} already present '
+                f'({lines} lines so far)',
+            )
+        counters.flush()
+        return ingested, earliest, latest
 
-    def load_file(self, filepath: str, *, create_missing_meter: bool):
+    def load_file(
+        self,
+        filepath: str,
+        *,
+        create_missing_meter: bool,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunks: Iterable[list[FileData]] | None = None,
+    ):
+        """Write the file in one transaction, chunks are its lines parsed by `parse_chunk`"""
         self.stdout.write(f'Loading information from {filepath}...')
         with transaction.atomic():
             file_info = FilenameInfo.from_filename(filepath)
-            data = self._load_data(filepath)
-            meter = self._upsert_meter(file_info, create_meter=create_missing_meter, first_elem=data[0])
-            ingested = self._data_ingestion(meter, data)
+            if chunks is None:
+                chunks = self._load_data(filepath, chunk_size)
+            chunks = iter(chunks)
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                raise RuntimeError('The file is empty')
+            meter = self._upsert_meter(file_info, create_meter=create_missing_meter, first_elem=first_chunk[0])
+            ingested, earliest, latest = self._data_ingestion(meter, itertools.chain([first_chunk], chunks))
             self.stdout.write(f'Ingested {ingested} objects from {filepath}')
+            # the lines already present were left untouched
+            if ingested:
+                models.RollupConsumption(CommandAsLogger(self)).refresh(meter.id, earliest, latest)
+
+    @classmethod
+    def _results(cls, parsed: Iterable[tuple[FileChunk, Future[list[FileData]]]]) -> Iterator[list[FileData]]:
+        for _chunk, future in parsed:
+            data = future.result()
+            # the chunk of a file without lines
+            if data:
+                yield data
 
-    def handle(self, file_path: list[str], create_missing_meter: bool, **kwargs):
-        for filepath in file_path:
+    @classmethod
+    def _parsed_files(
+        cls,
+        file_path: list[str],
+        jobs: int,
+        chunk_size: int,
+    ) -> Iterator[tuple[str, Iterator[list[FileData]] | None]]:
+        if jobs > 1:
+            # the chunks are parsed ahead of the one written, across the files: only jobs chunks
+            # are in memory at a time, whatever the size of the files
+            chunks = (
+                chunk for number, path in enumerate(file_path) for chunk in FileChunk.split(number, path, chunk_size)
+            )
+            parsed = parse_in_processes(parse_chunk, chunks, jobs)
+            for number, file_chunks in itertools.groupby(parsed, key=lambda pair: pair[0].number):
+                yield file_path[number], cls._results(file_chunks)
+        else:
+            # parsed while written
+            yield from ((filepath, None) for filepath in file_path)
+
+    def handle(self, file_path: list[str], create_missing_meter: bool, chunk_size: int, jobs: int, **kwargs):
+        for filepath, chunks in self._parsed_files(file_path, jobs, chunk_size):
             try:
-                self.load_file(filepath, create_missing_meter=create_missing_meter)
+                self.load_file(
+                    filepath,
+                    create_missing_meter=create_missing_meter,
+                    chunk_size=chunk_size,
+                    chunks=chunks,
+                )
             except Exception as ex:
                 self.stderr.write(f'Failed to load {filepath}')
                 self.stderr.write(f'Error: {ex.__class__.__name__}: {ex}')
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from ingestion.benchmark.query_plans import explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'Fail if one of the hot queries reads the readings with a full table scan (sqlite only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Show the query plan of every query, not only the failing ones',
+        )
+
+    def handle(self, verbose_plans: bool, **kwargs):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'Query plans are only checked on sqlite, not {connection.vendor}')
+
+        failed = []
+        for plan in explain_hot_queries():
+            if plan.full_scans:
+                failed.append(plan.label)
+                self.stderr.write(f'{plan}\n  -> full scan of {", ".join(plan.full_scans)}')
+            elif verbose_plans:
+                self.stdout.write(str(plan))
+
+        if failed:
+            raise CommandError(f'Full table scan in {", ".join(failed)}')
+        self.stdout.write('No full table scan in the hot queries')
@@ -1,6 +1,8 @@
 import dataclasses
 import json
 import logging
+from collections.abc import Iterator
+from concurrent.futures import Future
 from datetime import time, datetime
 from operator import attrgetter
 from typing import Self
@@ -9,6 +11,10 @@ from django.core.management import BaseCommand
 from django.db import transaction
 
 from ingestion import models
+from ingestion.graph_cache import GraphCache
+from ingestion.health_cache import HealthCache
+
+from ._utils import parse_in_processes
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +82,13 @@ class TariffObject:
         )
 
 
+def parse_file(filename: str) -> list[TariffObject]:
+    """Parse the tariffs of a whole file, run by the processes of --jobs"""
+    with open(filename, 'r') as fin:
+        data = json.load(fin)
+    return [TariffObject.from_object(tariff_name, tariff) for tariff_name, tariff in data['tariffs'].items()]
+
+
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
@@ -84,6 +97,12 @@ class Command(BaseCommand):
             nargs='+',
             help='The path to the JSON config file',
         )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Parse that many files at the same time in other processes, the files are still written one by one.',
+        )
 
     def _load_tariff(self, tariff_obj: TariffObject):
         with transaction.atomic():
@@ -105,28 +124,42 @@ class Command(BaseCommand):
                     tariff=tariff,
                 )
 
-    def load_file(self, filename: str):
+            valid_from = tariff_obj.valid_from.date() if tariff_obj.valid_from else None
+            valid_until = tariff_obj.valid_until.date() if tariff_obj.valid_until else None
+            transaction.on_commit(lambda: GraphCache.invalidate_months(valid_from, valid_until))
+            transaction.on_commit(HealthCache.invalidate)
+
+    def load_file(self, filename: str, tariffs: list[TariffObject] | None = None):
+        """Write the tariffs of the file in one transaction, tariffs when parsed by --jobs"""
         self.stdout.write(f'Loading data from {filename}')
-        with open(filename, 'r') as fin:
-            data = json.load(fin)
+        if tariffs is None:
+            tariffs = parse_file(filename)
 
-        existing_tariffs = set(row['name'] for row in models.Tariff.objects.values('name'))
+        with transaction.atomic():
+            existing_tariffs = set(row['name'] for row in models.Tariff.objects.values('name'))
 
-        for tariff_name, tariff in data['tariffs'].items():
-            if tariff_name in existing_tariffs:
-                # TODO(tr) option to override?
-                self.stdout.write(f'Skipping existing {tariff_name}')
-                continue
-            self.stdout.write(f'Loading {tariff_name}')
+            for tariff_obj in tariffs:
+                if tariff_obj.name in existing_tariffs:
+                    # TODO(tr) option to override?
+                    self.stdout.write(f'Skipping existing {tariff_obj.name}')
+                    continue
+                self.stdout.write(f'Loading {tariff_obj.name}')
 
-            tariff_obj = TariffObject.from_object(tariff_name, tariff)
-            # TODO(tr) check that we have rates for every hours!
-            self._load_tariff(tariff_obj)
+                # TODO(tr) check that we have rates for every hours!
+                self._load_tariff(tariff_obj)
 
-    def handle(self, file_path: list[str], **kwargs):
-        for filepath in file_path:
+    @classmethod
+    def _parsed_files(cls, file_path: list[str], jobs: int) -> Iterator[tuple[str, Future[list[TariffObject]] | None]]:
+        if jobs > 1:
+            yield from parse_in_processes(parse_file, file_path, jobs)
+        else:
+            # parsed while written
+            yield from ((filepath, None) for filepath in file_path)
+
+    def handle(self, file_path: list[str], jobs: int = 1, **kwargs):
+        for filepath, parsed in self._parsed_files(file_path, jobs):
             try:
-                self.load_file(filepath)
+                self.load_file(filepath, parsed.result() if parsed is not None else None)
             except Exception as ex:
                 self.stderr.write(f'Failed to load {filepath}')
                 self.stderr.write(f'Error: {ex.__class__.__name__}: {ex}')
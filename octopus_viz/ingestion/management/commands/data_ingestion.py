@@ -1,6 +1,6 @@
 from datetime import date
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 from django.utils import timezone
 
 from ingestion.models import IngestConsumption
@@ -43,6 +43,66 @@ class Command(BaseCommand):
             type=str,
             help='Save the result from the API to a jsons file instead of to the database.',
         )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            help='Save the result from the API to a parquet archive (see load_archive) instead of to the database.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            nargs='?',
+            default=None,
+            const=IngestConsumption.BULK_BATCH_SIZE,
+            help=(
+                'Write the downloaded rows to the database with bulk upserts by batches of that size '
+                f'({IngestConsumption.BULK_BATCH_SIZE} if not given) instead of one by one.'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Download that many meters at the same time, the rows are still written by a single thread.',
+        )
+        parser.add_argument(
+            '--max-requests-per-key',
+            type=int,
+            default=IngestConsumption.DEFAULT_MAX_REQUESTS_PER_KEY,
+            help='Maximum number of requests in flight at the same time for one API key when using --workers.',
+        )
+        parser.add_argument(
+            '--shard-days',
+            type=int,
+            default=None,
+            help=(
+                'Split the period of each meter into windows of that many days downloaded concurrently '
+                '(e.g. 31 for about a month). Use with --workers.'
+            ),
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help=(
+                'Download all the meters at the same time with asyncio (needs aiohttp), the rows are still written '
+                'by a single thread. --max-requests-per-key and --shard-days apply.'
+            ),
+        )
+        parser.add_argument(
+            '--checkpoint-pages',
+            type=int,
+            default=None,
+            help=(
+                'Commit the rows every that many pages of results with the position of the download, '
+                f'see --resume (default {IngestConsumption.DEFAULT_CHECKPOINT_PAGES} with --resume).'
+            ),
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue the downloads interrupted after their last checkpoint instead of downloading them again.',
+        )
 
     @classmethod
     def handle_date(cls, value: str | None) -> date | None:
@@ -57,12 +117,38 @@ class Command(BaseCommand):
         meter_mpan: str | None = None,
         pretend: bool = False,
         debug_filename: str | None = None,
+        archive_dir: str | None = None,
+        batch_size: int | None = None,
+        workers: int = 1,
+        max_requests_per_key: int = IngestConsumption.DEFAULT_MAX_REQUESTS_PER_KEY,
+        shard_days: int | None = None,
+        checkpoint_pages: int | None = None,
+        resume: bool = False,
+        use_async: bool = False,
         **options,
     ):
         start = self.handle_date(period_from)
         end = self.handle_date(period_to) or timezone.now().date()
 
-        IngestConsumption(CommandAsLogger(self), pretend=pretend, debug_filename=debug_filename).ingest(
+        if (checkpoint_pages or resume) and (workers > 1 or shard_days or use_async):
+            raise CommandError('--checkpoint-pages and --resume cannot be used with --workers, --shard-days or --async')
+        if (checkpoint_pages or resume) and (debug_filename or archive_dir):
+            # the checkpoints commit the rows written to the database
+            raise CommandError('--checkpoint-pages and --resume cannot be used with --debug-filename or --archive-dir')
+
+        IngestConsumption(
+            CommandAsLogger(self),
+            pretend=pretend,
+            debug_filename=debug_filename,
+            batch_size=batch_size,
+            workers=workers,
+            max_requests_per_key=max_requests_per_key,
+            shard_days=shard_days,
+            archive_dir=archive_dir,
+            checkpoint_pages=checkpoint_pages,
+            resume=resume,
+            use_async=use_async,
+        ).ingest(
             start,
             end,
             meter_mpan=meter_mpan,
@@ -0,0 +1,70 @@
+from datetime import date
+
+from django.core.management import BaseCommand
+
+from ingestion import models
+from ingestion.archive import ConsumptionArchive
+from ingestion.graph_cache import month_start, next_month
+
+from ._utils import CommandAsLogger
+
+
+class Command(BaseCommand):
+    help = 'Export the readings to a parquet archive partitioned by meter and month'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive_dir',
+            type=str,
+            help='The directory of the archive, the exported months replace the ones already there',
+        )
+        parser.add_argument(
+            '--meter-mpan',
+            type=str,
+            default=None,
+            help='Only export the meters of this MPAN',
+        )
+        parser.add_argument(
+            '--period-from',
+            type=date.fromisoformat,
+            default=None,
+            help='Export the months from this date (YYYY-MM-DD), the whole month of the date is exported',
+        )
+        parser.add_argument(
+            '--period-to',
+            type=date.fromisoformat,
+            default=None,
+            help='Export the months until this date (YYYY-MM-DD), the whole month of the date is exported',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ConsumptionArchive.DEFAULT_BATCH_SIZE,
+            help='Rows read from the database and written at a time',
+        )
+
+    def handle(
+        self,
+        archive_dir: str,
+        meter_mpan: str | None,
+        period_from: date | None,
+        period_to: date | None,
+        batch_size: int,
+        **kwargs,
+    ):
+        queryset = models.Consumption.objects.all()
+        if meter_mpan is not None:
+            queryset = queryset.filter(meter__mpan__mpan=meter_mpan)
+        # whole months, an archived month is replaced entirely
+        if period_from is not None:
+            queryset = queryset.filter(
+                interval_start__gte=models.RollupConsumption.local_midnight(month_start(period_from)),
+            )
+        if period_to is not None:
+            queryset = queryset.filter(
+                interval_start__lt=models.RollupConsumption.local_midnight(next_month(period_to)),
+            )
+
+        archive = ConsumptionArchive(archive_dir, batch_size=batch_size, logger=CommandAsLogger(self))
+        exported = archive.export(queryset)
+        self.stdout.write(f'Exported {exported} readings to {archive_dir}')
@@ -0,0 +1,35 @@
+from django.core.management import BaseCommand, CommandError
+
+from ingestion.archive import ConsumptionArchive
+from ingestion.models import IngestConsumption
+
+from ._utils import CommandAsLogger
+
+
+class Command(BaseCommand):
+    help = 'Load the readings of a parquet archive (see export_archive) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive_dir',
+            type=str,
+            help='The directory of the archive, its meters must exist in the database',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IngestConsumption.BULK_BATCH_SIZE,
+            help='Rows read from the archive and written to the database at a time',
+        )
+
+    def handle(self, archive_dir: str, batch_size: int, **kwargs):
+        logger = CommandAsLogger(self)
+        ingest = IngestConsumption(logger, batch_size=batch_size)
+        try:
+            loaded = ConsumptionArchive(archive_dir, batch_size=batch_size, logger=logger).load(ingest)
+        except RuntimeError as ex:
+            raise CommandError(str(ex)) from ex
+        self.stdout.write(
+            f'Loaded {loaded} readings from {archive_dir}: '
+            f'{ingest.inserted_rows} inserted and {ingest.updated_rows} updated',
+        )
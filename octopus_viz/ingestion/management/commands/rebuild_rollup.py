@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from ._utils import CommandAsLogger
+from ingestion.models import RollupConsumption
+
+
+class Command(BaseCommand):
+    help = 'Compute again the daily rollup and the time series pyramid from all the consumption rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pretend',
+            action='store_true',
+        )
+
+    def handle(self, pretend: bool, **kwargs):
+        RollupConsumption(logger=CommandAsLogger(self), pretend=pretend).rebuild()
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from ._utils import CommandAsLogger
+from ingestion.models import ReadingCounters
+
+
+class Command(BaseCommand):
+    help = 'Count the readings of every meter and repair the counters used by the home page and the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pretend',
+            action='store_true',
+            help='Only report the counters that are wrong',
+        )
+
+    def handle(self, pretend: bool, **kwargs):
+        with transaction.atomic():
+            wrong = ReadingCounters.reconcile(CommandAsLogger(self), pretend=pretend)
+        if not wrong:
+            self.stdout.write('The counters of every meter are right')
+        elif pretend:
+            self.stdout.write(f'The counters of {wrong} meters are wrong')
+        else:
+            self.stdout.write(f'Repaired the counters of {wrong} meters')
@@ -5,6 +5,8 @@ from typing import Optional
 from django.db import transaction
 
 from ingestion import models
+from ingestion.graph_cache import GraphCache
+from ingestion.health_cache import HealthCache
 from ingestion.models import EnergyType, MetricUnit
 
 
@@ -51,6 +53,9 @@ def add_new_flux_tariff(params: NewFluxTariff, *, currency: str = 'GBP') -> Opti
             ).save()
             last_time = until_time
 
+        transaction.on_commit(lambda: GraphCache.invalidate_months(params.start_date, params.end_date))
+        transaction.on_commit(HealthCache.invalidate)
+
     # TODO(tr) handle integrity errors
     return tariff.name
 
@@ -66,6 +71,8 @@ def finish_current_tariff(current_tariff: models.Tariff, params: FinishCurrentTa
         if current_tariff.valid_until is None:
             current_tariff.valid_until = params.valid_until
             current_tariff.save()
+            transaction.on_commit(lambda: GraphCache.invalidate_months(params.valid_until, None))
+            transaction.on_commit(HealthCache.invalidate)
             return current_tariff.name
 
     return None
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0003_consumption_tariff_alter_tariff_valid_from_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mpan',
+            name='api_key',
+            field=models.ForeignKey(
+                blank=True,
+                help_text='API Key - if absent no new requests to octopus are possible',
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to='ingestion.apikey',
+            ),
+        ),
+        migrations.CreateModel(
+            name='ConsumptionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('I', 'Importing'), ('E', 'Exporting')], max_length=1)),
+                ('day', models.DateField(help_text='Local date of the readings')),
+                ('slot', models.TimeField(help_text='Start of the readings in the day - UTC time')),
+                ('consumption', models.FloatField()),
+                ('cost', models.FloatField(help_text='None when none of the readings had a price', null=True)),
+                ('earliest', models.DateTimeField(help_text='First interval_start - inclusive')),
+                ('latest', models.DateTimeField(help_text='Last interval_end - exclusive')),
+                ('readings', models.PositiveIntegerField()),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ingestion.meter')),
+                (
+                    'rate',
+                    models.ForeignKey(
+                        default=None,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to='ingestion.rate',
+                    ),
+                ),
+                (
+                    'tariff',
+                    models.ForeignKey(
+                        default=None,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to='ingestion.tariff',
+                    ),
+                ),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['direction', 'day'], name='rollup_direction_day'),
+                    models.Index(fields=['meter', 'day'], name='rollup_meter_day'),
+                ],
+            },
+        ),
+    ]
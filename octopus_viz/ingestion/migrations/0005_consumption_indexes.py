@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0004_consumptionrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consumption',
+            index=models.Index(fields=['interval_start', 'meter'], name='consumption_start_meter'),
+        ),
+        migrations.AddIndex(
+            model_name='consumption',
+            index=models.Index(fields=['meter', 'interval_end'], name='consumption_meter_end'),
+        ),
+    ]
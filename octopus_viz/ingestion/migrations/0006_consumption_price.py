@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:08
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def price_readings(apps, schema_editor):
+    # same as Pricing.fields, the models of the migration do not have its methods
+    Consumption = apps.get_model('ingestion', 'Consumption')
+    Rate = apps.get_model('ingestion', 'Rate')
+    Tariff = apps.get_model('ingestion', 'Tariff')
+
+    def unit_rate():
+        return Coalesce(
+            Subquery(Rate.objects.filter(id=OuterRef('rate_id')).values('unit_rate')),
+            NullIf(Subquery(Tariff.objects.filter(id=OuterRef('tariff_id')).values('default_rate')), Value(0.0)),
+        )
+
+    Consumption.objects.update(
+        unit_rate=unit_rate(),
+        cost=F('consumption') * unit_rate(),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0005_consumption_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumption',
+            name='cost',
+            field=models.FloatField(blank=True, help_text='consumption * unit_rate', null=True),
+        ),
+        migrations.AddField(
+            model_name='consumption',
+            name='unit_rate',
+            field=models.FloatField(
+                blank=True,
+                help_text='Unit rate of the rate, otherwise the default rate of the tariff',
+                null=True,
+            ),
+        ),
+        migrations.RunPython(price_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def count_readings(apps, schema_editor):
+    # same as ReadingCounters.reconcile, the models of the migration do not have its methods
+    Consumption = apps.get_model('ingestion', 'Consumption')
+    MeterCounters = apps.get_model('ingestion', 'MeterCounters')
+    MeterCounters.objects.bulk_create(
+        MeterCounters(
+            meter_id=row['meter_id'],
+            readings=row['readings'],
+            detached=row['detached'],
+            last_interval_start=row['last_interval_start'],
+        )
+        for row in Consumption.objects
+        .order_by()
+        .values('meter_id')
+        .annotate(
+            readings=Count('id'),
+            detached=Count('id', filter=Q(tariff__isnull=True)),
+            last_interval_start=Max('interval_start'),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0006_consumption_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterCounters',
+            fields=[
+                (
+                    'meter',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='counters',
+                        serialize=False,
+                        to='ingestion.meter',
+                    ),
+                ),
+                ('readings', models.BigIntegerField(default=0)),
+                ('detached', models.BigIntegerField(default=0, help_text='Readings without tariff')),
+                (
+                    'last_interval_start',
+                    models.DateTimeField(blank=True, help_text='Start of the latest reading', null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(count_readings, migrations.RunPython.noop),
+    ]
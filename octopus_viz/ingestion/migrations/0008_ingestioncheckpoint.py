@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0007_metercounters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionCheckpoint',
+            fields=[
+                (
+                    'meter',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='checkpoint',
+                        serialize=False,
+                        to='ingestion.meter',
+                    ),
+                ),
+                ('period_from', models.DateField(blank=True, null=True)),
+                ('period_to', models.DateField(blank=True, null=True)),
+                (
+                    'next_url',
+                    models.TextField(blank=True, help_text='Next page to download, empty once completed', null=True),
+                ),
+                (
+                    'last_interval_end',
+                    models.DateTimeField(blank=True, help_text='Latest end of the readings written', null=True),
+                ),
+                ('pages', models.IntegerField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
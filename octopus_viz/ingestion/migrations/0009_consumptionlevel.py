@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('ingestion', '0008_ingestioncheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('I', 'Importing'), ('E', 'Exporting')], max_length=1)),
+                (
+                    'resolution',
+                    models.CharField(
+                        choices=[
+                            ('30m', '30 minutes'),
+                            ('1h', '1 hour'),
+                            ('1d', '1 day'),
+                            ('1w', '1 week'),
+                            ('1mo', '1 month'),
+                        ],
+                        max_length=3,
+                    ),
+                ),
+                ('start', models.DateTimeField(help_text='Start of the bucket - inclusive')),
+                ('end', models.DateTimeField(help_text='End of the bucket - exclusive')),
+                ('consumption', models.FloatField()),
+                ('cost', models.FloatField(help_text='None when none of the readings had a price', null=True)),
+                ('readings', models.PositiveIntegerField()),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ingestion.meter')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'direction', 'start'], name='level_direction_start')],
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('meter', 'resolution', 'start'),
+                        name='level_meter_resolution_start',
+                    ),
+                ],
+            },
+        ),
+    ]
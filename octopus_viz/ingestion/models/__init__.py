@@ -5,6 +5,12 @@ from ._enums import *
 from ._meter import *
 from ._tariff import *
 from ._consumption import *
+from ._counters import *
+from ._checkpoint import *
+from ._pyramid import *
+from ._rollup import *
+from ._pricing import *
 from ._aggregate import *
 from ._filters import *
+from ._resolver import *
 from ._updates import *
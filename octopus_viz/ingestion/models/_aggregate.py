@@ -1,7 +1,18 @@
-from django.db.models import Aggregate, JSONField
+from django.db.models import Aggregate, Func, IntegerField, JSONField
 
 
 class JsonGroupArray(Aggregate):
     function = 'JSON_GROUP_ARRAY'
     output_field = JSONField()
     template = '%(function)s(%(distinct)s%(expression)s)'
+
+
+class UnixEpoch(Func):
+    """Seconds since epoch of a datetime column, without building a python datetime per row"""
+
+    output_field = IntegerField()
+    # sqlite stores the datetimes as UTC text
+    template = "CAST(STRFTIME('%%%%s', %(expressions)s) AS INTEGER)"
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)')
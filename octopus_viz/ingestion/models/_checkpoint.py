@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from django.db import models
+
+from ._meter import Meter
+
+
+class IngestionCheckpoint(models.Model):
+    """Where the download of a meter stopped, saved in the transaction of the pages written.
+
+    `data_ingestion --resume` continues from next_url, the pages before it are already in the
+    database. A checkpoint without next_url is a download that completed.
+    """
+
+    meter = models.OneToOneField(Meter, primary_key=True, on_delete=models.CASCADE, related_name='checkpoint')
+    period_from = models.DateField(null=True, blank=True)
+    period_to = models.DateField(null=True, blank=True)
+    next_url = models.TextField(null=True, blank=True, help_text='Next page to download, empty once completed')
+    last_interval_end = models.DateTimeField(null=True, blank=True, help_text='Latest end of the readings written')
+    pages = models.IntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        state = 'completed' if self.completed else f'stopped after {self.last_interval_end}'
+        return f'{self.meter} from {self.period_from} to {self.period_to}: {state} ({self.pages} pages)'
+
+    @property
+    def completed(self) -> bool:
+        return self.pages > 0 and self.next_url is None
+
+    def advance(self, pages: int, rows: int, last_interval_end: datetime | None, next_url: str | None):
+        """Record pages written, to be saved in their transaction"""
+        self.pages += pages
+        self.rows += rows
+        if last_interval_end is not None:
+            self.last_interval_end = max(last_interval_end, self.last_interval_end or last_interval_end)
+        self.next_url = next_url
@@ -1,18 +1,58 @@
-from django.db import models
+import dataclasses
+from datetime import datetime
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Q
+from django.dispatch import Signal
 
 from ._meter import Meter
 from ._tariff import Rate, Tariff
 
 
-class Consumption(models.Model):
-    class Meta:
-        constraints = [
-            models.UniqueConstraint(
-                fields=['meter_id', 'interval_start', 'interval_end'],
-                name='unique_consumption_interval',
-            ),
-        ]
+@dataclasses.dataclass
+class DeletedReadings:
+    """Readings of a meter deleted at once"""
+
+    readings: int
+    detached: int
+    earliest: datetime
+    latest: datetime
+
+
+# Sent with deleted={meter_id: DeletedReadings} once the readings are deleted, in the transaction
+readings_deleted = Signal()
+
+
+class ConsumptionQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the readings with a single DELETE, then send `readings_deleted`.
+
+        The rows are not loaded like with the post_delete signal: only what was deleted of each
+        meter is read first.
+        """
+        with transaction.atomic():
+            deleted = {
+                meter_id: DeletedReadings(readings, detached, earliest, latest)
+                for meter_id, readings, detached, earliest, latest in (
+                    self
+                    .order_by()
+                    .values('meter_id')
+                    .annotate(
+                        readings=Count('id'),
+                        detached=Count('id', filter=Q(tariff__isnull=True)),
+                        earliest=Min('interval_start'),
+                        latest=Max('interval_start'),
+                    )
+                    .values_list('meter_id', 'readings', 'detached', 'earliest', 'latest')
+                )
+            }
+            result = super().delete()
+            if deleted:
+                readings_deleted.send(sender=self.model, deleted=deleted)
+        return result
 
+
+class Consumption(models.Model):
     consumption = models.FloatField()
     interval_start = models.DateTimeField(help_text='Interval start - inclusive')
     interval_end = models.DateTimeField(help_text='Interval end - exclusive')
@@ -20,17 +60,41 @@ class Consumption(models.Model):
     meter = models.ForeignKey(Meter, on_delete=models.CASCADE)
     tariff = models.ForeignKey(Tariff, null=True, default=None, on_delete=models.SET_NULL)
     rate = models.ForeignKey(Rate, null=True, default=None, on_delete=models.SET_NULL)
+    # stored when the rate is attached (see Pricing), so that summing money does not join the rates
+    unit_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Unit rate of the rate, otherwise the default rate of the tariff',
+    )
+    cost = models.FloatField(null=True, blank=True, help_text='consumption * unit_rate')
+
+    objects = ConsumptionQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['meter_id', 'interval_start', 'interval_end'],
+                name='unique_consumption_interval',
+            ),
+        )
+        indexes = (
+            # readings of a period (graphs), the meter is in the index for the join on direction
+            models.Index(fields=['interval_start', 'meter'], name='consumption_start_meter'),
+            # latest reading of a meter
+            models.Index(fields=['meter', 'interval_end'], name='consumption_meter_end'),
+            # the rows waiting for a tariff are read with the index of the tariff foreign key
+        )
 
     def __str__(self):
         return f'{self.meter}[{self.interval_start} - {self.interval_end}]'
 
-    @property
-    def cost(self) -> float | None:
-        if self.rate:
-            return self.consumption * self.rate.unit_rate
-        if self.tariff and self.tariff.default_rate:
-            return self.consumption * self.tariff.default_rate
-        return None
+    def delete(self, using=None, keep_parents=False):
+        # through the queryset, so that readings_deleted is sent
+        return Consumption.objects.using(using).filter(pk=self.pk).delete()
+
+    def set_unit_rate(self, unit_rate: float | None):
+        self.unit_rate = unit_rate
+        self.cost = None if unit_rate is None else self.consumption * unit_rate
 
     @property
     def currency(self) -> str | None:
@@ -0,0 +1,183 @@
+import dataclasses
+import logging
+from datetime import datetime
+
+from django.db import models, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete
+
+from ingestion.health_cache import HealthCache
+from ._meter import Meter
+from ._tariff import Tariff
+from ._consumption import Consumption, DeletedReadings, readings_deleted
+
+
+class MeterCounters(models.Model):
+    """Counters of the readings of a meter, so that the dashboard and the admin do not count them.
+
+    They are changed by `ReadingCounters` in the transactions of the ingestion, of the attachment
+    of the rates and of the deletion of readings (`readings_deleted`). `reconcile_counters`
+    computes them again, e.g. after readings were changed with raw SQL.
+    """
+
+    meter = models.OneToOneField(Meter, primary_key=True, on_delete=models.CASCADE, related_name='counters')
+    readings = models.BigIntegerField(default=0)
+    detached = models.BigIntegerField(default=0, help_text='Readings without tariff')
+    last_interval_start = models.DateTimeField(null=True, blank=True, help_text='Start of the latest reading')
+
+    def __str__(self):
+        return f'{self.meter}: {self.readings} readings ({self.detached} detached)'
+
+    def as_tuple(self) -> tuple[int, int, datetime | None]:
+        return self.readings, self.detached, self.last_interval_start
+
+
+@dataclasses.dataclass
+class CounterChanges:
+    readings: int = 0
+    detached: int = 0
+    last_interval_start: datetime | None = None
+
+    def __bool__(self):
+        return bool(self.readings or self.detached or self.last_interval_start)
+
+
+class ReadingCounters:
+    """Changes of the counters gathered in memory, written by `flush()` in the transaction that
+    made them (one upsert per meter).
+    """
+
+    def __init__(self):
+        self.changes: dict[int, CounterChanges] = {}
+
+    def inserted(self, meter_id: int, rows: int, last_interval_start: datetime | None):
+        """rows new readings, they do not have a tariff yet"""
+        changes = self.changes.setdefault(meter_id, CounterChanges())
+        changes.readings += rows
+        changes.detached += rows
+        if last_interval_start is not None and (
+            changes.last_interval_start is None or last_interval_start > changes.last_interval_start
+        ):
+            changes.last_interval_start = last_interval_start
+
+    def detached(self, meter_id: int, rows: int):
+        """rows more readings without tariff, negative when they got one"""
+        if rows:
+            self.changes.setdefault(meter_id, CounterChanges()).detached += rows
+
+    def flush(self):
+        for meter_id, changes in self.changes.items():
+            if changes:
+                self.apply(meter_id, changes)
+        self.changes = {}
+
+    @classmethod
+    def apply(cls, meter_id: int, changes: CounterChanges):
+        MeterCounters.objects.bulk_create([MeterCounters(meter_id=meter_id)], ignore_conflicts=True)
+        fields = {
+            'readings': F('readings') + changes.readings,
+            'detached': F('detached') + changes.detached,
+        }
+        if changes.last_interval_start is not None:
+            last = Value(changes.last_interval_start, output_field=models.DateTimeField())
+            fields['last_interval_start'] = Greatest(Coalesce('last_interval_start', last), last)
+        MeterCounters.objects.filter(meter_id=meter_id).update(**fields)
+
+    @classmethod
+    def readings_deleted(cls, deleted: dict[int, DeletedReadings], **kwargs):
+        """Take the deleted readings out of the counters, the last reading is read again from the
+        readings left (the unique constraint indexes them by meter and interval_start)
+        """
+        last = (
+            Consumption.objects
+            .filter(meter_id=OuterRef('meter_id'))
+            .order_by()
+            .values('meter_id')
+            .annotate(last=Max('interval_start'))
+            .values('last')
+        )
+        for meter_id, readings in deleted.items():
+            MeterCounters.objects.filter(meter_id=meter_id).update(
+                readings=F('readings') - readings.readings,
+                detached=F('detached') - readings.detached,
+                last_interval_start=Subquery(last),
+            )
+
+    @classmethod
+    def detached_per_direction(cls) -> dict[str, int]:
+        return dict(
+            MeterCounters.objects
+            .order_by()
+            .values('meter__mpan__direction')
+            .annotate(detached=Sum('detached'))
+            .values_list('meter__mpan__direction', 'detached'),
+        )
+
+    @classmethod
+    def actual(cls) -> dict[int, tuple[int, int, datetime | None]]:
+        """The counters computed from the readings (a full scan), per meter id"""
+        return {
+            meter_id: (readings, detached, last_interval_start)
+            for meter_id, readings, detached, last_interval_start in (
+                Consumption.objects
+                .order_by()
+                .values('meter_id')
+                .annotate(
+                    readings=Count('id'),
+                    detached=Count('id', filter=Q(tariff__isnull=True)),
+                    last_interval_start=Max('interval_start'),
+                )
+                .values_list('meter_id', 'readings', 'detached', 'last_interval_start')
+            )
+        }
+
+    @classmethod
+    def reconcile(cls, logger: logging.Logger | None = None, *, pretend: bool = False) -> int:
+        """Check the counters against the readings and repair them, return how many were wrong"""
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        actual = cls.actual()
+        stored = {counters.meter_id: counters for counters in MeterCounters.objects.all()}
+
+        fixed = 0
+        for meter in Meter.objects.order_by('id'):
+            expected = actual.get(meter.id, (0, 0, None))
+            counters = stored.get(meter.id)
+            found = counters.as_tuple() if counters is not None else (0, 0, None)
+            if found == expected:
+                continue
+
+            fixed += 1
+            logger.warning(
+                f'Counters of {meter} were {found[0]} readings, {found[1]} detached, last {found[2]} '
+                f'instead of {expected[0]} readings, {expected[1]} detached, last {expected[2]}',
+            )
+            if not pretend:
+                MeterCounters.objects.update_or_create(
+                    meter=meter,
+                    defaults={'readings': expected[0], 'detached': expected[1], 'last_interval_start': expected[2]},
+                )
+        if fixed and not pretend:
+            transaction.on_commit(HealthCache.invalidate)
+        return fixed
+
+    @classmethod
+    def recount_detached(cls, **kwargs):
+        """Count the detached rows again, e.g. when a tariff is deleted (its readings lose it)"""
+        detached = dict(
+            Consumption.objects
+            .filter(tariff__isnull=True)
+            .order_by()
+            .values('meter_id')
+            .annotate(n=Count('id'))
+            .values_list('meter_id', 'n'),
+        )
+        for counters in MeterCounters.objects.all():
+            if counters.detached != detached.get(counters.meter_id, 0):
+                counters.detached = detached.get(counters.meter_id, 0)
+                counters.save(update_fields=['detached'])
+
+
+post_delete.connect(ReadingCounters.recount_detached, sender=Tariff, dispatch_uid='counters_tariff')
+readings_deleted.connect(ReadingCounters.readings_deleted, sender=Consumption, dispatch_uid='counters_readings')
@@ -27,3 +27,17 @@ class MetricUnit(models.TextChoices):
     @classmethod
     def max_len(cls) -> int:
         return max((len(k.value) for k in cls))
+
+
+class Resolution(models.TextChoices):
+    """Levels of the time series pyramid, from the finest: the half-hour level is the readings"""
+
+    HALF_HOUR = '30m', _('30 minutes')
+    HOUR = '1h', _('1 hour')
+    DAY = '1d', _('1 day')
+    WEEK = '1w', _('1 week')
+    MONTH = '1mo', _('1 month')
+
+    @classmethod
+    def max_len(cls) -> int:
+        return max(len(k.value) for k in cls)
@@ -1,10 +1,12 @@
 from datetime import date
 
-from django.db.models import QuerySet, Count, Q
+from django.db.models import Exists, Max, OuterRef, QuerySet, Count, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from ._meter import Meter, MPAN
 from ._consumption import Consumption
+from ._counters import MeterCounters
 from ._tariff import Tariff
 from ._enums import Direction, EnergyType
 
@@ -24,8 +26,35 @@ class MeterFilters:
     def get_first_consumption(self) -> Consumption | None:
         return self.filter_consumptions().order_by('interval_start').first()
 
+    def latest_consumptions(self) -> QuerySet:
+        return self.filter_consumptions().order_by('-interval_end')
+
     def get_latest_consumption(self) -> Consumption | None:
-        return self.filter_consumptions().order_by('-interval_end').first()
+        return self.latest_consumptions().first()
+
+    @classmethod
+    def outer_counters(cls, model: type[Meter] | type[MPAN]) -> QuerySet:
+        """Counters of the meter or of the meters of the MPAN of the outer query, grouped by it, for
+        subqueries
+        """
+        if model is Meter:
+            outer = 'meter'
+        elif model is MPAN:
+            outer = 'meter__mpan'
+        else:
+            raise RuntimeError(f'Unsupported for {model.__name__}')
+        return MeterCounters.objects.filter(**{outer: OuterRef('pk')}).order_by().values(outer)
+
+    @classmethod
+    def annotate_readings(cls, queryset: QuerySet) -> QuerySet:
+        """Add reading_count and last_reading (interval_start of the latest reading) to the meters
+        or MPANs of queryset, from their counters instead of one query per row
+        """
+        counters = cls.outer_counters(queryset.model)
+        return queryset.annotate(
+            reading_count=Coalesce(Subquery(counters.annotate(n=Sum('readings')).values('n')), Value(0)),
+            last_reading=Subquery(counters.annotate(last=Max('last_interval_start')).values('last')),
+        )
 
     @classmethod
     def meters_with_api_key(cls) -> QuerySet:
@@ -51,6 +80,14 @@ class MpanFilters:
             mpan__in=meter_search.filter(attached__gte=1),
         )
 
+    @classmethod
+    def configuration_counts(cls) -> dict[str, int]:
+        """Number of MPAN without API key and without meter, in one query"""
+        return MPAN.objects.aggregate(
+            without_api_key=Count('pk', filter=Q(api_key__isnull=True)),
+            without_meter=Count('pk', filter=~Exists(Meter.objects.filter(mpan=OuterRef('pk')))),
+        )
+
     # @classmethod
     # def mpan_without_recent_data(cls) -> QuerySet:
     #     meter_search = cls._mpan_meter_count()
@@ -81,6 +118,29 @@ class TariffFilters:
             energy_type=energy_type,
         ).first()
 
+    @classmethod
+    def current_and_last_tariffs(
+        cls,
+        energy_type: EnergyType,
+        *,
+        when: date | None = None,
+    ) -> dict[Direction, tuple[Tariff | None, Tariff | None]]:
+        """`current_tariff` and `last_tariff` of every direction, from a single query"""
+        if when is None:
+            when = timezone.now().date()
+
+        found = dict.fromkeys(Direction, (None, None))
+        for tariff in Tariff.objects.filter(energy_type=energy_type).order_by('pk'):
+            direction = Direction(tariff.direction)
+            current, last = found[direction]
+            valid = tariff.valid_from <= when and (tariff.valid_until is None or tariff.valid_until > when)
+            if current is None and valid:
+                current = tariff
+            if last is None or tariff.valid_from > last.valid_from:
+                last = tariff
+            found[direction] = current, last
+        return found
+
     @classmethod
     def last_tariff(cls, direction: Direction, energy_type: EnergyType) -> Tariff | None:
         try:
@@ -0,0 +1,81 @@
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.signals import post_delete, post_save
+
+from ingestion.graph_cache import GraphCache
+from ingestion.health_cache import HealthCache
+from ._tariff import Rate, Tariff, prices_updated
+from ._consumption import Consumption
+from ._rollup import ConsumptionRollup
+
+
+class Pricing:
+    """Keep the stored unit_rate and cost of the readings (and the cost of the rollup) in line with
+    the tariffs.
+
+    They are set when the rates are attached, this prices the rows again in the database when a
+    rate or the default rate of a tariff changes: saved, deleted or updated by a queryset.
+    """
+
+    @classmethod
+    def unit_rate(cls) -> models.Expression:
+        # same as TariffResolver.unit_rate: the rate, otherwise the default rate if it's not 0
+        return Coalesce(
+            Subquery(Rate.objects.filter(id=OuterRef('rate_id')).values('unit_rate')),
+            NullIf(Subquery(Tariff.objects.filter(id=OuterRef('tariff_id')).values('default_rate')), Value(0.0)),
+        )
+
+    @classmethod
+    def fields(cls, model: type[models.Model]) -> dict[str, models.Expression]:
+        """Fields of `update()` pricing the rows of model from their rate and tariff"""
+        fields = {'cost': F('consumption') * cls.unit_rate()}
+        if model is Consumption:
+            fields['unit_rate'] = cls.unit_rate()
+        return fields
+
+    @classmethod
+    def reprice(cls, **filters) -> int:
+        """Price again the readings and rollup rows matching filters"""
+        repriced = 0
+        for model in (Consumption, ConsumptionRollup):
+            repriced += model.objects.filter(**filters).update(**cls.fields(model))
+        if repriced:
+            transaction.on_commit(GraphCache.invalidate_all)
+            transaction.on_commit(HealthCache.invalidate)
+        return repriced
+
+    @classmethod
+    def rate_saved(cls, instance: Rate, created: bool, **kwargs):
+        if not created:
+            cls.reprice(rate_id=instance.id)
+
+    @classmethod
+    def rate_deleted(cls, instance: Rate, **kwargs):
+        # the rows of the rate fall back on the default rate of the tariff
+        cls.reprice(tariff_id=instance.tariff_id, rate__isnull=True)
+
+    @classmethod
+    def tariff_saved(cls, instance: Tariff, created: bool, **kwargs):
+        if not created:
+            cls.reprice(tariff_id=instance.id, rate__isnull=True)
+
+    @classmethod
+    def tariff_deleted(cls, instance: Tariff, **kwargs):
+        cls.reprice(tariff__isnull=True, rate__isnull=True, cost__isnull=False)
+
+    @classmethod
+    def rates_updated(cls, ids: list[int], **kwargs):
+        cls.reprice(rate_id__in=ids)
+
+    @classmethod
+    def tariffs_updated(cls, ids: list[int], **kwargs):
+        cls.reprice(tariff_id__in=ids, rate__isnull=True)
+
+
+post_save.connect(Pricing.rate_saved, sender=Rate, dispatch_uid='pricing_rate')
+post_delete.connect(Pricing.rate_deleted, sender=Rate, dispatch_uid='pricing_rate')
+post_save.connect(Pricing.tariff_saved, sender=Tariff, dispatch_uid='pricing_tariff')
+post_delete.connect(Pricing.tariff_deleted, sender=Tariff, dispatch_uid='pricing_tariff')
+prices_updated.connect(Pricing.rates_updated, sender=Rate, dispatch_uid='pricing_rates')
+prices_updated.connect(Pricing.tariffs_updated, sender=Tariff, dispatch_uid='pricing_tariffs')
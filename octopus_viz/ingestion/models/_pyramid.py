@@ -0,0 +1,181 @@
+import logging
+from datetime import UTC, date, datetime, time, timedelta
+
+from django.db import models
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from ingestion.graph_cache import month_start, next_month
+from ._enums import Direction, Resolution
+from ._meter import Meter
+from ._consumption import Consumption
+
+
+class ConsumptionLevel(models.Model):
+    """Readings of a meter summed per hour, day, week or month: the levels of the pyramid read by
+    the time series graph. The half-hour level is the Consumption rows themselves.
+
+    The days, weeks (from Monday) and months start at local midnight, like the rollup. The hours are
+    UTC hours, the same as the local ones in Europe/London.
+    """
+
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE)
+    direction = models.CharField(max_length=Direction.max_len(), choices=Direction)
+    resolution = models.CharField(max_length=Resolution.max_len(), choices=Resolution)
+    start = models.DateTimeField(help_text='Start of the bucket - inclusive')
+    end = models.DateTimeField(help_text='End of the bucket - exclusive')
+
+    consumption = models.FloatField()
+    cost = models.FloatField(null=True, help_text='None when none of the readings had a price')
+    readings = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=['meter', 'resolution', 'start'], name='level_meter_resolution_start'),
+        )
+        indexes = (models.Index(fields=['resolution', 'direction', 'start'], name='level_direction_start'),)
+
+    def __str__(self):
+        return f'{self.meter}[{self.resolution} {self.start}]'
+
+
+class PyramidConsumption:
+    """Keep the ConsumptionLevel rows up to date with the Consumption rows.
+
+    Called by `RollupConsumption` in its transactions: the buckets of the days refreshed are deleted
+    and computed again, in one pass over the readings ordered by meter and interval_start which
+    fills all the levels at once.
+    """
+
+    batch_size = 2000
+    LEVELS = (Resolution.HOUR, Resolution.DAY, Resolution.WEEK, Resolution.MONTH)
+
+    def __init__(self, logger: logging.Logger | None = None):
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+
+    @classmethod
+    def local_midnight(cls, day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def first_day(cls, resolution: Resolution, day: date) -> date:
+        """First day of the bucket of day, for the levels of a day or longer"""
+        if resolution == Resolution.WEEK:
+            return day - timedelta(days=day.weekday())
+        if resolution == Resolution.MONTH:
+            return month_start(day)
+        return day
+
+    @classmethod
+    def next_day(cls, resolution: Resolution, day: date) -> date:
+        """First day of the next bucket of day, for the levels of a day or longer"""
+        if resolution == Resolution.WEEK:
+            return cls.first_day(resolution, day) + timedelta(days=7)
+        if resolution == Resolution.MONTH:
+            return next_month(day)
+        return day + timedelta(days=1)
+
+    @classmethod
+    def bucket(cls, resolution: Resolution, moment: datetime) -> tuple[datetime, datetime]:
+        """(start, end) of the bucket of moment"""
+        if resolution == Resolution.HOUR:
+            start = moment.astimezone(UTC).replace(minute=0, second=0, microsecond=0)
+            return start, start + timedelta(hours=1)
+        day = timezone.localtime(moment).date()
+        return (
+            cls.local_midnight(cls.first_day(resolution, day)),
+            cls.local_midnight(cls.next_day(resolution, day)),
+        )
+
+    @classmethod
+    def _readings(cls, queryset: QuerySet) -> QuerySet:
+        return queryset.order_by('meter_id', 'interval_start').values_list(
+            'meter_id',
+            'meter__mpan__direction',
+            'interval_start',
+            'consumption',
+            'cost',
+        )
+
+    def _build(self, queryset: QuerySet, bounds: tuple[datetime, datetime] | None = None) -> int:
+        """Create the levels of the readings in queryset, the previous ones must be deleted.
+
+        Only the buckets within bounds are created when given: the others may be partial.
+        """
+        created = 0
+        pending: list[ConsumptionLevel] = []
+        # the bucket of each level being filled for the current meter
+        current: dict[Resolution, ConsumptionLevel] = {}
+        current_meter = None
+
+        for meter_id, direction, interval_start, consumption, cost in self._readings(queryset).iterator(
+            chunk_size=self.batch_size,
+        ):
+            if meter_id != current_meter:
+                pending.extend(current.values())
+                current = {}
+                current_meter = meter_id
+
+            for resolution in self.LEVELS:
+                level = current.get(resolution)
+                if level is None or interval_start >= level.end:
+                    if level is not None:
+                        pending.append(level)
+                    start, end = self.bucket(resolution, interval_start)
+                    current[resolution] = ConsumptionLevel(
+                        meter_id=meter_id,
+                        direction=direction,
+                        resolution=resolution,
+                        start=start,
+                        end=end,
+                        consumption=consumption,
+                        cost=cost,
+                        readings=1,
+                    )
+                else:
+                    level.consumption += consumption
+                    if cost is not None:
+                        level.cost = cost if level.cost is None else level.cost + cost
+                    level.readings += 1
+
+            if len(pending) >= self.batch_size:
+                created += self._create(pending, bounds)
+                pending = []
+
+        pending.extend(current.values())
+        return created + self._create(pending, bounds)
+
+    @classmethod
+    def _create(cls, levels: list[ConsumptionLevel], bounds: tuple[datetime, datetime] | None) -> int:
+        if bounds is not None:
+            levels = [level for level in levels if bounds[0] <= level.start and level.end <= bounds[1]]
+        if not levels:
+            return 0
+        return len(ConsumptionLevel.objects.bulk_create(levels))
+
+    def refresh(self, meter_id: int, first_day: date, last_day: date) -> int:
+        """Compute again the buckets of meter_id including the days between first_day and last_day.
+
+        To be called in a transaction: the readings of the whole weeks and months are read again.
+        """
+        first_day = min(self.first_day(Resolution.WEEK, first_day), self.first_day(Resolution.MONTH, first_day))
+        end_day = max(self.next_day(Resolution.WEEK, last_day), self.next_day(Resolution.MONTH, last_day))
+        bounds = self.local_midnight(first_day), self.local_midnight(end_day)
+
+        # the weeks and months crossing the bounds have no reading of the days refreshed
+        ConsumptionLevel.objects.filter(meter_id=meter_id, start__gte=bounds[0], end__lte=bounds[1]).delete()
+        created = self._build(
+            Consumption.objects.filter(meter_id=meter_id, interval_start__gte=bounds[0], interval_start__lt=bounds[1]),
+            bounds,
+        )
+        self.logger.debug(f'  Refreshed {created} pyramid buckets of meter {meter_id} from {first_day} to {end_day}')
+        return created
+
+    def rebuild(self) -> int:
+        """Compute again all the levels, to be called in a transaction"""
+        ConsumptionLevel.objects.all().delete()
+        created = self._build(Consumption.objects.all())
+        self.logger.info(f'Rebuilt {created} pyramid buckets')
+        return created
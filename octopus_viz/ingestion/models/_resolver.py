@@ -0,0 +1,156 @@
+import bisect
+import dataclasses
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from typing import ClassVar
+
+from django.db.models.signals import post_delete, post_save
+
+from ._enums import Direction
+from ._tariff import Tariff, Rate, tariffs_changed
+
+MIDNIGHT = time(0, 0)
+SLOTS_PER_DAY = 48
+# [start ; end[ of each half-hour of the day, the last one ends at 00:00
+SLOT_STARTS = [time(slot // 2, 30 * (slot % 2)) for slot in range(SLOTS_PER_DAY)]
+SLOT_ENDS = SLOT_STARTS[1:] + SLOT_STARTS[:1]
+
+
+def day_slot(moment: time) -> int:
+    return moment.hour * 2 + moment.minute // 30
+
+
+@dataclasses.dataclass
+class TariffPeriod:
+    """Days between 2 boundaries of the tariffs of a direction: the same tariffs every day"""
+
+    tariff: Tariff | None
+    rates: list[Rate]
+    # best rate of each half-hour of the day
+    slots: list[Rate | None]
+
+
+class TariffResolver:
+    """Tariffs and rates loaded once, resolved in memory in O(log n).
+
+    For each direction the validity boundaries of the tariffs are sorted: a bisection finds the
+    period of a day, then the half-hour of the reading is a lookup in the table of the period.
+    Readings that are not aligned on a half-hour fall back on `best_rate`.
+
+    The rates are chosen like the queries used to (first rate by interval covering the reading
+    among the valid tariffs, the tariff of that rate otherwise the first valid tariff).
+    An instance is a snapshot of the tariffs, see `is_current()`: keep one for a run, not for the
+    process, another process can change the tariffs without any signal.
+    """
+
+    # bumped by the signals of the tariffs and rates
+    generation: ClassVar[int] = 0
+
+    def __init__(self):
+        self.loaded_generation = self.generation
+        tariffs = {tariff.id: tariff for tariff in Tariff.objects.order_by('id')}
+        rates: dict[int, list[Rate]] = {}
+        for rate in Rate.objects.order_by('interval_from', 'interval_end', 'id'):
+            rate.tariff = tariffs[rate.tariff_id]
+            rates.setdefault(rate.tariff_id, []).append(rate)
+
+        self.boundaries: dict[Direction, list[date]] = {}
+        self.periods: dict[Direction, list[TariffPeriod]] = {}
+        for direction in Direction:
+            direction_tariffs = [tariff for tariff in tariffs.values() if tariff.direction == direction]
+            self._index(direction, direction_tariffs, rates)
+
+    @classmethod
+    def invalidate(cls, **kwargs):
+        cls.generation += 1
+
+    def is_current(self) -> bool:
+        """Whether no tariff or rate was changed by this process since the instance was loaded"""
+        return self.loaded_generation == self.generation
+
+    @classmethod
+    def _is_valid(cls, tariff: Tariff, day: date) -> bool:
+        return tariff.valid_from <= day and (tariff.valid_until is None or tariff.valid_until > day)
+
+    @classmethod
+    def best_rate(cls, rates: Iterable[Rate], start: time, end: time) -> Rate | None:
+        """First rate of rates (ordered by interval) covering [start ; end[
+
+        A rate ending at 00:00 ends at midnight but an end of 00:00 is compared as it is: the
+        half-hour ending at midnight gets the first rate starting before it, like it always did.
+        Changing it would change the rate of the readings already attached.
+        """
+        for rate in rates:
+            if rate.interval_from > start:
+                continue
+
+            if rate.interval_end == MIDNIGHT or rate.interval_end >= end:
+                return rate
+        return None
+
+    @classmethod
+    def unit_rate(cls, tariff: Tariff | None, rate: Rate | None) -> float | None:
+        """Price of a unit stored on the readings: the rate, otherwise the default rate if not 0"""
+        if rate is not None:
+            return rate.unit_rate
+        if tariff is not None and tariff.default_rate:
+            return tariff.default_rate
+        return None
+
+    @classmethod
+    def _period(cls, tariffs: list[Tariff], rates: dict[int, list[Rate]]) -> TariffPeriod:
+        period_rates = sorted(
+            (rate for tariff in tariffs for rate in rates.get(tariff.id, [])),
+            key=lambda r: (r.interval_from, r.interval_end, r.id),
+        )
+        if period_rates:
+            tariff = period_rates[0].tariff
+        elif tariffs:
+            tariff = tariffs[0]
+        else:
+            tariff = None
+        slots = [cls.best_rate(period_rates, start, end) for start, end in zip(SLOT_STARTS, SLOT_ENDS)]
+        return TariffPeriod(tariff, period_rates, slots)
+
+    def _index(self, direction: Direction, tariffs: list[Tariff], rates: dict[int, list[Rate]]):
+        boundaries = sorted(
+            {tariff.valid_from for tariff in tariffs}
+            | {tariff.valid_until for tariff in tariffs if tariff.valid_until is not None},
+        )
+        self.boundaries[direction] = boundaries
+        self.periods[direction] = [
+            self._period([tariff for tariff in tariffs if self._is_valid(tariff, day)], rates) for day in boundaries
+        ]
+
+    def period(self, direction: Direction, day: date) -> TariffPeriod | None:
+        index = bisect.bisect_right(self.boundaries[direction], day) - 1
+        if index < 0:
+            return None
+        return self.periods[direction][index]
+
+    def tariff(self, direction: Direction, day: date) -> Tariff | None:
+        period = self.period(direction, day)
+        return period.tariff if period is not None else None
+
+    def resolve(
+        self,
+        direction: Direction,
+        interval_start: datetime,
+        interval_end: datetime | None = None,
+    ) -> tuple[Tariff | None, Rate | None]:
+        """Tariff and rate of a reading, a half-hour one if interval_end is not given"""
+        period = self.period(direction, interval_start.date())
+        if period is None:
+            return None, None
+
+        start = interval_start.time()
+        slot = day_slot(start)
+        if start == SLOT_STARTS[slot] and (interval_end is None or interval_end.time() == SLOT_ENDS[slot]):
+            return period.tariff, period.slots[slot]
+        end = (interval_start + timedelta(minutes=30) if interval_end is None else interval_end).time()
+        return period.tariff, self.best_rate(period.rates, start, end)
+
+
+for _model in (Tariff, Rate):
+    for _signal in (post_save, post_delete, tariffs_changed):
+        _signal.connect(TariffResolver.invalidate, sender=_model, dispatch_uid=f'tariff_resolver_{_model.__name__}')
@@ -0,0 +1,207 @@
+import logging
+from datetime import date, datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from ingestion.graph_cache import GraphCache
+from ingestion.health_cache import HealthCache
+from ._enums import Direction
+from ._meter import Meter
+from ._tariff import Rate, Tariff
+from ._consumption import Consumption, DeletedReadings, readings_deleted
+from ._pyramid import PyramidConsumption
+
+
+class ConsumptionRollup(models.Model):
+    """Readings of a meter summed per day and slot of the day.
+
+    The day is the local date (like the month boundaries of the graphs) and the slot is the UTC
+    time of interval_start (like the keys of PeriodAggregator).
+    It exposes interval_start, interval_end and currency so that the aggregators can process it
+    like a Consumption.
+    """
+
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE)
+    direction = models.CharField(max_length=Direction.max_len(), choices=Direction)
+    day = models.DateField(help_text='Local date of the readings')
+    slot = models.TimeField(help_text='Start of the readings in the day - UTC time')
+
+    tariff = models.ForeignKey(Tariff, null=True, default=None, on_delete=models.SET_NULL)
+    rate = models.ForeignKey(Rate, null=True, default=None, on_delete=models.SET_NULL)
+
+    consumption = models.FloatField()
+    cost = models.FloatField(null=True, help_text='None when none of the readings had a price')
+    earliest = models.DateTimeField(help_text='First interval_start - inclusive')
+    latest = models.DateTimeField(help_text='Last interval_end - exclusive')
+    readings = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['direction', 'day'], name='rollup_direction_day'),
+            models.Index(fields=['meter', 'day'], name='rollup_meter_day'),
+        )
+
+    def __str__(self):
+        return f'{self.meter}[{self.day} {self.slot}]'
+
+    @property
+    def interval_start(self) -> datetime:
+        return self.earliest
+
+    @property
+    def interval_end(self) -> datetime:
+        return self.latest
+
+    @property
+    def currency(self) -> str | None:
+        if self.tariff:
+            return self.tariff.currency
+        return None
+
+
+class RollupConsumption:
+    """Keep ConsumptionRollup up to date with the Consumption rows.
+
+    The rollup of whole days is deleted and computed again from the readings, in one pass over the
+    readings ordered by meter and interval_start. The pyramid of the time series is refreshed in the
+    same transaction.
+    """
+
+    batch_size = 2000
+
+    def __init__(self, logger: logging.Logger | None = None, *, pretend: bool = False):
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.pretend = pretend
+        self.pyramid = PyramidConsumption(logger)
+
+    @classmethod
+    def local_midnight(cls, day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def local_day(cls, when: datetime) -> date:
+        return timezone.localtime(when).date()
+
+    @classmethod
+    def _readings(cls, queryset: QuerySet) -> QuerySet:
+        return queryset.order_by('meter_id', 'interval_start').values_list(
+            'meter_id',
+            'meter__mpan__direction',
+            'interval_start',
+            'interval_end',
+            'consumption',
+            'tariff_id',
+            'rate_id',
+            'cost',
+        )
+
+    def _build(self, queryset: QuerySet) -> int:
+        """Create the rollup rows of the readings in queryset, the previous ones must be deleted"""
+        created = 0
+        pending: list[ConsumptionRollup] = []
+        # the groups of the current meter and day
+        groups: dict[tuple, ConsumptionRollup] = {}
+        current_day = None
+
+        for (
+            meter_id,
+            direction,
+            interval_start,
+            interval_end,
+            consumption,
+            tariff_id,
+            rate_id,
+            cost,
+        ) in self._readings(queryset).iterator(chunk_size=self.batch_size):
+            day = (meter_id, self.local_day(interval_start))
+            if day != current_day:
+                pending.extend(groups.values())
+                groups = {}
+                current_day = day
+                if len(pending) >= self.batch_size:
+                    created += len(ConsumptionRollup.objects.bulk_create(pending))
+                    pending = []
+
+            key = (interval_start.time(), tariff_id, rate_id)
+            rollup = groups.get(key)
+            if rollup is None:
+                groups[key] = ConsumptionRollup(
+                    meter_id=meter_id,
+                    direction=direction,
+                    day=day[1],
+                    slot=key[0],
+                    tariff_id=tariff_id,
+                    rate_id=rate_id,
+                    consumption=consumption,
+                    cost=cost,
+                    earliest=interval_start,
+                    latest=interval_end,
+                    readings=1,
+                )
+            else:
+                rollup.consumption += consumption
+                if cost is not None:
+                    rollup.cost = cost if rollup.cost is None else rollup.cost + cost
+                rollup.earliest = min(rollup.earliest, interval_start)
+                rollup.latest = max(rollup.latest, interval_end)
+                rollup.readings += 1
+
+        pending.extend(groups.values())
+        if pending:
+            created += len(ConsumptionRollup.objects.bulk_create(pending))
+        return created
+
+    def refresh(self, meter_id: int, earliest: datetime, latest: datetime) -> int:
+        """Compute again the rollup of the days of meter_id between the 2 readings (inclusive)"""
+        first_day = self.local_day(earliest)
+        last_day = self.local_day(latest)
+        if self.pretend:
+            self.logger.info(f'PRETEND: refresh rollup of meter {meter_id} from {first_day} to {last_day}')
+            return 0
+
+        with transaction.atomic():
+            ConsumptionRollup.objects.filter(meter_id=meter_id, day__gte=first_day, day__lte=last_day).delete()
+            created = self._build(
+                Consumption.objects.filter(
+                    meter_id=meter_id,
+                    interval_start__gte=self.local_midnight(first_day),
+                    interval_start__lt=self.local_midnight(last_day + timedelta(days=1)),
+                ),
+            )
+            self.pyramid.refresh(meter_id, first_day, last_day)
+            transaction.on_commit(lambda: GraphCache.invalidate_months(first_day, last_day))
+            transaction.on_commit(HealthCache.invalidate)
+        self.logger.debug(f'  Refreshed {created} rollup rows of meter {meter_id} from {first_day} to {last_day}')
+        return created
+
+    def refresh_ranges(self, ranges: dict[int, tuple[datetime, datetime]]) -> int:
+        """Refresh the (earliest, latest) range of readings of each meter id"""
+        return sum(self.refresh(meter_id, earliest, latest) for meter_id, (earliest, latest) in ranges.items())
+
+    def rebuild(self) -> int:
+        if self.pretend:
+            self.logger.info('PRETEND: rebuild the rollup of all the readings')
+            return 0
+
+        with transaction.atomic():
+            ConsumptionRollup.objects.all().delete()
+            created = self._build(Consumption.objects.all())
+            self.pyramid.rebuild()
+            transaction.on_commit(GraphCache.invalidate_all)
+            transaction.on_commit(HealthCache.invalidate)
+        self.logger.info(f'Rebuilt {created} rollup rows')
+        return created
+
+    @classmethod
+    def readings_deleted(cls, deleted: dict[int, DeletedReadings], **kwargs):
+        """Refresh the days of the deleted readings, from the readings left"""
+        rollup = cls()
+        for meter_id, readings in deleted.items():
+            rollup.refresh(meter_id, readings.earliest, readings.latest)
+
+
+readings_deleted.connect(RollupConsumption.readings_deleted, sender=Consumption, dispatch_uid='rollup_readings')
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
 
 from ._enums import EnergyType, Direction, MetricUnit
 
@@ -6,6 +7,40 @@ from ._enums import EnergyType, Direction, MetricUnit
 TARIFF_NAME_LENGTH = 50
 CURRENCY_SIZE = 3
 
+# Sent with ids=[...] once a queryset update() changed the prices of tariffs or rates
+prices_updated = Signal()
+# Sent once a queryset update() changed any field of tariffs or rates
+tariffs_changed = Signal()
+
+
+class PricesQuerySet(models.QuerySet):
+    """Send `tariffs_changed`, and `prices_updated` when update() sets price_field: the signals
+    of the instances are not sent by update() (nor by bulk_update() which goes through it)
+    """
+
+    price_field: str
+
+    def update(self, **kwargs):
+        if self.price_field not in kwargs:
+            updated = super().update(**kwargs)
+            tariffs_changed.send(sender=self.model)
+            return updated
+        with transaction.atomic():
+            ids = list(self.values_list('id', flat=True))
+            updated = super().update(**kwargs)
+            tariffs_changed.send(sender=self.model)
+            if ids:
+                prices_updated.send(sender=self.model, ids=ids)
+        return updated
+
+
+class TariffQuerySet(PricesQuerySet):
+    price_field = 'default_rate'
+
+
+class RateQuerySet(PricesQuerySet):
+    price_field = 'unit_rate'
+
 
 class Tariff(models.Model):
     name = models.CharField(max_length=TARIFF_NAME_LENGTH, unique=True)
@@ -19,6 +54,8 @@ class Tariff(models.Model):
 
     default_rate = models.FloatField(null=True, help_text='Used when rates are not found')
 
+    objects = TariffQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -28,19 +65,21 @@ class Tariff(models.Model):
 
 
 class Rate(models.Model):
-    class Meta:
-        constraints = [
-            models.UniqueConstraint(
-                fields=['tariff_id', 'interval_from', 'interval_end'],
-                name='unique_tariff_interval',
-            ),
-        ]
-
     interval_from = models.TimeField(help_text='Inclusive time - local tz')
     interval_end = models.TimeField(help_text='Exclusive time - local tz')
     unit_rate = models.FloatField()
 
     tariff = models.ForeignKey(Tariff, on_delete=models.CASCADE)
 
+    objects = RateQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['tariff_id', 'interval_from', 'interval_end'],
+                name='unique_tariff_interval',
+            ),
+        )
+
     def __str__(self):
         return f'{self.tariff}[{self.interval_from} ; {self.interval_end}]'
@@ -1,29 +1,58 @@
 import json
 import logging
-from datetime import date, time
-from typing import Tuple
+from collections.abc import Callable, Iterable
+from datetime import date, datetime
 
 from django.db import transaction
-from django.db.models import QuerySet, Q
+from django.db.models import F, QuerySet
 
 from ._meter import Meter
+from ._checkpoint import IngestionCheckpoint
 from ._tariff import Tariff, Rate
 from ._enums import Direction
 from ._consumption import Consumption
+from ._counters import ReadingCounters
 from ._filters import MeterFilters
+from ._pricing import Pricing
+from ._resolver import TariffResolver
+from ._rollup import RollupConsumption
+from ..archive import ConsumptionArchive
 from ..octopus_client.api import OctopusAPI
+from ..octopus_client.async_api import AsyncOctopusAPI
+from ..octopus_client.client import HttpMetrics, OctopusHttpClient
+from ..octopus_client.prefetch import AsyncConcurrentDownload, ConcurrentDownload
+from ..utils import in_batches
 
-DetachedKey = Tuple[date, date, Direction]
+DetachedKey = tuple[date, date, Direction]
 DetachedValues = list[Consumption]
+MissingRatesKey = tuple[date, Direction]
+AttachKey = tuple[Tariff | None, Rate | None]
+ReadingsRange = tuple[datetime, datetime]
 
 
 class UpdateConsumption:
+    # How many ids are given to a single `UPDATE ... WHERE id IN (...)`
+    update_batch_size = 500
+
     def __init__(self, logger: logging.Logger | None, pretend: bool = False):
         if logger is None:
             logger = logging.getLogger(__name__)
         self.logger = logger
         self.pretend = pretend
         self.detached_rows: dict[DetachedKey, DetachedValues] = {}
+        # interval_start of the first and last rows attached by attach_rates, per meter id
+        self.attached_ranges: dict[int, ReadingsRange] = {}
+        self.rollup = RollupConsumption(logger, pretend=pretend)
+        # written with the rows by update_detached_rows and attach_rates
+        self.counters = ReadingCounters()
+        self._resolver: TariffResolver | None = None
+
+    @property
+    def resolver(self) -> TariffResolver:
+        """The tariffs loaded once for all the meters of the run, again when they changed"""
+        if self._resolver is None or not self._resolver.is_current():
+            self._resolver = TariffResolver()
+        return self._resolver
 
     @classmethod
     def all_rows(cls) -> QuerySet:
@@ -53,34 +82,6 @@ class UpdateConsumption:
             tariff__isnull=True,
         )
 
-    @classmethod
-    def related_tariff(cls, valid_from: date, valid_until: date, direction: Direction) -> Tariff | None:
-        # That did not work anyway
-        # return queryset.filter(
-        #     tariff__valid_from_lte=F('consumption__interval_start'),
-        #     tariff__valid_until_gt=F('consumption__interval_start'),
-        # ).values('tariff__id')
-        try:
-            return Tariff.objects.filter(
-                Q(valid_from__lte=valid_from),
-                Q(valid_until__isnull=True) | Q(valid_until__gt=valid_from),
-                Q(direction=direction),
-            )[0]
-        except IndexError:
-            return None
-
-    @classmethod
-    def related_rates(cls, valid_from: date, valid_until: date, direction: Direction) -> QuerySet:
-        return (
-            Rate.objects.select_related('tariff')
-            .filter(
-                Q(tariff__valid_from__lte=valid_from),
-                Q(tariff__valid_until__isnull=True) | Q(tariff__valid_until__gt=valid_from),
-                Q(tariff__direction=direction),
-            )
-            .order_by('interval_from', 'interval_end')
-        )
-
     def _update_row(self, row: Consumption, tariff: Tariff | None, best_rate: Rate | None) -> int:
         row.tariff = tariff
         if best_rate is None:
@@ -89,6 +90,7 @@ class UpdateConsumption:
         else:
             row.rate = best_rate
             no_rates = 0
+        row.set_unit_rate(TariffResolver.unit_rate(tariff, row.rate))
 
         if not self.pretend:
             row.save()
@@ -96,30 +98,12 @@ class UpdateConsumption:
         return no_rates
 
     def update_detached_rows(self) -> int:
+        resolver = self.resolver
         no_rates = 0
-        for key, rows in self.detached_rows.items():
-            rates: list[Rate] = list(self.related_rates(key[0], key[1], key[2]))
-            if not rates:
-                tariff = self.related_tariff(key[0], key[1], key[2])
-            else:
-                tariff = rates[0].tariff
-
+        for (_, _, direction), rows in self.detached_rows.items():
             for detached in rows:
-                best_rate = None
-                detached_start = detached.interval_start.time()
-                detached_end = detached.interval_end.time()
-                for rate in rates:
-                    if rate.interval_from > detached_start:
-                        continue
-
-                    if rate.interval_end == time(0, 0) and detached_start >= rate.interval_from:
-                        best_rate = rate
-                    elif rate.interval_end >= detached_end:
-                        best_rate = rate
-
-                    if best_rate is not None:
-                        break
-
+                tariff, best_rate = resolver.resolve(direction, detached.interval_start, detached.interval_end)
+                self.counters.detached(detached.meter_id, (tariff is None) - (detached.tariff_id is None))
                 n = self._update_row(detached, tariff, best_rate)
                 if n:  # debug
                     self.logger.info(
@@ -128,6 +112,8 @@ class UpdateConsumption:
                 no_rates += n
 
         self.detached_rows = {}
+        if not self.pretend:
+            self.counters.flush()
         return no_rates
 
     @classmethod
@@ -141,10 +127,77 @@ class UpdateConsumption:
         self.detached_rows.setdefault(key, [])
         self.detached_rows[key].append(row)
 
+    def _bulk_attach(self, attach: dict[AttachKey, list[int]]):
+        """One UPDATE per (tariff, rate) and batch of ids, pricing the rows at the same time.
+
+        A rate of None means no rate was found: the existing rate is left as it is and the rows are
+        priced from it (or the tariff) by a second UPDATE.
+        """
+        for (tariff, rate), ids in attach.items():
+            fields = {'tariff': tariff}
+            if rate is not None:
+                fields['rate'] = rate
+                fields['unit_rate'] = rate.unit_rate
+                fields['cost'] = F('consumption') * rate.unit_rate
+            for i in range(0, len(ids), self.update_batch_size):
+                batch = Consumption.objects.filter(id__in=ids[i : i + self.update_batch_size])
+                batch.update(**fields)
+                if rate is None:
+                    batch.update(**Pricing.fields(Consumption))
+
+    def _extend_attached_range(self, meter_id: int, interval_start: datetime):
+        earliest, latest = self.attached_ranges.get(meter_id, (interval_start, interval_start))
+        self.attached_ranges[meter_id] = min(earliest, interval_start), max(latest, interval_start)
+
+    def attach_rates(self, queryset: QuerySet) -> tuple[int, int]:
+        """Attach the tariff and rate of every row of queryset with a handful of statements.
+
+        Same result as `add_detached_row` + `update_detached_rows` but the rows are read as
+        tuples in one query, the rates are resolved in memory by `TariffResolver` and the rows are
+        written with grouped updates instead of one save per row.
+        :return: the number of rows found and the number of rows without rate
+        """
+        resolver = self.resolver
+        attach: dict[AttachKey, list[int]] = {}
+        missing: dict[MissingRatesKey, int] = {}
+
+        found = 0
+        rows = queryset.values_list(
+            'id',
+            'meter_id',
+            'interval_start',
+            'interval_end',
+            'meter__mpan__direction',
+            'tariff_id',
+        )
+        for found, (row_id, meter_id, interval_start, interval_end, direction, tariff_id) in enumerate(
+            rows.iterator(),
+            start=1,
+        ):
+            self._extend_attached_range(meter_id, interval_start)
+            direction = Direction(direction)
+            tariff, best_rate = resolver.resolve(direction, interval_start, interval_end)
+            self.counters.detached(meter_id, (tariff is None) - (tariff_id is None))
+            if best_rate is None:
+                day_key = (interval_start.date(), direction)
+                missing[day_key] = missing.get(day_key, 0) + 1
+            attach.setdefault((tariff, best_rate), []).append(row_id)
+
+        for (day, direction), n in sorted(missing.items()):
+            tariff = resolver.tariff(direction, day)
+            self.logger.warning(f'  No rate found for {n} rows on {day} ({direction.label}), setting {tariff=}')
+
+        if not self.pretend:
+            self._bulk_attach(attach)
+            self.counters.flush()
+
+        return found, sum(missing.values())
+
     def gather_and_update_rows(self, all_rows=False):
         with transaction.atomic():
-            # TODO(tr) I would really like to do the select with a single query...
             self.detached_rows = {}
+            self.attached_ranges = {}
+            self._resolver = None
             if all_rows:
                 self.logger.info('Updating all consumption rows...')
                 consider_rows = self.all_rows()
@@ -152,20 +205,27 @@ class UpdateConsumption:
                 self.logger.info('Updating detached consumption rows...')
                 consider_rows = self.gather_detached_rows()
 
-            found = 0
-            for row in consider_rows:  # type: Consumption
-                self.add_detached_row(row)
-                found += 1
-
+            found, no_rates = self.attach_rates(consider_rows)
             self.logger.info(f'  Found {found} rows to update')
-            no_rates = self.update_detached_rows()
             self.logger.info(f'  Updated {found - no_rates} with rates ({no_rates} did not have rates)')
 
+            if all_rows:
+                self.rollup.rebuild()
+            else:
+                self.rollup.refresh_ranges(self.attached_ranges)
+
 
 class IngestConsumption:
+    # Rows written per bulk upsert by the batched mode, the rows are written one by one by default
+    BULK_BATCH_SIZE = 2000
+    # Requests in flight at the same time for one API key when downloading concurrently
+    DEFAULT_MAX_REQUESTS_PER_KEY = 2
+    # Pages of results committed at once with their checkpoint by --resume
+    DEFAULT_CHECKPOINT_PAGES = 20
+
     @classmethod
     def _list_meters(cls, meter_mpan: str | None) -> QuerySet:
-        queryset = MeterFilters.meters_with_api_key()
+        queryset = MeterFilters.meters_with_api_key().select_related('mpan__api_key')
         if meter_mpan is not None:
             queryset = queryset.filter(mpan=meter_mpan)
         return queryset
@@ -177,12 +237,47 @@ class IngestConsumption:
             raise RuntimeError(f'No latest entry for {meter}')
         return latest.interval_end.date()
 
-    def __init__(self, logger: logging.Logger | None, *, pretend: bool = False, debug_filename: str | None = None):
+    def __init__(
+        self,
+        logger: logging.Logger | None,
+        *,
+        pretend: bool = False,
+        debug_filename: str | None = None,
+        batch_size: int | None = None,
+        workers: int = 1,
+        max_requests_per_key: int = DEFAULT_MAX_REQUESTS_PER_KEY,
+        shard_days: int | None = None,
+        archive_dir: str | None = None,
+        checkpoint_pages: int | None = None,
+        resume: bool = False,
+        use_async: bool = False,
+    ):
         if logger is None:
             logger = logging.getLogger(__name__)
+        if resume and not checkpoint_pages:
+            checkpoint_pages = self.DEFAULT_CHECKPOINT_PAGES
+        if checkpoint_pages and (workers > 1 or shard_days or use_async):
+            raise ValueError('The checkpoints are only supported by the sequential download, without workers or shards')
+        if checkpoint_pages and (debug_filename or archive_dir):
+            raise ValueError('The checkpoints are only supported when the rows are written to the database')
         self.logger = logger
         self.pretend = pretend
         self.debug_filename = debug_filename
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_requests_per_key = max_requests_per_key
+        self.shard_days = shard_days
+        self.archive = ConsumptionArchive(archive_dir, logger=logger) if archive_dir is not None else None
+        # commit the rows every checkpoint_pages pages with the position of the download
+        self.checkpoint_pages = checkpoint_pages
+        self.resume = resume
+        # download all the meters at the same time with asyncio instead of a pool of workers
+        self.use_async = use_async
+        self.inserted_rows = 0
+        self.updated_rows = 0
+        # metrics of the shared HTTP clients when the ingestion started, then of the ingestion
+        self.http_before = HttpMetrics()
+        self.http_metrics = HttpMetrics()
 
     def _ingest_in_db(
         self,
@@ -192,21 +287,100 @@ class IngestConsumption:
         *,
         api_connection: OctopusAPI,
         update_rows: UpdateConsumption,
+        results: Iterable[dict] | None = None,
     ) -> int:
+        if results is None:
+            results = api_connection.get_consumption_data(period_from, period_to)
+
         with transaction.atomic():
             found_rows = 0
-            for found_rows, data in enumerate(
-                api_connection.get_consumption_data(period_from, period_to),
-                start=1,
-            ):  # type: int, dict
+            inserted_before = api_connection.inserted_rows
+            earliest = None
+            latest = None
+            for found_rows, data in enumerate(results, start=1):  # type: int, dict
                 new_row = api_connection.build_consumption_from_json(data)
                 update_rows.add_detached_row(new_row)
+                earliest = new_row.interval_start if earliest is None else min(earliest, new_row.interval_start)
+                latest = new_row.interval_start if latest is None else max(latest, new_row.interval_start)
+            update_rows.counters.inserted(meter.id, api_connection.inserted_rows - inserted_before, latest)
 
             self.logger.info(f'Attaching {found_rows} rows for {meter}...')
             no_rate = update_rows.update_detached_rows()
             self.logger.info(f'Linked {found_rows - no_rate} rows to a rate for {meter}')
+            if found_rows:
+                update_rows.rollup.refresh(meter.id, earliest, latest)
         return found_rows
 
+    def upsert_rows(
+        self,
+        meter: 'Meter',
+        rows: Iterable[Consumption],
+        *,
+        update_rows: UpdateConsumption,
+        update_existing: bool = True,
+    ) -> int:
+        """Upsert the unsaved rows of meter batch_size rows at a time, then attach their rates"""
+        with transaction.atomic():
+            found_rows = 0
+            inserted = 0
+            updated = 0
+            earliest = None
+            latest = None
+            for batch in in_batches(rows, self.batch_size):
+                batch_inserted, batch_updated = OctopusAPI.upsert_meter_consumption(
+                    meter,
+                    batch,
+                    update_existing=update_existing,
+                )
+                found_rows += len(batch)
+                inserted += batch_inserted
+                updated += batch_updated
+
+                batch_earliest = min(row.interval_start for row in batch)
+                batch_latest = max(row.interval_start for row in batch)
+                update_rows.counters.inserted(meter.id, batch_inserted, batch_latest)
+                earliest = batch_earliest if earliest is None else min(earliest, batch_earliest)
+                latest = batch_latest if latest is None else max(latest, batch_latest)
+                self.logger.debug(f'  Wrote {len(batch)} rows for {meter} ({found_rows} so far)')
+
+            self.logger.info(f'Inserted {inserted} rows and updated {updated} rows for {meter}')
+            self.inserted_rows += inserted
+            self.updated_rows += updated
+
+            if found_rows:
+                self.logger.info(f'Attaching {found_rows} rows for {meter}...')
+                _, no_rate = update_rows.attach_rates(
+                    Consumption.objects.filter(
+                        meter=meter,
+                        interval_start__gte=earliest,
+                        interval_start__lte=latest,
+                    ),
+                )
+                self.logger.info(f'Linked {found_rows - no_rate} rows to a rate for {meter}')
+                update_rows.rollup.refresh(meter.id, earliest, latest)
+        return found_rows
+
+    def _upsert_in_db(
+        self,
+        meter: 'Meter',
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        api_connection: OctopusAPI,
+        update_rows: UpdateConsumption,
+        results: Iterable[dict] | None = None,
+    ) -> int:
+        """Like `_ingest_in_db` but the API results are written batch_size rows at a time"""
+        if results is None:
+            results = api_connection.get_consumption_data(period_from, period_to)
+
+        return self.upsert_rows(
+            meter,
+            (api_connection.consumption_from_json(data) for data in results),
+            update_rows=update_rows,
+            update_existing=api_connection.update_existing,
+        )
+
     def _append_to_file(
         self,
         meter: 'Meter',
@@ -230,38 +404,225 @@ class IngestConsumption:
 
         return found_rows
 
+    def _append_to_archive(
+        self,
+        meter: 'Meter',
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        api_connection: OctopusAPI,
+        archive: ConsumptionArchive,
+    ) -> int:
+        self.logger.info(f'Writing results for {meter} into the archive {archive.root}')
+        return archive.append_results(meter, api_connection.get_consumption_data(period_from, period_to))
+
+    def _write_in_db(
+        self,
+        meter: 'Meter',
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        api_connection: OctopusAPI,
+        update_rows: UpdateConsumption,
+        results: Iterable[dict] | None = None,
+    ) -> int:
+        ingest = self._upsert_in_db if self.batch_size else self._ingest_in_db
+        return ingest(
+            meter,
+            period_from,
+            period_to,
+            api_connection=api_connection,
+            update_rows=update_rows,
+            results=results,
+        )
+
+    def _checkpoint(self, meter: Meter, period_from: date | None, period_to: date | None) -> IngestionCheckpoint:
+        """The checkpoint to continue from with --resume, otherwise a new one.
+
+        A completed checkpoint is kept by --resume only for the same period_to, a later run starts
+        a new download.
+        """
+        checkpoint = IngestionCheckpoint.objects.filter(meter=meter).first()
+        if checkpoint is not None and self.resume and (not checkpoint.completed or checkpoint.period_to == period_to):
+            return checkpoint
+        if checkpoint is not None and not self.resume and not checkpoint.completed:
+            self.logger.warning(
+                f'Downloading {meter} again, use --resume to continue after {checkpoint.last_interval_end}',
+            )
+        return IngestionCheckpoint(meter=meter, period_from=period_from, period_to=period_to)
+
+    def _checkpointed_in_db(
+        self,
+        meter: 'Meter',
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        api_connection: OctopusAPI,
+        update_rows: UpdateConsumption,
+    ) -> int:
+        """Like `_write_in_db` but committed every checkpoint_pages pages, with their checkpoint"""
+        checkpoint = self._checkpoint(meter, period_from, period_to)
+        if checkpoint.completed:
+            self.logger.info(f'Skipping {meter}, already downloaded until {checkpoint.last_interval_end}')
+            return 0
+        if checkpoint.next_url is not None:
+            self.logger.info(f'Resuming {meter} after {checkpoint.rows} rows up to {checkpoint.last_interval_end}')
+
+        found_rows = 0
+        pages = api_connection.get_consumption_pages(
+            checkpoint.period_from,
+            checkpoint.period_to,
+            next_url=checkpoint.next_url,
+        )
+        for batch in in_batches(pages, self.checkpoint_pages):
+            results = [result for page in batch for result in page.results]
+            # before writing them: consumption_from_json consumes the results
+            last_interval_end = max((datetime.fromisoformat(data['interval_end']) for data in results), default=None)
+            with transaction.atomic():
+                written = self._write_in_db(
+                    meter,
+                    checkpoint.period_from,
+                    checkpoint.period_to,
+                    api_connection=api_connection,
+                    update_rows=update_rows,
+                    results=results,
+                )
+                checkpoint.advance(len(batch), written, last_interval_end, batch[-1].next_url)
+                checkpoint.save()
+            found_rows += written
+            self.logger.info(f'Checkpoint of {meter}: {checkpoint.pages} pages, up to {checkpoint.last_interval_end}')
+        return found_rows
+
+    def _log_download(self, meter: Meter, period_from: date, period_to: date):
+        self.logger.info(
+            f'Download data for {meter} period_from={period_from.isoformat()} period_to={period_to.isoformat()}',
+        )
+
+    def _log_totals(self, found_meters: int, total_rows: int, *, http_metrics: HttpMetrics | None = None):
+        """http_metrics of the ingestion, those of the shared HTTP clients by default"""
+        self.logger.info(f'Found {found_meters} meters and downloaded {total_rows} rows')
+        if self.batch_size:
+            self.logger.info(f'Inserted {self.inserted_rows} rows and updated {self.updated_rows} rows')
+        if http_metrics is None:
+            http_metrics = OctopusHttpClient.total_metrics() - self.http_before
+        self.http_metrics = http_metrics
+        self.logger.info(f'HTTP: {http_metrics}')
+
+    def _write_downloads(
+        self,
+        downloader: ConcurrentDownload | AsyncConcurrentDownload,
+        connect: Callable[[Meter], OctopusAPI],
+        period_from: date | None,
+        period_to: date,
+        *,
+        meter_mpan: str | None,
+    ) -> tuple[int, int]:
+        """Start the downloads of all the meters, then write them one after the other.
+
+        :return: the number of meters and of rows
+        """
+        update_rows = UpdateConsumption(self.logger)
+        total_rows = 0
+        downloads = []
+        meter: Meter
+        for meter in self._list_meters(meter_mpan):
+            meter_from = period_from if period_from is not None else self._get_last_entry(meter)
+            api_connection = connect(meter)
+            self._log_download(meter, meter_from, period_to)
+            download = downloader.start(api_connection, meter_from, period_to, shard_days=self.shard_days)
+            downloads.append((meter, meter_from, api_connection, download))
+
+        for meter, meter_from, api_connection, download in downloads:
+            total_rows += self._write_in_db(
+                meter,
+                meter_from,
+                period_to,
+                api_connection=api_connection,
+                update_rows=update_rows,
+                results=download.results(),
+            )
+        return len(downloads), total_rows
+
+    def _ingest_concurrently(self, period_from: date | None, period_to: date, *, meter_mpan: str | None):
+        """Download the meters (and their shards) in parallel, this thread writes in the database"""
+        with ConcurrentDownload(self.workers, self.max_requests_per_key, logger=self.logger) as downloader:
+            found_meters, total_rows = self._write_downloads(
+                downloader,
+                lambda meter: OctopusAPI(
+                    meter,
+                    logger=self.logger,
+                    limiter=downloader.limiter_for(meter.mpan.api_key_id),
+                ),
+                period_from,
+                period_to,
+                meter_mpan=meter_mpan,
+            )
+        self._log_totals(found_meters, total_rows)
+
+    def _ingest_async(self, period_from: date | None, period_to: date, *, meter_mpan: str | None):
+        """Download all the meters (and shards) from an event loop, this thread writes in the db"""
+        with AsyncConcurrentDownload(self.max_requests_per_key, logger=self.logger) as downloader:
+            found_meters, total_rows = self._write_downloads(
+                downloader,
+                lambda meter: AsyncOctopusAPI(meter, client=downloader.client_for(meter.api_key), logger=self.logger),
+                period_from,
+                period_to,
+                meter_mpan=meter_mpan,
+            )
+        self._log_totals(found_meters, total_rows, http_metrics=downloader.metrics())
+
     def ingest(self, period_from: date | None, period_to: date, *, meter_mpan: str | None = None):
+        self.http_before = OctopusHttpClient.total_metrics()
+        writes_in_db = self.debug_filename is None and self.archive is None
+        if self.use_async and not self.pretend and writes_in_db:
+            return self._ingest_async(period_from, period_to, meter_mpan=meter_mpan)
+        if (self.workers > 1 or self.shard_days) and not self.pretend and writes_in_db:
+            return self._ingest_concurrently(period_from, period_to, meter_mpan=meter_mpan)
+
         found_meters = 0
         update_rows = UpdateConsumption(self.logger)
         total_rows = 0
 
         for found_meters, meter in enumerate(self._list_meters(meter_mpan), start=1):  # type: int, models.Meter
-            if period_from is None:
-                period_from = self._get_last_entry(meter)
+            meter_from = period_from if period_from is not None else self._get_last_entry(meter)
 
             api_connection = OctopusAPI(meter, logger=self.logger)
 
-            self.logger.info(
-                f'Download data for {meter} period_from={period_from.isoformat()} period_to={period_to.isoformat()}',
-            )
+            self._log_download(meter, meter_from, period_to)
             if self.pretend:
                 self.logger.info(f'PRETEND: download data from: {api_connection.consumption_endpoint}')
                 # skip the actual downloading
             elif self.debug_filename is not None:
                 total_rows += self._append_to_file(
                     meter,
-                    period_from,
+                    meter_from,
                     period_to,
                     api_connection=api_connection,
                     filename=self.debug_filename,
                 )
+            elif self.archive is not None:
+                total_rows += self._append_to_archive(
+                    meter,
+                    meter_from,
+                    period_to,
+                    api_connection=api_connection,
+                    archive=self.archive,
+                )
+            elif self.checkpoint_pages:
+                total_rows += self._checkpointed_in_db(
+                    meter,
+                    meter_from,
+                    period_to,
+                    api_connection=api_connection,
+                    update_rows=update_rows,
+                )
             else:
-                total_rows += self._ingest_in_db(
+                total_rows += self._write_in_db(
                     meter,
-                    period_from,
+                    meter_from,
                     period_to,
                     api_connection=api_connection,
                     update_rows=update_rows,
                 )
 
-        self.logger.info(f'Found {found_meters} meters and downloaded {total_rows} rows')
+        self._log_totals(found_meters, total_rows)
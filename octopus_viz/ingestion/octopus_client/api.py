@@ -1,24 +1,37 @@
+import dataclasses
 import logging
+import threading
 from datetime import datetime
 from typing import Iterable
 
 import requests
+from django.conf import settings
 from django.db import IntegrityError, transaction
-from requests.auth import HTTPBasicAuth
+from django.db.models import F
 
 from ingestion import models
+from ingestion.octopus_client.client import OctopusHttpClient
+
+
+@dataclasses.dataclass
+class ConsumptionPage:
+    results: list[dict]
+    # URL of the following page, None for the last one
+    next_url: str | None
 
 
 class OctopusAPI:
-    OCTOPUS_API_V1 = 'https://api.octopus.energy/v1'
+    @classmethod
+    def api_url(cls) -> str:
+        return settings.OCTOPUS_API_URL
 
     @classmethod
     def build_consumption_endpoint(cls, meter: models.Meter) -> str:
         if meter.energy_type == models.EnergyType.ELECTRICITY:
             # TODO(tr) use urllib?
-            return f'{cls.OCTOPUS_API_V1}/electricity-meter-points/{meter.mpan.mpan}/meters/{meter.serial}/consumption'
+            return f'{cls.api_url()}/electricity-meter-points/{meter.mpan.mpan}/meters/{meter.serial}/consumption'
         elif meter.energy_type == models.EnergyType.GAS:
-            return f'{cls.OCTOPUS_API_V1}/gas-meter-points/{meter.mpan.mpan}/meters/{meter.serial}/consumption'
+            return f'{cls.api_url()}/gas-meter-points/{meter.mpan.mpan}/meters/{meter.serial}/consumption'
         else:
             raise NotImplementedError(f'Unexpected config {meter}')
 
@@ -30,53 +43,118 @@ class OctopusAPI:
             raise ValueError(f'Unexpected tz unaware {field} from octopus')
         return octopus_datetime
 
-    def __init__(self, meter: models.Meter, *, logger: logging.Logger | None = None, update_existing: bool = True):
+    def __init__(
+        self,
+        meter: models.Meter,
+        *,
+        logger: logging.Logger | None = None,
+        update_existing: bool = True,
+        limiter: threading.Semaphore | None = None,
+        client: OctopusHttpClient | None = None,
+    ):
         self.meter = meter
-        self.session = requests.Session()
-        self.session.auth = HTTPBasicAuth(self.meter.api_key, '')
+        # held while a request is in flight, shared between the connections using the same API key
+        self.limiter = limiter
+        # the pooled session of the API key, shared with the other meters of the key
+        self.client = client if client is not None else OctopusHttpClient.for_key(self.meter.api_key)
         self.consumption_endpoint = self.build_consumption_endpoint(self.meter)
         if logger is None:
             logger = logging.getLogger(__name__)
         self.logger = logger
         self.update_existing = update_existing
+        # rows inserted (not updated) by build_consumption_from_json
+        self.inserted_rows = 0
 
-    def build_consumption_from_json(self, data: dict) -> models.Consumption:
+    def consumption_from_json(self, data: dict) -> models.Consumption:
+        """Build an unsaved row from one of the API results"""
         self.logger.debug(f'Building row from {data=}')
         interval_start = self.handle_datetime(data, 'interval_start')
         interval_end = self.handle_datetime(data, 'interval_end')
         consumption = float(data.pop('consumption'))
         # TODO(tr) warning for unexpected fields?
 
+        return models.Consumption(
+            consumption=consumption,
+            interval_start=interval_start,
+            interval_end=interval_end,
+            meter=self.meter,
+        )
+
+    def build_consumption_from_json(self, data: dict) -> models.Consumption:
+        new_row = self.consumption_from_json(data)
         try:
             with transaction.atomic():
-                return models.Consumption.objects.create(
-                    consumption=consumption,
-                    interval_start=interval_start,
-                    interval_end=interval_end,
-                    meter=self.meter,
-                )
+                new_row.save(force_insert=True)
+            self.inserted_rows += 1
+            return new_row
         except IntegrityError:
             if not self.update_existing:
                 raise
             existing_row = models.Consumption.objects.filter(
-                interval_start=interval_start,
-                interval_end=interval_end,
+                interval_start=new_row.interval_start,
+                interval_end=new_row.interval_end,
                 meter=self.meter,
             ).first()
-            self.logger.debug(f'  Updating {existing_row} from {existing_row.consumption}->{consumption}')
-            existing_row.consumption = consumption
+            self.logger.debug(f'  Updating {existing_row} from {existing_row.consumption}->{new_row.consumption}')
+            existing_row.consumption = new_row.consumption
             existing_row.save()
             return existing_row
 
-    def get_consumption_data(
+    @classmethod
+    def upsert_meter_consumption(
+        cls,
+        meter: models.Meter,
+        rows: list[models.Consumption],
+        *,
+        update_existing: bool = True,
+    ) -> tuple[int, int]:
+        """Insert rows of meter or update the consumption of the existing ones with a bulk upsert.
+
+        Relies on the unique_consumption_interval constraint, the existing rows are looked up first
+        only to report how many are updated. The updated rows keep their rate and unit rate, their
+        cost is computed again from the new consumption.
+        :return: the number of inserted and updated rows
+        """
+        if not rows:
+            return 0, 0
+
+        period = models.Consumption.objects.filter(
+            meter=meter,
+            interval_start__gte=min(row.interval_start for row in rows),
+            interval_start__lte=max(row.interval_start for row in rows),
+        )
+        existing = set(period.values_list('interval_start', 'interval_end'))
+        updated = sum(1 for row in rows if (row.interval_start, row.interval_end) in existing)
+        if updated and not update_existing:
+            raise IntegrityError(f'{updated} rows already exist for {meter}')
+
+        models.Consumption.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['meter', 'interval_start', 'interval_end'],
+            update_fields=['consumption'],
+        )
+        if updated:
+            period.filter(unit_rate__isnull=False).update(cost=F('consumption') * F('unit_rate'))
+        return len(rows) - updated, updated
+
+    def first_page_url(
         self,
-        period_from: datetime = None,
-        period_to: datetime = None,
-    ) -> Iterable[dict]:
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+        *,
+        next_url: str | None = None,
+    ) -> str:
+        """URL of the first page to download, next_url if given (a resumed download)"""
         if period_to is not None and period_from is None:
             raise ValueError('period_from has to be specified when using period_to')
 
-        params = {}
+        if next_url is not None:
+            self.logger.info(f'Resuming data for {self.meter} from {next_url}')
+            return next_url
+
+        # oldest first, the API gives the latest readings first by default
+        params = {'order_by': 'period'}
         if period_from:
             params['period_from'] = period_from.isoformat()
         if period_to:
@@ -84,26 +162,38 @@ class OctopusAPI:
 
         req = requests.PreparedRequest()
         req.prepare_url(self.consumption_endpoint, params)
-        endpoint = req.url
-
         self.logger.info(
-            f'Getting data for {self.meter} for period_from={params.get("period_from")} period_to={params.get("period_to")}',
+            f'Getting data for {self.meter} for '
+            f'period_from={params.get("period_from")} period_to={params.get("period_to")}',
         )
+        return req.url
+
+    def get_consumption_pages(
+        self,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+        *,
+        next_url: str | None = None,
+    ) -> Iterable[ConsumptionPage]:
+        """The pages of results one at a time, from next_url if given (a resumed download)"""
+        endpoint = self.first_page_url(period_from, period_to, next_url=next_url)
         pages = 0
         while endpoint is not None:
-            response = self.session.get(endpoint)
+            response = self.client.get(endpoint, limiter=self.limiter, logger=self.logger)
             self.logger.debug(f'< Got {response.status_code} from {response.url}')
             response.raise_for_status()
 
             data = response.json()
-
-            # For most cases this could be a list,
-            # but we may want to support pagination in the future
-            for result in data['results']:
-                yield result
-                # consumption.update_rate()
-
             endpoint = data.get('next')
             pages += 1
+            yield ConsumptionPage(data['results'], endpoint)
 
         self.logger.info(f'Gathered {pages} pages of data for {self.meter.serial=} for {period_from=} {period_to=}')
+
+    def get_consumption_data(
+        self,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+    ) -> Iterable[dict]:
+        for page in self.get_consumption_pages(period_from, period_to):
+            yield from page.results
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from ingestion import models
+from ingestion.octopus_client.api import ConsumptionPage, OctopusAPI
+from ingestion.octopus_client.client import RETRY_STATUSES, HttpMetrics, RetryPolicy
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only needed by data_ingestion --async
+    aiohttp = None
+
+
+class AsyncOctopusHttpClient:
+    """The aiohttp session of an API key, retrying like `OctopusHttpClient`.
+
+    At most max_requests requests of the key are in flight at the same time, the connector keeps
+    that many connections open. The session is created by the first request: it belongs to the
+    event loop running it, `close()` it in the same loop.
+    """
+
+    # seconds to connect and to wait for a response
+    DEFAULT_TIMEOUT = (10, 60)
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        max_requests: int,
+        policy: RetryPolicy | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        if aiohttp is None:
+            raise RuntimeError('aiohttp is required for the async download: pip install aiohttp')
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.api_key = api_key
+        self.max_requests = max_requests
+        self.policy = policy if policy is not None else RetryPolicy.from_settings()
+        # only changed by the event loop
+        self.metrics = HttpMetrics()
+        self._session: aiohttp.ClientSession | None = None
+
+    def session(self) -> 'aiohttp.ClientSession':
+        if self._session is None:
+            connect, read = self.DEFAULT_TIMEOUT
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(self.api_key, ''),
+                connector=aiohttp.TCPConnector(limit=self.max_requests),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_json(self, url: str, *, logger: logging.Logger | None = None) -> dict:
+        """GET url and decode its JSON, retrying the transient errors.
+
+        Raises `aiohttp.ClientResponseError` for the other errors and when the retries are
+        exhausted.
+        """
+        if logger is None:
+            logger = self.logger
+        attempt = 0
+        while True:
+            self.metrics.requests += 1
+            retry_after = None
+            try:
+                async with self.session().get(url) as response:
+                    logger.debug(f'< Got {response.status} from {response.url}')
+                    if response.status in RETRY_STATUSES and attempt < self.policy.retries:
+                        reason = f'{response.status} {response.reason}'
+                        retry_after = response.headers.get('Retry-After')
+                        # read the body, so that the connection is kept for the next request
+                        await response.read()
+                    else:
+                        if response.status in RETRY_STATUSES:
+                            self.metrics.failures += 1
+                        response.raise_for_status()
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, TimeoutError) as ex:
+                if attempt >= self.policy.retries:
+                    self.metrics.failures += 1
+                    raise
+                reason = str(ex) or type(ex).__name__
+
+            attempt += 1
+            delay = self.policy.delay(attempt, retry_after)
+            logger.warning(f'  {reason} from {url}, retry {attempt}/{self.policy.retries} in {delay:.1f}s')
+            self.metrics.retries += 1
+            self.metrics.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+
+class AsyncOctopusAPI(OctopusAPI):
+    """`OctopusAPI` downloading the pages with asyncio.
+
+    `get_consumption_pages` and `get_consumption_data` are async generators, run in the event loop.
+    The rows are still built and written by the synchronous methods, in the thread using the
+    database.
+    """
+
+    def __init__(
+        self,
+        meter: models.Meter,
+        *,
+        client: AsyncOctopusHttpClient,
+        logger: logging.Logger | None = None,
+        update_existing: bool = True,
+    ):
+        super().__init__(meter, logger=logger, update_existing=update_existing, client=client)
+        self.client: AsyncOctopusHttpClient = client
+
+    async def get_consumption_pages(
+        self,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+        *,
+        next_url: str | None = None,
+    ) -> AsyncIterator[ConsumptionPage]:
+        endpoint = self.first_page_url(period_from, period_to, next_url=next_url)
+        pages = 0
+        while endpoint is not None:
+            data = await self.client.get_json(endpoint, logger=self.logger)
+            endpoint = data.get('next')
+            pages += 1
+            yield ConsumptionPage(data['results'], endpoint)
+
+        self.logger.info(f'Gathered {pages} pages of data for {self.meter.serial=} for {period_from=} {period_to=}')
+
+    async def get_consumption_data(
+        self,
+        period_from: datetime | None = None,
+        period_to: datetime | None = None,
+    ) -> AsyncIterator[dict]:
+        async for page in self.get_consumption_pages(period_from, period_to):
+            for result in page.results:
+                yield result
@@ -0,0 +1,199 @@
+import contextlib
+import dataclasses
+import email.utils
+import logging
+import random
+import threading
+import time
+from datetime import UTC, datetime
+from typing import ClassVar, Self
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+# Transient errors worth another try, the other statuses are raised straight away
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclasses.dataclass
+class RetryPolicy:
+    """How many times and how long to wait before sending a request again.
+
+    The delays grow exponentially from backoff_seconds with a full jitter (a random delay between
+    0 and the exponential one), so that the workers of an API key do not retry all at once. A
+    Retry-After header from the server is used instead when there is one. No delay is longer
+    than max_backoff_seconds.
+    """
+
+    retries: int = 5
+    backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 60.0
+
+    @classmethod
+    def from_settings(cls) -> Self:
+        return cls(
+            retries=getattr(settings, 'OCTOPUS_HTTP_RETRIES', cls.retries),
+            backoff_seconds=getattr(settings, 'OCTOPUS_HTTP_BACKOFF_SECONDS', cls.backoff_seconds),
+            max_backoff_seconds=getattr(settings, 'OCTOPUS_HTTP_MAX_BACKOFF_SECONDS', cls.max_backoff_seconds),
+        )
+
+    @classmethod
+    def retry_after(cls, value: str | None) -> float | None:
+        """Seconds asked by a Retry-After header (a number of seconds or an HTTP date)"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=UTC)
+        return max(0.0, (when - datetime.now(UTC)).total_seconds())
+
+    def delay(self, attempt: int, retry_after: str | None = None) -> float:
+        """Seconds to wait before the attempt-th retry (from 1), retry_after is the header"""
+        seconds = self.retry_after(retry_after)
+        if seconds is None:
+            seconds = random.uniform(0, self.backoff_seconds * 2 ** (attempt - 1))
+        return min(seconds, self.max_backoff_seconds)
+
+
+@dataclasses.dataclass
+class HttpMetrics:
+    """Requests sent by the clients, including the retries, and the time spent waiting to retry"""
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    waited_seconds: float = 0.0
+
+    def __add__(self, other: 'HttpMetrics') -> 'HttpMetrics':
+        return HttpMetrics(*(getattr(self, f.name) + getattr(other, f.name) for f in dataclasses.fields(self)))
+
+    def __sub__(self, other: 'HttpMetrics') -> 'HttpMetrics':
+        return HttpMetrics(*(getattr(self, f.name) - getattr(other, f.name) for f in dataclasses.fields(self)))
+
+    def __str__(self):
+        return (
+            f'{self.requests} requests, {self.retries} retries, {self.failures} failures, '
+            f'{self.waited_seconds:.1f}s waiting to retry'
+        )
+
+
+class OctopusHttpClient:
+    """A pooled session per API key, shared by all the meters of the key and by the threads.
+
+    `get()` retries the transient errors (connection errors, 429 and 5xx) following `RetryPolicy`.
+    The keep-alive connections are reused between the meters, the pool keeps up to pool_size of
+    them (OCTOPUS_HTTP_POOL_SIZE).
+    Use `for_key()`: the clients are kept by the process until `close_all()`.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    # seconds to connect and to wait for a response
+    DEFAULT_TIMEOUT = (10, 60)
+
+    _clients: ClassVar[dict[str, 'OctopusHttpClient']] = {}
+    _clients_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        pool_size: int | None = None,
+        policy: RetryPolicy | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        if pool_size is None:
+            pool_size = getattr(settings, 'OCTOPUS_HTTP_POOL_SIZE', self.DEFAULT_POOL_SIZE)
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.policy = policy if policy is not None else RetryPolicy.from_settings()
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(api_key, '')
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.metrics = HttpMetrics()
+        self._metrics_lock = threading.Lock()
+
+    @classmethod
+    def for_key(cls, api_key: str) -> 'OctopusHttpClient':
+        with cls._clients_lock:
+            client = cls._clients.get(api_key)
+            if client is None:
+                client = cls._clients[api_key] = cls(api_key)
+            return client
+
+    @classmethod
+    def close_all(cls):
+        """Close the connections of the shared clients, the next `for_key()` creates new ones"""
+        with cls._clients_lock:
+            for client in cls._clients.values():
+                client.session.close()
+            cls._clients = {}
+
+    @classmethod
+    def total_metrics(cls) -> HttpMetrics:
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        return sum((client.snapshot() for client in clients), HttpMetrics())
+
+    def snapshot(self) -> HttpMetrics:
+        with self._metrics_lock:
+            return dataclasses.replace(self.metrics)
+
+    def _count(self, **increments):
+        with self._metrics_lock:
+            for name, value in increments.items():
+                setattr(self.metrics, name, getattr(self.metrics, name) + value)
+
+    def get(
+        self,
+        url: str,
+        *,
+        limiter: contextlib.AbstractContextManager | None = None,
+        logger: logging.Logger | None = None,
+    ) -> requests.Response:
+        """GET url, retrying the transient errors.
+
+        limiter is held while a request is in flight but not while waiting to retry. The last
+        response is returned when the retries are exhausted, the caller checks its status.
+        """
+        if limiter is None:
+            limiter = contextlib.nullcontext()
+        if logger is None:
+            logger = self.logger
+        attempt = 0
+        while True:
+            self._count(requests=1)
+            retry_after = None
+            try:
+                with limiter:
+                    response = self.session.get(url, timeout=self.DEFAULT_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if attempt >= self.policy.retries:
+                    self._count(failures=1)
+                    raise
+                reason = str(ex)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt >= self.policy.retries:
+                    self._count(failures=1)
+                    return response
+                reason = f'{response.status_code} {response.reason}'
+                retry_after = response.headers.get('Retry-After')
+
+            attempt += 1
+            delay = self.policy.delay(attempt, retry_after)
+            logger.warning(f'  {reason} from {url}, retry {attempt}/{self.policy.retries} in {delay:.1f}s')
+            self._count(retries=1, waited_seconds=delay)
+            time.sleep(delay)
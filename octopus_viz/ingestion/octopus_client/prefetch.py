@@ -0,0 +1,373 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta
+from typing import Self
+
+import requests
+
+from ingestion.octopus_client.api import OctopusAPI
+from ingestion.octopus_client.async_api import AsyncOctopusAPI, AsyncOctopusHttpClient, aiohttp
+from ingestion.octopus_client.client import HttpMetrics
+from ingestion.utils import in_batches
+
+# Marks the end of a download in its queue
+_DONE = object()
+
+
+class ApiKeyLimiter:
+    """Limit how many requests are in flight at the same time for each API key"""
+
+    def __init__(self, max_requests: int):
+        if max_requests < 1:
+            raise ValueError(f'At least 1 request per API key is required, not {max_requests}')
+        self.max_requests = max_requests
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+    def for_key(self, api_key: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if api_key not in self._semaphores:
+                self._semaphores[api_key] = threading.BoundedSemaphore(self.max_requests)
+            return self._semaphores[api_key]
+
+
+class MeterDownload:
+    """The results for one meter, downloaded by a worker thread and handed over in a bounded queue.
+
+    The worker only does HTTP requests, the database is only used by the thread reading `results()`.
+    The errors of the download are handed over in the queue and raised by `results()`, an
+    unexpected error stops the worker and is raised by `results()` from its future.
+    """
+
+    # Results put at once in the queue
+    chunk_size = 500
+    # errors of the download handed over to the writer
+    errors: tuple[type[Exception], ...] = (requests.RequestException, OSError)
+
+    def __init__(
+        self,
+        api_connection: OctopusAPI,
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        max_chunks: int,
+        cancelled: threading.Event,
+    ):
+        self.api_connection = api_connection
+        self.period_from = period_from
+        self.period_to = period_to
+        self.cancelled = cancelled
+        # of the worker running the download, set when it is started
+        self.future: concurrent.futures.Future | None = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max_chunks)
+
+    def _put(self, item) -> bool:
+        """Wait for some room in the queue unless the download was cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def run(self):
+        """Executed in the worker thread"""
+        try:
+            for chunk in in_batches(
+                self.api_connection.get_consumption_data(self.period_from, self.period_to),
+                self.chunk_size,
+            ):
+                if not self._put(chunk):
+                    return
+        except self.errors as ex:
+            self._put(ex)
+        else:
+            self._put(_DONE)
+
+    def _get(self):
+        """The next item of the queue, raises the error of the worker if it stopped without one"""
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.future is not None and self.future.done():
+                    break
+        # everything put by the worker before it stopped is in the queue
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            self.future.result()
+            raise RuntimeError(f'The download of {self.api_connection.meter} stopped without its results')
+
+    def results(self) -> Iterable[dict]:
+        """Executed by the writer, yield the results as they arrive"""
+        while True:
+            item = self._get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+
+
+class AsyncMeterDownload(MeterDownload):
+    """A `MeterDownload` run by an event loop, each page of results is a chunk of the queue"""
+
+    api_connection: AsyncOctopusAPI
+    errors: tuple[type[Exception], ...] = (TimeoutError, OSError) + (
+        (aiohttp.ClientError,) if aiohttp is not None else ()
+    )
+
+    async def _put_async(self, item) -> bool:
+        """Like `_put` without blocking the event loop"""
+        while not self.cancelled.is_set():
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                await asyncio.sleep(0.05)
+                continue
+            return True
+        return False
+
+    async def run_async(self):
+        """Executed by the event loop"""
+        try:
+            async for page in self.api_connection.get_consumption_pages(self.period_from, self.period_to):
+                if page.results and not await self._put_async(page.results):
+                    return
+        except self.errors as ex:
+            await self._put_async(ex)
+        else:
+            await self._put_async(_DONE)
+
+
+def shard_period(period_from: date, period_to: date, shard_days: int) -> list[tuple[date, date]]:
+    """Split [period_from ; period_to[ into consecutive windows of at most shard_days days"""
+    if shard_days < 1:
+        raise ValueError(f'Shards need at least 1 day, not {shard_days}')
+    shards = []
+    shard_from = period_from
+    while shard_from < period_to:
+        shard_to = min(shard_from + timedelta(days=shard_days), period_to)
+        shards.append((shard_from, shard_to))
+        shard_from = shard_to
+    return shards
+
+
+class ShardedDownload:
+    """Downloads of consecutive windows of the same meter, chained back into a single stream.
+
+    The windows are consecutive and each is downloaded ordered by interval_start (see
+    `OctopusAPI.first_page_url`), so they are read one after the other while the next ones fill
+    their queues. Only the chunks in the queues of the shards are in memory. The window read is
+    always started: the pool starts the shards in order, a shard waiting for the writer never
+    holds a worker needed by an earlier one. A reading present in two windows (at their boundary)
+    is only yielded once, a reading out of order is yielded where it is found.
+    """
+
+    def __init__(self, shards: list[MeterDownload]):
+        self.shards = shards
+
+    @classmethod
+    def _interval_start(cls, result: dict) -> datetime:
+        return datetime.fromisoformat(result['interval_start'])
+
+    def results(self) -> Iterable[dict]:
+        previous: datetime | None = None
+        for result in itertools.chain.from_iterable(shard.results() for shard in self.shards):
+            interval_start = self._interval_start(result)
+            if interval_start == previous:
+                continue
+            previous = interval_start
+            yield result
+
+
+class ConcurrentDownload:
+    """Download several meters at the same time with a pool of threads.
+
+    Usage:
+    ```
+    with ConcurrentDownload(workers=4, max_requests_per_key=2) as downloader:
+        downloads = [downloader.start(api_connection, period_from, period_to) for ...]
+        for download in downloads:
+            for result in download.results():
+                ...  # a single thread writes in the database
+    ```
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_requests_per_key: int,
+        *,
+        max_chunks: int = 20,
+        logger: logging.Logger | None = None,
+    ):
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.workers = workers
+        self.max_chunks = max_chunks
+        self.limiter = ApiKeyLimiter(max_requests_per_key)
+        self.cancelled = threading.Event()
+        self._pool: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> Self:
+        self.cancelled.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='octopus-download')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # unblock the workers still waiting for the writer
+        self.cancelled.set()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+
+    def limiter_for(self, api_key: str) -> threading.BoundedSemaphore:
+        return self.limiter.for_key(api_key)
+
+    def start(
+        self,
+        api_connection: OctopusAPI,
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        shard_days: int | None = None,
+    ) -> MeterDownload | ShardedDownload:
+        """Start downloading the results of a meter.
+
+        With shard_days, [period_from ; period_to[ is split into windows of shard_days downloaded
+        concurrently.
+        """
+        if shard_days and period_from is not None and period_to is not None:
+            return ShardedDownload([
+                self._start(api_connection, shard_from, shard_to)
+                for shard_from, shard_to in shard_period(period_from, period_to, shard_days)
+            ])
+        return self._start(api_connection, period_from, period_to)
+
+    def _start(self, api_connection: OctopusAPI, period_from: date | None, period_to: date | None) -> MeterDownload:
+        download = MeterDownload(
+            api_connection,
+            period_from,
+            period_to,
+            max_chunks=self.max_chunks,
+            cancelled=self.cancelled,
+        )
+        download.future = self._pool.submit(download.run)
+        return download
+
+
+class AsyncConcurrentDownload:
+    """Download all the meters at the same time from an asyncio event loop running in a thread.
+
+    Like `ConcurrentDownload`, the results are handed over in a bounded queue per download: the
+    downloads wait while the writer is busy with the meters before them. The connections of an
+    API key are limited to max_requests_per_key.
+    Usage:
+    ```
+    with AsyncConcurrentDownload(max_requests_per_key=2) as downloader:
+        api_connection = AsyncOctopusAPI(meter, client=downloader.client_for(meter.api_key))
+        downloads = [downloader.start(api_connection, period_from, period_to) for ...]
+        for download in downloads:
+            for result in download.results():
+                ...  # a single thread writes in the database
+    ```
+    """
+
+    def __init__(
+        self,
+        max_requests_per_key: int,
+        *,
+        max_chunks: int = 20,
+        logger: logging.Logger | None = None,
+    ):
+        if max_requests_per_key < 1:
+            raise ValueError(f'At least 1 request per API key is required, not {max_requests_per_key}')
+        if logger is None:
+            logger = logging.getLogger(__name__)
+        self.logger = logger
+        self.max_requests_per_key = max_requests_per_key
+        self.max_chunks = max_chunks
+        self.cancelled = threading.Event()
+        self.clients: dict[str, AsyncOctopusHttpClient] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._futures: list[concurrent.futures.Future] = []
+
+    def __enter__(self) -> Self:
+        self.cancelled.clear()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='octopus-async-download', daemon=True)
+        self._thread.start()
+        return self
+
+    async def _close_clients(self):
+        for client in self.clients.values():
+            await client.close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # stop the downloads still running, e.g. when the writer failed
+        self.cancelled.set()
+        for future in self._futures:
+            future.cancel()
+        concurrent.futures.wait(self._futures)
+        asyncio.run_coroutine_threadsafe(self._close_clients(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        self._futures = []
+
+    def client_for(self, api_key: str) -> AsyncOctopusHttpClient:
+        if api_key not in self.clients:
+            self.clients[api_key] = AsyncOctopusHttpClient(
+                api_key,
+                max_requests=self.max_requests_per_key,
+                logger=self.logger,
+            )
+        return self.clients[api_key]
+
+    def metrics(self) -> HttpMetrics:
+        return sum((client.metrics for client in self.clients.values()), HttpMetrics())
+
+    def start(
+        self,
+        api_connection: AsyncOctopusAPI,
+        period_from: date | None,
+        period_to: date | None,
+        *,
+        shard_days: int | None = None,
+    ) -> AsyncMeterDownload | ShardedDownload:
+        """Start downloading the results of a meter, in windows of shard_days if given"""
+        if shard_days and period_from is not None and period_to is not None:
+            return ShardedDownload([
+                self._start(api_connection, shard_from, shard_to)
+                for shard_from, shard_to in shard_period(period_from, period_to, shard_days)
+            ])
+        return self._start(api_connection, period_from, period_to)
+
+    def _start(
+        self,
+        api_connection: AsyncOctopusAPI,
+        period_from: date | None,
+        period_to: date | None,
+    ) -> AsyncMeterDownload:
+        download = AsyncMeterDownload(
+            api_connection,
+            period_from,
+            period_to,
+            max_chunks=self.max_chunks,
+            cancelled=self.cancelled,
+        )
+        download.future = asyncio.run_coroutine_threadsafe(download.run_async(), self._loop)
+        self._futures.append(download.future)
+        return download
@@ -0,0 +1,80 @@
+from datetime import date
+
+from django import urls
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, Max, Model
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.models import MeterFilters
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=2, meters=2)
+MORE = SyntheticDataset(start=DATASET.end, days=2, meters=2, name='more')
+
+
+class AnnotateReadingsTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        MORE.build()
+        # a meter without readings nor counters
+        models.Meter.objects.create(
+            serial='empty',
+            energy_type=models.EnergyType.ELECTRICITY,
+            metric_unit=models.MetricUnit.KWH,
+            mpan=models.MPAN.objects.create(mpan='empty', direction=models.Direction.IMPORTING),
+        )
+
+    def assert_readings(self, model: type[models.Meter] | type[models.MPAN], readings: str):
+        expected = {
+            pk: (count, last)
+            for pk, count, last in model.objects.annotate(
+                count=Count(readings),
+                last=Max(f'{readings}__interval_start'),
+            ).values_list('pk', 'count', 'last')
+        }
+        with self.assertNumQueries(1):
+            annotated = {
+                row.pk: (row.reading_count, row.last_reading)
+                for row in MeterFilters.annotate_readings(model.objects.all())
+            }
+        self.assertEqual(annotated, expected)
+
+    def test_meters(self):
+        self.assert_readings(models.Meter, 'consumption')
+
+    def test_mpans(self):
+        # a second meter on an MPAN, the readings of both are counted
+        mpan = models.MPAN.objects.get(mpan=f'{DATASET.name}-0000')
+        models.Meter.objects.filter(serial=f'{MORE.name}-serial-0000').update(mpan=mpan)
+        self.assert_readings(models.MPAN, 'meter__consumption')
+
+
+@override_settings(ROOT_URLCONF='ingestion.tests.urls')
+class ChangelistQueriesTest(TestCase):
+    """The changelists run as many queries whatever the number of rows"""
+
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+
+    @classmethod
+    def render(cls, model: type[Model]) -> int:
+        url = urls.reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        request = RequestFactory().get(url)
+        request.user = User(username='admin', is_active=True, is_staff=True, is_superuser=True)
+        with CaptureQueriesContext(connection) as queries:
+            admin.site.get_model_admin(model).changelist_view(request).render()
+        return len(queries)
+
+    def test_changelists(self):
+        changelists = (models.APIKey, models.MPAN, models.Meter, models.Tariff, models.Rate, models.Consumption)
+        before = {model: self.render(model) for model in changelists}
+        MORE.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+
+        self.assertEqual({model: self.render(model) for model in changelists}, before)
@@ -0,0 +1,217 @@
+import functools
+import unittest
+from collections.abc import Callable
+from datetime import date
+
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.aggregator.consumption import (
+    ConsumptionAggregator,
+    NetAggregator,
+    PeriodAggregator,
+    TariffAggregator,
+)
+from ingestion.aggregator.sql import SqlAggregatorMixin, SqlPeriodAggregator, SqlTariffAggregator
+from ingestion.aggregator.vectorised import VectorisedPeriodAggregator, VectorisedTariffAggregator, np
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.forms.graphs import MonthlyGraphForm
+from ingestion.views.graphs import MonthlyGraphData, TariffGraphData
+
+
+# across the end of March
+DATASET = SyntheticDataset(start=date(2024, 3, 27), days=7, meters=2)
+
+
+class AggregatorTestCase(TestCase):
+    """The synthetic readings rated, with the readings of a day detached"""
+
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        models.Consumption.objects.filter(
+            interval_start__gte=models.RollupConsumption.local_midnight(date(2024, 3, 29)),
+            interval_start__lt=models.RollupConsumption.local_midnight(date(2024, 3, 30)),
+        ).update(tariff=None, rate=None, unit_rate=None, cost=None)
+        models.RollupConsumption().rebuild()
+
+    @classmethod
+    def readings(cls, direction: models.Direction):
+        return models.Consumption.objects.filter(meter__mpan__direction=direction).select_related(
+            'meter',
+            'rate',
+            'tariff',
+        )
+
+    def assert_same_data(self, aggregator: ConsumptionAggregator, expected: ConsumptionAggregator):
+        self.assertEqual(aggregator.data.keys(), expected.data.keys())
+        for key, item in expected.data.items():
+            with self.subTest(key=key):
+                actual = aggregator.data[key]
+                self.assertAlmostEqual(actual.consumption, item.consumption, places=6)
+                if item.price is None:
+                    self.assertIsNone(actual.price)
+                else:
+                    self.assertAlmostEqual(actual.price, item.price, places=6)
+                self.assertEqual(
+                    (actual.metric_unit, actual.currency, actual.earliest, actual.latest),
+                    (item.metric_unit, item.currency, item.earliest, item.latest),
+                )
+        self.assertEqual((aggregator.metric_unit, aggregator.currency), (expected.metric_unit, expected.currency))
+
+
+class SqlAggregatorTest(AggregatorTestCase):
+    def compare(self, python_cls: type[ConsumptionAggregator], sql_cls: type[SqlAggregatorMixin], **kwargs):
+        from_readings = sql_cls.process_directions(models.Consumption.objects.all(), **kwargs)
+        from_rollup = sql_cls.process_directions(models.ConsumptionRollup.objects.all(), **kwargs)
+        for direction in models.Direction:
+            expected = python_cls(**kwargs).process(self.readings(direction))
+            self.assertIn('detached', expected.data)
+            self.assert_same_data(sql_cls(**kwargs).process(self.readings(direction)), expected)
+            self.assert_same_data(from_readings[direction], expected)
+            self.assert_same_data(from_rollup[direction], expected)
+
+    def test_period(self):
+        self.compare(PeriodAggregator, SqlPeriodAggregator)
+
+    def test_tariff_by_price(self):
+        self.compare(TariffAggregator, SqlTariffAggregator, by_price=True)
+
+    def test_tariff_by_interval(self):
+        self.compare(TariffAggregator, SqlTariffAggregator, by_price=False)
+
+
+class NetAggregatorTest(AggregatorTestCase):
+    def assert_net(self, importing: ConsumptionAggregator, exporting: ConsumptionAggregator):
+        net = NetAggregator().subtract(importing, exporting)
+        self.assertEqual(net.data.keys(), importing.data.keys() | exporting.data.keys())
+        for key, item in net.data.items():
+            with self.subTest(key=key):
+                imported, exported = importing.data.get(key), exporting.data.get(key)
+                self.assertAlmostEqual(
+                    item.consumption,
+                    (imported.consumption if imported else 0) - (exported.consumption if exported else 0),
+                )
+                price = imported.price if imported else None
+                if exported and exported.price is not None:
+                    price = (price or 0.0) - exported.price
+                if price is None:
+                    self.assertIsNone(item.price)
+                else:
+                    self.assertAlmostEqual(item.price, price)
+                self.assertEqual(
+                    (item.earliest, item.latest),
+                    (
+                        min(found.earliest for found in (imported, exported) if found),
+                        max(found.latest for found in (imported, exported) if found),
+                    ),
+                )
+                self.assertEqual(
+                    item.currency,
+                    next((found.currency for found in (imported, exported) if found and found.currency), None),
+                )
+        self.assertEqual(net.metric_unit, importing.metric_unit or exporting.metric_unit)
+        self.assertEqual(net.currency, importing.currency or exporting.currency)
+        return net
+
+    def test_same_buckets(self):
+        directions = SqlPeriodAggregator.process_directions(models.ConsumptionRollup.objects.all())
+        importing, exporting = directions[models.Direction.IMPORTING], directions[models.Direction.EXPORTING]
+        self.assertEqual(importing.data.keys(), exporting.data.keys())
+        self.assert_net(importing, exporting)
+
+    def test_mismatched_buckets(self):
+        # the import of the night and the export of the day, both have detached readings
+        night = {'interval_start__hour__lt': 12}
+        day = {'interval_start__hour__gte': 6}
+        for direction, periods in (
+            (models.Direction.IMPORTING, (night, day)),
+            (models.Direction.EXPORTING, (day, night)),
+        ):
+            with self.subTest(missing=direction):
+                importing = PeriodAggregator().process(
+                    self.readings(models.Direction.IMPORTING).filter(**periods[0]),
+                )
+                exporting = PeriodAggregator().process(
+                    self.readings(models.Direction.EXPORTING).filter(**periods[1]),
+                )
+                self.assertTrue(importing.data.keys() - exporting.data.keys())
+                self.assertTrue(exporting.data.keys() - importing.data.keys())
+                self.assert_net(importing, exporting)
+
+    def test_one_direction(self):
+        # import without export, then export without import
+        for missing in models.Direction:
+            with self.subTest(missing=missing):
+                directions = SqlPeriodAggregator.process_directions(
+                    models.ConsumptionRollup.objects.exclude(direction=missing),
+                )
+                importing, exporting = directions[models.Direction.IMPORTING], directions[models.Direction.EXPORTING]
+                self.assertEqual(directions[missing].data, {})
+                net = self.assert_net(importing, exporting)
+                self.assertTrue(net.data)
+
+    def test_net_trace(self):
+        """No net of the prices by tariff: the rates of the 2 directions are not the same"""
+        for view, show_price, shown in (
+            (MonthlyGraphData, False, True),
+            (MonthlyGraphData, True, True),
+            (TariffGraphData, False, True),
+            (TariffGraphData, True, False),
+        ):
+            with self.subTest(view=view.__name__, show_price=show_price):
+                params = {'month': '2024-03', 'show_net': 'on'}
+                if show_price:
+                    params['show_price'] = 'on'
+                data = view().process_form(MonthlyGraphForm(params))
+                self.assertEqual(
+                    [info['label'] for info in data['info']],
+                    ['import', 'export', 'net'] if shown else ['import', 'export'],
+                )
+
+
+class MonthPeriodAggregator(PeriodAggregator):
+    """PeriodAggregator keyed by month as well, like VectorisedPeriodAggregator(by_month=True)"""
+
+    def _key(self, row: models.Consumption) -> str:
+        return f'{row.interval_start:%Y-%m} {super()._key(row)}'
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class VectorisedAggregatorTest(AggregatorTestCase):
+    def compare(self, vectorised: Callable[[], ConsumptionAggregator], python: Callable[[], ConsumptionAggregator]):
+        for direction in models.Direction:
+            readings = self.readings(direction)
+            self.assert_same_data(vectorised().process(readings.all()), python().process(readings.all()))
+
+    def test_period(self):
+        self.compare(VectorisedPeriodAggregator, PeriodAggregator)
+
+    def test_hours(self):
+        self.compare(
+            functools.partial(VectorisedPeriodAggregator, '%H', bucket_minutes=60),
+            functools.partial(PeriodAggregator, '%H'),
+        )
+
+    def test_months(self):
+        self.compare(functools.partial(VectorisedPeriodAggregator, by_month=True), MonthPeriodAggregator)
+
+    def test_tariff_by_price(self):
+        self.compare(
+            functools.partial(VectorisedTariffAggregator, by_price=True),
+            functools.partial(TariffAggregator, by_price=True),
+        )
+
+    def test_tariff_by_interval(self):
+        self.compare(
+            functools.partial(VectorisedTariffAggregator, by_price=False),
+            functools.partial(TariffAggregator, by_price=False),
+        )
+
+    def test_no_readings(self):
+        aggregator = VectorisedPeriodAggregator().process(models.Consumption.objects.none())
+        self.assertEqual(aggregator.data, {})
+
+    def test_buckets_must_split_the_day(self):
+        with self.assertRaises(ValueError):
+            VectorisedPeriodAggregator(bucket_minutes=7)
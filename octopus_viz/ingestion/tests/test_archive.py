@@ -0,0 +1,113 @@
+import io
+import tempfile
+import unittest
+from datetime import date
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.archive import ConsumptionArchive, pa
+from ingestion.benchmark.dataset import SyntheticDataset
+
+
+# across the end of March
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=4, meters=2)
+
+
+def readings() -> list[tuple]:
+    return sorted(
+        models.Consumption.objects.values_list(
+            'meter_id',
+            'interval_start',
+            'interval_end',
+            'consumption',
+            'tariff_id',
+            'rate_id',
+            'cost',
+        ),
+    )
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class ArchiveTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.expected = readings()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = directory.name
+
+    def archived_rows(self) -> int:
+        return ConsumptionArchive(self.archive_dir).dataset().count_rows()
+
+    def load(self) -> str:
+        stdout = io.StringIO()
+        call_command('load_archive', self.archive_dir, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_round_trip(self):
+        call_command('export_archive', self.archive_dir, stdout=io.StringIO())
+        models.Consumption.objects.all().delete()
+
+        self.assertIn(f'{len(self.expected)} inserted and 0 updated', self.load())
+        # the rates are attached again
+        self.assertEqual(readings(), self.expected)
+        self.assertTrue(models.ConsumptionRollup.objects.exists())
+
+    def test_load_present_readings(self):
+        call_command('export_archive', self.archive_dir, stdout=io.StringIO())
+
+        self.assertIn(f'0 inserted and {len(self.expected)} updated', self.load())
+        self.assertEqual(readings(), self.expected)
+
+    def test_partitions(self):
+        call_command('export_archive', self.archive_dir, stdout=io.StringIO())
+
+        months = {
+            (keys['serial'], keys['mpan'], keys['month'])
+            for fragment in ConsumptionArchive(self.archive_dir).dataset().get_fragments()
+            for keys in [pa.dataset.get_partition_keys(fragment.partition_expression)]
+        }
+        meters = models.Meter.objects.select_related('mpan')
+        self.assertEqual(
+            months,
+            {(meter.serial, meter.mpan.mpan, month) for meter in meters for month in ('2024-03', '2024-04')},
+        )
+
+    def test_export_replaces_the_months(self):
+        call_command('export_archive', self.archive_dir, stdout=io.StringIO())
+        # months written over several batches
+        call_command(
+            'export_archive',
+            self.archive_dir,
+            '--period-from',
+            '2024-04-01',
+            '--batch-size',
+            '50',
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(self.archived_rows(), len(self.expected))
+
+    def test_append_results(self):
+        archive = ConsumptionArchive(self.archive_dir)
+        for meter in models.Meter.objects.select_related('mpan'):
+            results = [
+                {
+                    'interval_start': interval_start.isoformat(),
+                    'interval_end': interval_end.isoformat(),
+                    'consumption': consumption,
+                }
+                for interval_start, interval_end, consumption in meter.consumption_set.values_list(
+                    'interval_start',
+                    'interval_end',
+                    'consumption',
+                )
+            ]
+            self.assertEqual(archive.append_results(meter, results), len(results))
+        models.Consumption.objects.all().delete()
+
+        self.load()
+        self.assertEqual(readings(), self.expected)
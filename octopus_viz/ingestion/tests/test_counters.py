@@ -0,0 +1,69 @@
+import io
+import json
+import os.path
+import tempfile
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.tests.test_file_ingestion import cache_lines
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=2, meters=2)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        self.meter = models.Meter.objects.order_by('id').first()
+
+    def assert_counters(self):
+        """The counters of every meter are COUNT and MAX of its readings"""
+        actual = models.ReadingCounters.actual()
+        stored = {counters.meter_id: counters.as_tuple() for counters in models.MeterCounters.objects.all()}
+        for meter_id in models.Meter.objects.values_list('id', flat=True):
+            with self.subTest(meter_id=meter_id):
+                self.assertEqual(stored.get(meter_id, (0, 0, None)), actual.get(meter_id, (0, 0, None)))
+
+    def test_ingestion(self):
+        self.assert_counters()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'serial-cached_mpan-cached_start_end')
+            with open(path, 'w') as fout:
+                fout.writelines(json.dumps(line) + '\n' for line in cache_lines('electricity_importing_kwh', 96))
+            call_command('cache_ingestion', path, '--create-missing-meter', stdout=io.StringIO())
+
+        self.assertTrue(models.Consumption.objects.filter(meter__serial='serial-cached').exists())
+        self.assert_counters()
+
+    def test_rerate(self):
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.assert_counters()
+        # the readings after the first day lose their tariff
+        models.Tariff.objects.update(valid_until=DATASET.start + timedelta(days=1))
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+
+        self.assertTrue(models.Consumption.objects.filter(tariff__isnull=True).exists())
+        self.assert_counters()
+
+    def test_delete(self):
+        models.Tariff.objects.update(valid_until=DATASET.start + timedelta(days=1))
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        readings = models.Consumption.objects.filter(meter=self.meter)
+
+        # the latest readings, some of them detached
+        latest = readings.order_by('-interval_start').values_list('interval_start', flat=True)[10]
+        readings.filter(interval_start__gte=latest).delete()
+        self.assert_counters()
+
+        # a reading in the middle, the last one stays
+        readings.order_by('interval_start')[5].delete()
+        self.assert_counters()
+
+        # every reading of the meter
+        readings.delete()
+        self.assertIsNone(models.MeterCounters.objects.get(meter=self.meter).last_interval_start)
+        self.assert_counters()
@@ -0,0 +1,13 @@
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+
+class DataIngestionOptionsTest(SimpleTestCase):
+    def test_checkpoints_without_database(self):
+        for checkpoint in (('--checkpoint-pages', '2'), ('--resume',)):
+            for output in (('--debug-filename', 'readings.jsons'), ('--archive-dir', 'archive')):
+                with (
+                    self.subTest(checkpoint=checkpoint, output=output),
+                    self.assertRaisesMessage(CommandError, '--debug-filename or --archive-dir'),
+                ):
+                    call_command('data_ingestion', *checkpoint, *output)
@@ -0,0 +1,166 @@
+import io
+import itertools
+import json
+import os.path
+import tempfile
+from datetime import UTC, datetime, timedelta
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.management.commands.cache_ingestion import Command, FileChunk, parse_chunk
+
+
+START = datetime(2024, 3, 30, tzinfo=UTC)
+
+
+def cache_lines(unit: str, readings: int, *, first: int = 0) -> list[dict]:
+    return [
+        {
+            'consumption': round(0.1 * (first + i), 3),
+            'interval_start': (START + timedelta(minutes=30 * (first + i))).isoformat(),
+            'interval_end': (START + timedelta(minutes=30 * (first + i + 1))).isoformat(),
+            'unit': unit,
+        }
+        for i in range(readings)
+    ]
+
+
+def config_tariffs(name: str, unit: str) -> dict:
+    return {
+        name: {
+            'unit': unit,
+            'valid_from': '2024-03-01T00:00:00+00:00',
+            'rates': [
+                {'interval_start': '00:00', 'interval_end': '02:00', 'rate': 0.2},
+                {'interval_start': '02:00', 'interval_end': '05:00', 'rate': 0.07},
+                {'interval_start': '05:00', 'interval_end': '24:00', 'rate': 0.2},
+            ],
+        },
+    }
+
+
+class JobsTestCase(TestCase):
+    """The files written in a temporary directory, ingested with --jobs 1 then with more jobs"""
+
+    command = ''
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.paths: list[str] = []
+
+    def write(self, filename: str, content: str):
+        path = os.path.join(self.directory, filename)
+        with open(path, 'w') as fout:
+            fout.write(content)
+        self.paths.append(path)
+
+    def snapshot(self) -> list[tuple]:
+        raise NotImplementedError()
+
+    def ingest(self, jobs: int, *args: str) -> tuple[list[tuple], list[str]]:
+        """What the files loaded and the errors reported, rolled back afterward"""
+        stderr = io.StringIO()
+        with transaction.atomic():
+            call_command(self.command, *self.paths, *args, '--jobs', str(jobs), stdout=io.StringIO(), stderr=stderr)
+            snapshot = self.snapshot()
+            transaction.set_rollback(True)
+        return snapshot, stderr.getvalue().splitlines()
+
+    def assert_same_with_jobs(self, *args: str) -> list[tuple]:
+        expected = self.ingest(1, *args)
+        for jobs in (2, 4):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(self.ingest(jobs, *args), expected)
+        return expected[0]
+
+
+class CacheIngestionJobsTest(JobsTestCase):
+    command = 'cache_ingestion'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            lines = cache_lines('electricity_importing_kwh', 96, first=i)
+            self.write(f'serial-{i}_mpan-{i}_start_end', ''.join(json.dumps(line) + '\n' for line in lines))
+        mixed = [*cache_lines('electricity_importing_kwh', 10), *cache_lines('electricity_exporting_kwh', 10, first=10)]
+        self.write('serial-mixed_mpan-mixed_start_end', ''.join(json.dumps(line) + '\n' for line in mixed))
+        self.write('serial-broken_mpan-broken_start_end', '{"consumption": \n')
+
+    def snapshot(self) -> list[tuple]:
+        return sorted(
+            models.Consumption.objects.values_list(
+                'meter__serial',
+                'meter__mpan__mpan',
+                'interval_start',
+                'interval_end',
+                'consumption',
+            ),
+        )
+
+    def test_same_readings(self):
+        readings = self.assert_same_with_jobs('--create-missing-meter')
+        self.assertEqual(len(readings), 5 * 96)
+        # the mixed units are found in the second chunk
+        self.assertEqual(self.assert_same_with_jobs('--create-missing-meter', '--chunk-size', '15'), readings)
+
+    def test_same_errors(self):
+        _, errors = self.ingest(3)
+        self.assertEqual(sum(line.startswith('Failed to load') for line in errors), len(self.paths))
+        self.assert_same_with_jobs()
+
+    def test_empty_and_missing_files(self):
+        self.write('serial-empty_mpan-empty_start_end', '')
+        self.paths.append(os.path.join(self.directory, 'serial-missing_mpan-missing_start_end'))
+        # the same file twice in a row is loaded twice
+        self.paths.append(self.paths[0])
+        self.assert_same_with_jobs('--create-missing-meter')
+
+    def test_chunks(self):
+        path = self.paths[0]
+        chunks = list(FileChunk.split(0, path, 40))
+        self.assertEqual([(chunk.offset > 0, chunk.lines) for chunk in chunks], [(False, 40), (True, 40), (True, 16)])
+        self.assertEqual(
+            [entry for chunk in chunks for entry in parse_chunk(chunk)],
+            list(itertools.chain.from_iterable(Command._load_data(path, 40))),
+        )
+
+
+class ConfigIngestionJobsTest(JobsTestCase):
+    command = 'config_ingestion'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            tariffs = config_tariffs(f'import-{i}', 'electricity_importing_kwh') | config_tariffs(
+                f'export-{i}',
+                'electricity_exporting_kwh',
+            )
+            self.write(f'config-{i}.json', json.dumps({'tariffs': tariffs}))
+        # a tariff already loaded from a previous file is skipped
+        self.write('config-again.json', json.dumps({'tariffs': config_tariffs('import-0', 'gas_importing_m3')}))
+        self.write('config-broken.json', '{"tariffs": ')
+
+    def snapshot(self) -> list[tuple]:
+        return sorted(
+            (
+                tariff.name,
+                tariff.energy_type,
+                tariff.direction,
+                tariff.valid_from,
+                tariff.default_rate,
+                tuple(
+                    tariff.rate_set.order_by('interval_from').values_list('interval_from', 'interval_end', 'unit_rate'),
+                ),
+            )
+            for tariff in models.Tariff.objects.all()
+        )
+
+    def test_same_tariffs(self):
+        tariffs = self.assert_same_with_jobs()
+        self.assertEqual(len(tariffs), 8)
+        self.assertNotIn(models.EnergyType.GAS, {tariff[1] for tariff in tariffs})
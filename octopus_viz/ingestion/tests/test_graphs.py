@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django import urls
+from django.core.cache import caches
+from django.test import override_settings
+from django.utils import translation
+
+from ingestion import models
+from ingestion.tests.test_ingestion import DATASET, END, IngestionTestCase
+
+
+# March 2024 (the 30th and 31st) then the first days of April
+MONTH = '2024-03'
+
+
+@override_settings(ROOT_URLCONF='ingestion.tests.urls', OCTOPUS_GRAPH_CACHE='default')
+class GraphCacheTest(IngestionTestCase):
+    """The graph data is cached per data version of the month, the browser revalidates it"""
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.ingest(DATASET.start, DATASET.start + timedelta(days=2))
+
+    def ingest(self, period_from, period_to):
+        # the graph cache is invalidated once the readings are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            models.IngestConsumption(None).ingest(period_from, period_to)
+
+    def get(self, view: str = 'monthly_graph_data', month: str = MONTH, **headers):
+        return self.client.get(urls.reverse(view), {'month': month, 'show_price': 'on'}, headers=headers)
+
+    def etag(self, view: str = 'monthly_graph_data', month: str = MONTH, **params) -> str:
+        response = self.client.get(urls.reverse(view), {'month': month, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.headers['ETag']
+
+    def test_revalidation(self):
+        for view in ('monthly_graph_data', 'tariff_graph_data'):
+            with self.subTest(view=view):
+                response = self.get(view)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response.headers['Cache-Control'])
+                etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+                not_modified = self.get(view, if_none_match=etag)
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified.headers['ETag'], etag)
+                self.assertEqual(self.get(view, if_modified_since=last_modified).status_code, 304)
+                self.assertEqual(self.get(view, if_none_match='"stale"').status_code, 200)
+
+    def test_cached(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_ingestion(self):
+        before = self.get()
+        # the readings of March are downloaded again with other values
+        self.scale_consumption(2)
+        self.ingest(DATASET.start, END)
+
+        response = self.get(if_none_match=before.headers['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], before.headers['ETag'])
+        self.assertNotEqual(response.content, before.content)
+
+    def test_reprice(self):
+        before = self.get()
+        rate = models.Rate.objects.filter(consumption__isnull=False).first()
+        rate.unit_rate *= 2
+        with self.captureOnCommitCallbacks(execute=True):
+            rate.save()
+
+        response = self.get(if_none_match=before.headers['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.content, before.content)
+
+    def test_delete(self):
+        self.ingest(DATASET.start, END)
+        march, april = self.etag(month=MONTH), self.etag(month='2024-04')
+        # the latest readings, in April
+        latest = models.Consumption.objects.order_by('-interval_start').values_list('interval_start', flat=True)[10]
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Consumption.objects.filter(interval_start__gte=latest).delete()
+
+        self.assertNotEqual(self.etag(month='2024-04'), april)
+        # the other months keep their version
+        self.assertEqual(self.etag(month=MONTH), march)
+
+    def test_variants(self):
+        etags = {
+            self.etag(),
+            self.etag(show_price='on'),
+            self.etag(show_net='on'),
+            self.etag('tariff_graph_data'),
+        }
+        with translation.override('fr'):
+            etags.add(self.etag())
+        self.assertEqual(len(etags), 5)
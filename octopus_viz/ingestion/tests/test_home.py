@@ -0,0 +1,126 @@
+import io
+import json
+import os.path
+import tempfile
+from datetime import date, timedelta
+
+from django import urls
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.health_cache import HealthCache
+from ingestion.management.tariff_management import NewFluxTariff, add_new_flux_tariff
+from ingestion.tests.test_file_ingestion import cache_lines, config_tariffs
+from ingestion.views.home import HealthSnapshot, HomeView
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=2, meters=2)
+MORE = SyntheticDataset(start=DATASET.end, days=2, meters=2, name='more')
+
+
+# no card of outdated meters: it links to the ingestion view
+@override_settings(ROOT_URLCONF='ingestion.tests.urls', OFFER_DATA_DOWNLOAD_AFTER_DAYS=36500)
+class HomeDashboardTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        # the readings after the first day are detached
+        models.Tariff.objects.update(valid_until=DATASET.start + timedelta(days=1))
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        HealthSnapshot.invalidate()
+        self.addCleanup(HealthSnapshot.invalidate)
+
+    @classmethod
+    def render(cls) -> int:
+        request = RequestFactory().get(urls.reverse('home'))
+        request.user = User(username='admin', is_active=True, is_staff=True, is_superuser=True)
+        with CaptureQueriesContext(connection) as queries:
+            HomeView.as_view()(request).render()
+        return len(queries)
+
+    def test_snapshot(self):
+        models.MPAN.objects.create(mpan='without meter', direction=models.Direction.IMPORTING)
+        snapshot = HealthSnapshot.gather()
+
+        last = models.Consumption.objects.values('meter').annotate(last=Max('interval_start'))
+        self.assertEqual(
+            sorted(snapshot.last_entries),
+            sorted((str(models.Meter.objects.get(pk=row['meter'])), row['last']) for row in last),
+        )
+        self.assertEqual(snapshot.detached_rows, models.Consumption.objects.filter(tariff__isnull=True).count())
+        self.assertTrue(snapshot.detached_rows)
+        self.assertEqual(snapshot.mpan_without_api_key, models.MpanFilters.mpan_without_api_key().count())
+        self.assertEqual(snapshot.mpan_without_meter, models.MpanFilters.mpan_without_meter().count())
+        self.assertEqual(snapshot.mpan_without_meter, 1)
+
+    def test_tariffs(self):
+        # the current tariff of a direction has ended, the last one starts later
+        MORE.build()
+        for when in (DATASET.start, MORE.start, MORE.end):
+            with self.subTest(when=when):
+                found = models.TariffFilters.current_and_last_tariffs(models.EnergyType.ELECTRICITY, when=when)
+                self.assertEqual(
+                    found,
+                    {
+                        direction: (
+                            models.TariffFilters.current_tariff(direction, models.EnergyType.ELECTRICITY, when=when),
+                            models.TariffFilters.last_tariff(direction, models.EnergyType.ELECTRICITY),
+                        )
+                        for direction in models.Direction
+                    },
+                )
+
+    def test_queries(self):
+        before = self.render()
+        MORE.build()
+        HealthSnapshot.invalidate()
+
+        self.assertEqual(self.render(), before)
+        # cached
+        self.assertEqual(self.render(), 0)
+
+    def test_invalidated_by_the_changes(self):
+        """The snapshot is dropped once the changes of the readings, tariffs or counters commit"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_file = os.path.join(directory.name, 'serial-cached_mpan-cached_start_end')
+        with open(cache_file, 'w') as fout:
+            fout.writelines(json.dumps(line) + '\n' for line in cache_lines('electricity_importing_kwh', 96))
+        config_file = os.path.join(directory.name, 'config.json')
+        with open(config_file, 'w') as fout:
+            json.dump({'tariffs': config_tariffs('configured', 'electricity_importing_kwh')}, fout)
+        flux = NewFluxTariff(
+            start_date=MORE.start,
+            end_date=None,
+            direction=models.Direction.IMPORTING,
+            low_rate=0.07,
+            base_rate=0.19,
+            peak_rate=0.32,
+        )
+
+        for label, change in (
+            (
+                'ingestion',
+                lambda: call_command('cache_ingestion', cache_file, '--create-missing-meter', stdout=io.StringIO()),
+            ),
+            ('deletion', lambda: models.Consumption.objects.filter(meter__serial='serial-cached').delete()),
+            ('rates', lambda: models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)),
+            ('prices', lambda: models.Rate.objects.update(unit_rate=0.5)),
+            ('flux tariff', lambda: add_new_flux_tariff(flux)),
+            ('config', lambda: call_command('config_ingestion', config_file, stdout=io.StringIO())),
+            (
+                'counters',
+                lambda: models.MeterCounters.objects.update(readings=0) and models.ReadingCounters.reconcile(),
+            ),
+        ):
+            with self.subTest(label):
+                HealthSnapshot.get()
+                self.assertIsNotNone(HealthCache.cache().get(HealthCache.CACHE_KEY))
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertIsNone(HealthCache.cache().get(HealthCache.CACHE_KEY))
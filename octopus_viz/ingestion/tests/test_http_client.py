@@ -0,0 +1,120 @@
+import asyncio
+import email.utils
+import unittest
+from datetime import UTC, datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from ingestion.benchmark.fake_api import FakeOctopusAPI
+from ingestion.octopus_client.async_api import AsyncOctopusHttpClient, aiohttp
+from ingestion.octopus_client.client import HttpMetrics, OctopusHttpClient, RetryPolicy
+
+
+ENDPOINT = '/electricity-meter-points/mpan/meters/serial/consumption/'
+# no jitter without Retry-After: only the waits asked by the server are counted
+POLICY = RetryPolicy(retries=3, backoff_seconds=0, max_backoff_seconds=0.05)
+
+
+def http_date(delta: timedelta) -> str:
+    return email.utils.format_datetime(datetime.now(UTC) + delta, usegmt=True)
+
+
+class RetryPolicyTest(SimpleTestCase):
+    def test_retry_after_seconds(self):
+        self.assertEqual(RetryPolicy.retry_after('3'), 3.0)
+        self.assertEqual(RetryPolicy.retry_after('-1'), 0.0)
+        self.assertIsNone(RetryPolicy.retry_after(None))
+        self.assertIsNone(RetryPolicy.retry_after('soon'))
+
+    def test_retry_after_http_date(self):
+        self.assertAlmostEqual(RetryPolicy.retry_after(http_date(timedelta(seconds=30))), 30, delta=2)
+        self.assertEqual(RetryPolicy.retry_after(http_date(-timedelta(seconds=30))), 0.0)
+
+    def test_delay_is_capped(self):
+        policy = RetryPolicy(backoff_seconds=0.5, max_backoff_seconds=60)
+        self.assertEqual(policy.delay(1, '120'), 60)
+        self.assertEqual(policy.delay(1, http_date(timedelta(hours=1))), 60)
+        for attempt in range(1, 20):
+            self.assertLessEqual(policy.delay(attempt), min(0.5 * 2 ** (attempt - 1), 60))
+
+
+class HttpClientTests:
+    """The client against the fake API injecting a 429 then a 503 every fail_every requests, mixed
+    in the test cases of each client
+    """
+
+    def get(self, server: FakeOctopusAPI, gets: int) -> tuple[list[int], HttpMetrics]:
+        """Status of each GET and the metrics of the client"""
+        raise NotImplementedError()
+
+    def assert_retries(self, server: FakeOctopusAPI, gets: int, metrics: HttpMetrics):
+        with server:
+            statuses, found = self.get(server, gets)
+        self.assertEqual(statuses, [200] * gets)
+        self.assertEqual(found.requests, server.requests)
+        self.assertEqual((found.requests, found.retries, found.failures), (metrics.requests, metrics.retries, 0))
+        self.assertAlmostEqual(found.waited_seconds, metrics.waited_seconds)
+
+    def test_retries(self):
+        # the 2nd and 4th requests fail, a 429 asking for 0.01s then a 503
+        self.assert_retries(
+            FakeOctopusAPI({}, fail_every=2, retry_after='0.01'),
+            3,
+            HttpMetrics(requests=5, retries=2, waited_seconds=0.01),
+        )
+
+    def test_retry_after_is_capped(self):
+        self.assert_retries(
+            FakeOctopusAPI({}, fail_every=2, retry_after='120'),
+            2,
+            HttpMetrics(requests=3, retries=1, waited_seconds=POLICY.max_backoff_seconds),
+        )
+
+    def test_retry_after_http_date(self):
+        self.assert_retries(
+            FakeOctopusAPI({}, fail_every=2, retry_after=http_date(timedelta(hours=1))),
+            2,
+            HttpMetrics(requests=3, retries=1, waited_seconds=POLICY.max_backoff_seconds),
+        )
+
+    def test_gives_up(self):
+        with FakeOctopusAPI({}, fail_every=1) as server:
+            statuses, metrics = self.get(server, 1)
+        self.assertIn(statuses, ([429], [503]))
+        self.assertEqual(server.requests, POLICY.retries + 1)
+        self.assertEqual(
+            (metrics.requests, metrics.retries, metrics.failures),
+            (POLICY.retries + 1, POLICY.retries, 1),
+        )
+
+
+class OctopusHttpClientTest(HttpClientTests, SimpleTestCase):
+    def get(self, server: FakeOctopusAPI, gets: int) -> tuple[list[int], HttpMetrics]:
+        client = OctopusHttpClient('sk_test', policy=POLICY)
+        try:
+            statuses = [client.get(server.url + ENDPOINT).status_code for _ in range(gets)]
+        finally:
+            client.session.close()
+        return statuses, client.snapshot()
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncOctopusHttpClientTest(HttpClientTests, SimpleTestCase):
+    def get(self, server: FakeOctopusAPI, gets: int) -> tuple[list[int], HttpMetrics]:
+        client = AsyncOctopusHttpClient('sk_test', max_requests=1, policy=POLICY)
+
+        async def get_all() -> list[int]:
+            statuses = []
+            try:
+                for _ in range(gets):
+                    try:
+                        await client.get_json(server.url + ENDPOINT)
+                    except aiohttp.ClientResponseError as ex:
+                        statuses.append(ex.status)
+                    else:
+                        statuses.append(200)
+            finally:
+                await client.close()
+            return statuses
+
+        return asyncio.run(get_all()), client.metrics
@@ -0,0 +1,194 @@
+import math
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.benchmark.fake_api import FakeOctopusAPI
+from ingestion.octopus_client.api import OctopusAPI
+from ingestion.octopus_client.client import OctopusHttpClient
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=4, meters=2)
+# the periods are local days: the last readings of the dataset are on the next one in BST
+END = DATASET.end + timedelta(days=1)
+
+
+def readings() -> list[tuple]:
+    return sorted(
+        models.Consumption.objects.values_list(
+            'meter__serial',
+            'interval_start',
+            'interval_end',
+            'consumption',
+            'tariff_id',
+            'rate_id',
+            'unit_rate',
+            'cost',
+        ),
+    )
+
+
+class IngestionTestCase(TestCase):
+    """The readings of the dataset ingested from the fake API, the meters start without readings"""
+
+    page_size = 100
+
+    def setUp(self):
+        DATASET.build_tariffs()
+        meters = DATASET.build_meters()
+        self.results = {
+            (meter.mpan.mpan, meter.serial): [
+                {
+                    'consumption': consumption,
+                    'interval_start': interval_start.isoformat(),
+                    'interval_end': interval_end.isoformat(),
+                }
+                for interval_start, interval_end, consumption in DATASET.readings()
+            ]
+            for meter in meters
+        }
+        self.server = FakeOctopusAPI(self.results, page_size=self.page_size)
+        self.enterContext(self.server)
+        settings = override_settings(OCTOPUS_API_URL=self.server.url, OCTOPUS_HTTP_RETRIES=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        OctopusHttpClient.close_all()
+        self.addCleanup(OctopusHttpClient.close_all)
+
+    def scale_consumption(self, factor: float):
+        """The API now gives the consumption of every reading times factor"""
+        for results in self.results.values():
+            for result in results:
+                result['consumption'] *= factor
+
+
+class UpsertTest(IngestionTestCase):
+    def ingest(self, period_from: date, period_to: date, **kwargs) -> models.IngestConsumption:
+        ingestion = models.IngestConsumption(None, **kwargs)
+        ingestion.ingest(period_from, period_to)
+        return ingestion
+
+    def test_overlapping_download(self):
+        first = self.ingest(DATASET.start, DATASET.start + timedelta(days=2), batch_size=50)
+        existing = models.Consumption.objects.count()
+        self.assertEqual((first.inserted_rows, first.updated_rows), (existing, 0))
+
+        self.scale_consumption(2)
+        again = self.ingest(DATASET.start, END, batch_size=50)
+        total = models.Consumption.objects.count()
+        self.assertEqual(total, 2 * len(DATASET.readings()))
+        self.assertEqual((again.inserted_rows, again.updated_rows), (total - existing, existing))
+
+    def test_updated_rows_are_priced_again(self):
+        self.ingest(DATASET.start, END, batch_size=50)
+        self.scale_consumption(2)
+        self.ingest(DATASET.start, END, batch_size=50)
+
+        expected = {result['interval_start']: result['consumption'] for result in next(iter(self.results.values()))}
+        for row in models.Consumption.objects.all():
+            self.assertEqual(row.consumption, expected[row.interval_start.isoformat()])
+            self.assertIsNotNone(row.unit_rate)
+            self.assertAlmostEqual(row.cost, row.consumption * row.unit_rate)
+
+    def test_batch_size(self):
+        """The bulk upserts give the rows of the row by row ingestion, new and updated"""
+
+        def ingested(**kwargs) -> list[tuple]:
+            with transaction.atomic():
+                self.ingest(DATASET.start, DATASET.start + timedelta(days=2), **kwargs)
+                self.scale_consumption(2)
+                self.ingest(DATASET.start, END, **kwargs)
+                rows = readings()
+                transaction.set_rollback(True)
+            # the results of the API as they were
+            self.scale_consumption(0.5)
+            return rows
+
+        expected = ingested()
+        self.assertEqual(len(expected), 2 * len(DATASET.readings()))
+        for batch_size in (1, 50, 5000):
+            with self.subTest(batch_size=batch_size):
+                self.assertEqual(ingested(batch_size=batch_size), expected)
+
+
+class ResolverTest(IngestionTestCase):
+    def test_tariffs_loaded_once(self):
+        """The rates of every meter are resolved from the tariffs loaded once for the ingestion"""
+        rates = models.Rate.objects.order_by('interval_from', 'interval_end', 'id')
+        for kwargs in ({}, {'batch_size': 50}):
+            with self.subTest(**kwargs), CaptureQueriesContext(connection) as queries:
+                models.IngestConsumption(None, **kwargs).ingest(DATASET.start, END)
+            self.assertEqual(sum(query['sql'] == str(rates.query) for query in queries), 1)
+
+
+class CheckpointTest(IngestionTestCase):
+    page_size = 20
+    checkpoint_pages = 3
+
+    def ingest(self, **kwargs) -> models.IngestConsumption:
+        ingestion = models.IngestConsumption(
+            None,
+            batch_size=50,
+            checkpoint_pages=self.checkpoint_pages,
+            **kwargs,
+        )
+        ingestion.ingest(DATASET.start, END)
+        return ingestion
+
+    def test_resume(self):
+        meter = models.Meter.objects.order_by('id').first()
+        # the 5th page of the first meter fails, after the first checkpoint
+        self.server.fail_every = 5
+        with self.assertRaises(requests.HTTPError):
+            self.ingest()
+
+        written = self.checkpoint_pages * self.page_size
+        self.assertEqual(models.Consumption.objects.count(), written)
+        checkpoint = models.IngestionCheckpoint.objects.get(meter=meter)
+        self.assertEqual((checkpoint.pages, checkpoint.rows), (self.checkpoint_pages, written))
+        self.assertIn('page=4', checkpoint.next_url)
+        self.assertEqual(
+            checkpoint.last_interval_end,
+            models.Consumption.objects.aggregate(last=Max('interval_end'))['last'],
+        )
+
+        self.server.fail_every = 0
+        requests_before = self.server.requests
+        resumed = self.ingest(resume=True)
+        # from the 4th page of the first meter, none of the rows written is written again
+        pages = math.ceil(len(DATASET.readings()) / self.page_size)
+        self.assertEqual(self.server.requests - requests_before, 2 * pages - self.checkpoint_pages)
+        self.assertEqual(resumed.updated_rows, 0)
+        self.assertEqual(models.Consumption.objects.count(), 2 * len(DATASET.readings()))
+        self.assertTrue(all(checkpoint.completed for checkpoint in models.IngestionCheckpoint.objects.all()))
+
+    def test_completed_downloads_are_skipped(self):
+        self.ingest()
+        requests_before = self.server.requests
+        self.ingest(resume=True)
+        self.assertEqual(self.server.requests, requests_before)
+
+
+class FirstPageTest(IngestionTestCase):
+    def test_oldest_first(self):
+        # the API gives the latest readings first unless asked otherwise
+        api_connection = OctopusAPI(models.Meter.objects.order_by('id').first())
+        url = api_connection.first_page_url(DATASET.start, END)
+        self.assertEqual(parse_qs(urlsplit(url).query)['order_by'], ['period'])
+
+        starts = [result['interval_start'] for result in api_connection.get_consumption_data(DATASET.start, END)]
+        self.assertEqual(len(starts), len(DATASET.readings()))
+        self.assertEqual(starts, sorted(starts))
+
+    def test_next_url_is_kept(self):
+        api_connection = OctopusAPI(models.Meter.objects.order_by('id').first())
+        next_url = f'{api_connection.consumption_endpoint}?page=4'
+        self.assertEqual(api_connection.first_page_url(DATASET.start, END, next_url=next_url), next_url)
@@ -0,0 +1,161 @@
+import array
+import base64
+import gzip
+import json
+import math
+import sys
+import unittest
+from datetime import date
+
+from django import urls
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.views.payload import Column, GraphPayload, brotli
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 25), days=7, meters=2)
+
+
+def decode(typed: dict) -> list[float]:
+    """The values of a base64 typed array"""
+    values = array.array(Column.TYPECODES[typed['dtype']], base64.b64decode(typed['bdata']))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tolist()
+
+
+class ColumnTest(SimpleTestCase):
+    def test_typed_array(self):
+        column = Column([0.1, None, 1234.56789, -2.5])
+        self.assertEqual(column, [0.1, None, 1234.5679, -2.5])
+        decoded = decode(column.typed_array())
+        self.assertEqual(len(decoded), len(column))
+        self.assertTrue(math.isnan(decoded[1]))
+        for value, expected in zip(decoded[:1] + decoded[2:], column[:1] + column[2:]):
+            self.assertAlmostEqual(value, expected, delta=abs(expected) * 1e-6)
+
+        times = [1711324800.0, 1711326600.5]
+        self.assertEqual(decode(Column(times, dtype='f8', digits=None).typed_array()), times)
+        self.assertEqual(decode(Column([28522080, -1], dtype='i4', digits=None).typed_array()), [28522080, -1])
+
+    def test_typed(self):
+        data = {'graph': [{'x': Column([1, 2], dtype='i4'), 'name': 'import'}], 'header': {}}
+        self.assertEqual(
+            GraphPayload.typed(data),
+            {'graph': [{'x': Column([1, 2], dtype='i4').typed_array(), 'name': 'import'}], 'header': {}},
+        )
+
+
+class EncodingTest(SimpleTestCase):
+    def encoding(self, accept_encoding: str) -> str | None:
+        return GraphPayload.encoding(RequestFactory().get('/', headers={'Accept-Encoding': accept_encoding}))
+
+    def test_negotiation(self):
+        best = GraphPayload.ENCODINGS[0]
+        self.assertEqual(self.encoding('gzip'), 'gzip')
+        self.assertEqual(self.encoding('gzip, deflate, br'), best)
+        self.assertEqual(self.encoding('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(self.encoding('*'), best)
+        self.assertEqual(self.encoding('*, gzip;q=0'), 'br' if brotli is not None else None)
+        self.assertIsNone(self.encoding('gzip;q=0'))
+        self.assertIsNone(self.encoding('identity'))
+        self.assertIsNone(self.encoding(''))
+
+    @unittest.skipIf(brotli is not None, 'brotli is installed')
+    def test_without_brotli(self):
+        self.assertEqual(self.encoding('br'), None)
+        self.assertEqual(self.encoding('br, gzip'), 'gzip')
+
+
+@override_settings(ROOT_URLCONF='ingestion.tests.urls', OCTOPUS_GRAPH_CACHE='default')
+class PayloadViewTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        models.RollupConsumption().rebuild()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, view: str = 'monthly_graph_data', params: dict | None = None, **headers):
+        params = params or {'month': '2024-03'}
+        return self.client.get(urls.reverse(view), params, headers=headers)
+
+    def assert_vary(self, response):
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_gzip(self):
+        plain = self.get()
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assert_vary(plain)
+
+        compressed = self.get(accept_encoding='gzip')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(compressed.headers['Content-Length']), len(compressed.content))
+        self.assertLess(len(compressed.content), len(plain.content))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assert_vary(compressed)
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        plain = self.get()
+        compressed = self.get(accept_encoding='gzip, br')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(compressed.content), plain.content)
+
+    def test_weak_etag(self):
+        etag = self.get().headers['ETag']
+        self.assertTrue(etag.startswith('"'))
+        compressed = self.get(accept_encoding='gzip')
+        self.assertEqual(compressed.headers['ETag'], f'W/{etag}')
+
+        # the compressed content is revalidated with its weak ETag
+        for if_none_match in (compressed.headers['ETag'], etag):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get(accept_encoding='gzip', if_none_match=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers['ETag'], compressed.headers['ETag'])
+                self.assert_vary(response)
+
+        response = self.get(if_none_match=compressed.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_small_content(self):
+        # an invalid form: the empty graph is not worth compressing
+        response = self.get(params={'month': 'never'}, accept_encoding='gzip')
+        self.assertLess(len(response.content), GraphPayload.MIN_COMPRESS_SIZE)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assert_vary(response)
+
+    def test_binary(self):
+        for view, params in (
+            ('monthly_graph_data', {'month': '2024-03', 'show_price': 'on'}),
+            ('timeseries_graph_data', {'start': '2024-03-25', 'end': '2024-03-29', 'points': 50}),
+        ):
+            with self.subTest(view=view):
+                lists = json.loads(self.get(view, params).content)
+                typed = json.loads(self.get(view, {**params, 'binary': '1'}).content)
+                self.assertEqual(typed['header'], lists['header'])
+                self.assertEqual(len(typed['graph']), len(lists['graph']))
+                self.assertTrue(lists['graph'][0]['y'])
+                for typed_trace, trace in zip(typed['graph'], lists['graph']):
+                    self.assert_same_trace(typed_trace, trace)
+
+    def assert_same_trace(self, typed: dict, lists: dict):
+        for key, values in lists.items():
+            if isinstance(values, dict):
+                self.assert_same_trace(typed[key], values)
+            elif isinstance(typed[key], dict) and 'bdata' in typed[key]:
+                decoded = decode(typed[key])
+                self.assertEqual(len(decoded), len(values))
+                for value, expected in zip(decoded, values):
+                    if expected is None:
+                        self.assertTrue(math.isnan(value))
+                    else:
+                        # 'f4' keeps 7 significant digits
+                        self.assertAlmostEqual(value, expected, delta=max(abs(expected), 1) * 1e-6)
+            else:
+                self.assertEqual(typed[key], values)
@@ -0,0 +1,163 @@
+import threading
+import unittest
+from datetime import UTC, date, datetime, timedelta
+
+import requests
+from django.test import SimpleTestCase
+
+from ingestion.octopus_client.api import ConsumptionPage
+from ingestion.octopus_client.async_api import aiohttp
+from ingestion.octopus_client.prefetch import AsyncConcurrentDownload, ConcurrentDownload
+
+
+RESULTS = [{'interval_start': f'2024-01-01T{hour:02d}:00:00+00:00'} for hour in range(24)]
+
+
+class FailingConnection:
+    """The part of `OctopusAPI` used by the downloads: its results, then error if given"""
+
+    def __init__(self, results: list[dict], error: Exception | None = None):
+        self.meter = 'meter'
+        self.results = results
+        self.error = error
+
+    def get_consumption_data(self, period_from: date | None, period_to: date | None):
+        yield from self.results
+        if self.error is not None:
+            raise self.error
+
+
+class MeterDownloadTest(SimpleTestCase):
+    def download(self, connection: FailingConnection) -> list[dict]:
+        with ConcurrentDownload(workers=2, max_requests_per_key=1) as downloader:
+            return list(downloader.start(connection, None, None).results())
+
+    def test_results(self):
+        self.assertEqual(self.download(FailingConnection(RESULTS)), RESULTS)
+
+    def test_download_error_is_raised_by_the_writer(self):
+        with self.assertRaises(requests.ConnectionError):
+            self.download(FailingConnection(RESULTS, requests.ConnectionError('reset')))
+
+    def test_unexpected_error_is_raised_from_the_worker(self):
+        with self.assertRaises(KeyError):
+            self.download(FailingConnection(RESULTS, KeyError('results')))
+
+
+class FailingAsyncConnection(FailingConnection):
+    """The part of `AsyncOctopusAPI` used by the downloads, its results in one page"""
+
+    async def get_consumption_pages(self, period_from: date | None, period_to: date | None):
+        yield ConsumptionPage(results=self.results, next_url=None)
+        if self.error is not None:
+            raise self.error
+
+
+class AsyncMeterDownloadTest(SimpleTestCase):
+    def download(self, connection: FailingAsyncConnection) -> list[dict]:
+        with AsyncConcurrentDownload(max_requests_per_key=1) as downloader:
+            return list(downloader.start(connection, None, None).results())
+
+    def test_results(self):
+        self.assertEqual(self.download(FailingAsyncConnection(RESULTS)), RESULTS)
+
+    def test_timeout_is_raised_by_the_writer(self):
+        with self.assertRaises(TimeoutError):
+            self.download(FailingAsyncConnection(RESULTS, TimeoutError()))
+
+    @unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+    def test_download_error_is_raised_by_the_writer(self):
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self.download(FailingAsyncConnection(RESULTS, aiohttp.ClientConnectionError('reset')))
+
+    def test_unexpected_error_is_raised_from_the_task(self):
+        with self.assertRaises(KeyError):
+            self.download(FailingAsyncConnection(RESULTS, KeyError('results')))
+
+
+def readings(days: int) -> list[dict]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        {'interval_start': (start + timedelta(minutes=30 * i)).isoformat(), 'consumption': i} for i in range(days * 48)
+    ]
+
+
+class PeriodConnection:
+    """The part of `OctopusAPI` used by the downloads, serving the readings of a period in order.
+
+    With inclusive_end the reading starting at period_to is also served, like a window overlapping
+    the next one.
+    """
+
+    def __init__(self, results: list[dict], *, inclusive_end: bool = False):
+        self.meter = 'meter'
+        self.results = results
+        self.inclusive_end = inclusive_end
+
+    def _moment(self, day: date) -> datetime:
+        return datetime.combine(day, datetime.min.time(), tzinfo=UTC)
+
+    def get_consumption_data(self, period_from: date | None, period_to: date | None):
+        for result in self.results:
+            interval_start = datetime.fromisoformat(result['interval_start'])
+            if period_from is not None and interval_start < self._moment(period_from):
+                continue
+            if period_to is not None and (
+                interval_start > self._moment(period_to)
+                or (interval_start == self._moment(period_to) and not self.inclusive_end)
+            ):
+                continue
+            yield dict(result)
+
+
+class ShardedDownloadTest(SimpleTestCase):
+    period_from = date(2024, 1, 1)
+    period_to = date(2024, 1, 8)
+
+    def download(self, connection: PeriodConnection, shard_days: int | None) -> list[dict]:
+        with ConcurrentDownload(workers=3, max_requests_per_key=3, max_chunks=2) as downloader:
+            download = downloader.start(connection, self.period_from, self.period_to, shard_days=shard_days)
+            return list(download.results())
+
+    def test_sharded_download_is_the_download(self):
+        connection = PeriodConnection(readings(7))
+        expected = self.download(connection, None)
+        self.assertEqual(len(expected), 7 * 48)
+        for shard_days in (1, 2, 3, 7, 10):
+            with self.subTest(shard_days=shard_days):
+                self.assertEqual(self.download(connection, shard_days), expected)
+
+    def test_reading_of_two_windows_is_yielded_once(self):
+        expected = self.download(PeriodConnection(readings(7)), None)
+        self.assertEqual(self.download(PeriodConnection(readings(8), inclusive_end=True), 2)[:-1], expected)
+
+    def test_more_shards_than_workers(self):
+        # windows of about 1000 readings, more than the queue of a shard holds
+        connection = PeriodConnection(readings(84))
+        period_to = self.period_from + timedelta(days=84)
+        downloaded = []
+        downloader = ConcurrentDownload(workers=1, max_requests_per_key=1, max_chunks=1)
+
+        def download():
+            with downloader:
+                downloaded.extend(downloader.start(connection, self.period_from, period_to, shard_days=21).results())
+
+        writer = threading.Thread(target=download, daemon=True)
+        writer.start()
+        writer.join(timeout=10)
+        stuck = writer.is_alive()
+        # unblock the workers so that a stuck download does not hang the tests
+        downloader.cancelled.set()
+        self.assertFalse(stuck, 'The sharded download is stuck')
+        self.assertEqual(downloaded, connection.results)
+
+    def test_reading_out_of_order_is_kept(self):
+        results = readings(7)
+        # a reading of the second day found at the end of its window
+        results.append(results.pop(60))
+        sharded = self.download(PeriodConnection(results), 3)
+        self.assertEqual(len(sharded), 7 * 48)
+        self.assertEqual(
+            sorted(result['consumption'] for result in sharded),
+            [result['consumption'] for result in readings(7)],
+        )
@@ -0,0 +1,76 @@
+from datetime import date, time
+
+from django.db.models import F, Sum
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.octopus_client.api import OctopusAPI
+
+
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=2, meters=2)
+
+
+class PricingTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.meter = models.Meter.objects.order_by('id').first()
+
+    def assert_priced(self):
+        """unit_rate and cost of the readings and the rollup as if the rates were attached again"""
+        for row in models.Consumption.objects.select_related('rate', 'tariff'):
+            if row.rate is not None:
+                expected = row.rate.unit_rate
+            elif row.tariff is not None and row.tariff.default_rate:
+                expected = row.tariff.default_rate
+            else:
+                expected = None
+            self.assertEqual(row.unit_rate, expected)
+            if expected is None:
+                self.assertIsNone(row.cost)
+            else:
+                self.assertAlmostEqual(row.cost, row.consumption * expected)
+
+        readings_cost = models.Consumption.objects.aggregate(cost=Sum('cost'))['cost']
+        rollup_cost = models.ConsumptionRollup.objects.aggregate(cost=Sum('cost'))['cost']
+        self.assertAlmostEqual(rollup_cost, readings_cost)
+
+    def test_upsert(self):
+        rows = [
+            models.Consumption(
+                consumption=row.consumption * 2,
+                interval_start=row.interval_start,
+                interval_end=row.interval_end,
+                meter=self.meter,
+            )
+            for row in models.Consumption.objects.filter(meter=self.meter)[:10]
+        ]
+
+        self.assertEqual(OctopusAPI.upsert_meter_consumption(self.meter, rows), (0, 10))
+        # only the readings are priced again, the rollup is refreshed by the caller
+        for row in models.Consumption.objects.filter(meter=self.meter, unit_rate__isnull=False):
+            self.assertAlmostEqual(row.cost, row.consumption * row.unit_rate)
+
+    def test_update_rates(self):
+        models.Rate.objects.filter(interval_from=time(16)).update(unit_rate=0.5)
+        self.assertTrue(models.Consumption.objects.filter(unit_rate=0.5).exists())
+        self.assert_priced()
+
+    def test_bulk_update_rates(self):
+        rates = list(models.Rate.objects.all())
+        for rate in rates:
+            rate.unit_rate *= 2
+        models.Rate.objects.bulk_update(rates, ['unit_rate'])
+        self.assert_priced()
+
+    def test_update_default_rates(self):
+        # the readings of the peak rate fall back on the default rate
+        models.Rate.objects.filter(interval_from=time(16)).delete()
+        models.Tariff.objects.update(default_rate=0.4)
+        self.assertTrue(models.Consumption.objects.filter(rate__isnull=True, unit_rate=0.4).exists())
+        self.assert_priced()
+
+    def test_update_other_fields(self):
+        with self.assertNumQueries(1):
+            models.Rate.objects.update(interval_end=F('interval_end'))
@@ -0,0 +1,39 @@
+import unittest
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ingestion.benchmark.query_plans import QueryPlan, explain_hot_queries
+
+
+class FullScanTest(SimpleTestCase):
+    def full_scans(self, detail: str) -> list[str]:
+        return QueryPlan('query', [detail]).full_scans
+
+    def test_scan(self):
+        self.assertEqual(self.full_scans('SCAN ingestion_consumption'), ['ingestion_consumption'])
+        self.assertEqual(self.full_scans('SCAN ingestion_consumption AS U0'), ['ingestion_consumption'])
+
+    def test_scan_in_index_order(self):
+        for detail in (
+            'SCAN ingestion_consumption USING INDEX consumption_meter_end',
+            'SCAN ingestion_consumption USING COVERING INDEX unique_consumption_interval',
+            'SCAN ingestion_consumptionrollup USING INDEX rollup_meter_day',
+        ):
+            with self.subTest(detail=detail):
+                self.assertEqual(len(self.full_scans(detail)), 1)
+
+    def test_search(self):
+        detail = 'SEARCH ingestion_consumption USING INDEX consumption_meter_end (meter_id=?)'
+        self.assertEqual(self.full_scans(detail), [])
+
+    def test_small_table(self):
+        self.assertEqual(self.full_scans('SCAN ingestion_meter'), [])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'the query plans are checked on sqlite')
+class HotQueriesTest(TestCase):
+    def test_no_full_scan(self):
+        for plan in explain_hot_queries():
+            with self.subTest(query=plan.label):
+                self.assertEqual(plan.full_scans, [], str(plan))
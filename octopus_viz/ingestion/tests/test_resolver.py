@@ -0,0 +1,126 @@
+from datetime import UTC, date, datetime, time, timedelta
+
+from django.test import TestCase
+
+from ingestion import models
+from ingestion.benchmark.dataset import SyntheticDataset
+from ingestion.benchmark.legacy import LegacyAttachment
+from ingestion.management.tariff_management import NewFluxTariff, add_new_flux_tariff
+
+
+# the tariffs of the dataset start on its first day
+DATASET = SyntheticDataset(start=date(2024, 3, 30), days=4, meters=2)
+
+
+def flux_tariff(start_date: date, end_date: date | None, *, base_rate: float = 0.19) -> models.Tariff:
+    name = add_new_flux_tariff(
+        NewFluxTariff(
+            start_date=start_date,
+            end_date=end_date,
+            direction=models.Direction.IMPORTING,
+            low_rate=0.07,
+            base_rate=base_rate,
+            peak_rate=0.32,
+        ),
+    )
+    return models.Tariff.objects.get(name=name)
+
+
+class BestRateTest(TestCase):
+    def setUp(self):
+        self.tariff = flux_tariff(date(2024, 1, 1), None)
+        self.rates = {(rate.interval_from, rate.interval_end): rate for rate in self.tariff.rate_set.all()}
+
+    def resolve(self, hour: int, minute: int) -> models.Rate | None:
+        interval_start = datetime(2024, 3, 1, hour, minute, tzinfo=UTC)
+        return models.TariffResolver().resolve(models.Direction.IMPORTING, interval_start)[1]
+
+    def test_half_hours(self):
+        self.assertEqual(self.resolve(1, 30), self.rates[time(0), time(2)])
+        self.assertEqual(self.resolve(2, 0), self.rates[time(2), time(4)])
+        self.assertEqual(self.resolve(18, 30), self.rates[time(16), time(19)])
+        self.assertEqual(self.resolve(23, 0), self.rates[time(19), time(0)])
+
+    def test_half_hour_ending_at_midnight(self):
+        # the first rate starting before 23:30, as the readings were always rated
+        self.assertEqual(self.resolve(23, 30), self.rates[time(0), time(2)])
+
+
+def assignment() -> list[tuple]:
+    return sorted(models.Consumption.objects.values_list('id', 'tariff_id', 'rate_id', 'unit_rate', 'cost'))
+
+
+class LegacyAttachmentTest(TestCase):
+    """The resolver against the per-day queries it replaced"""
+
+    def setUp(self):
+        DATASET.build()
+        # overlapping tariffs for a day, and the day before the dataset an exporting tariff without
+        # rates and no importing tariff
+        flux_tariff(date(2024, 4, 1), date(2024, 4, 2), base_rate=0.25)
+        models.Tariff.objects.create(
+            name='no rates',
+            energy_type=models.EnergyType.ELECTRICITY,
+            metric_unit=models.MetricUnit.KWH,
+            direction=models.Direction.EXPORTING,
+            valid_from=date(2024, 3, 1),
+            valid_until=date(2024, 3, 30),
+            default_rate=0.05,
+        )
+        start = datetime(2024, 3, 29, 12, tzinfo=UTC)
+        models.Consumption.objects.bulk_create(
+            models.Consumption(
+                consumption=1.0,
+                interval_start=start + timedelta(minutes=30 * i),
+                interval_end=start + timedelta(minutes=30 * (i + 1)),
+                meter=meter,
+            )
+            for meter in models.Meter.objects.all()
+            for i in range(4)
+        )
+
+    def test_resolve(self):
+        resolver = models.TariffResolver()
+        legacy = LegacyAttachment()
+        readings = models.Consumption.objects.values_list('interval_start', 'interval_end', 'meter__mpan__direction')
+        for interval_start, interval_end, direction in readings:
+            # the half-hour, then a quarter of an hour that falls back on best_rate
+            for start, end in (
+                (interval_start, interval_end),
+                (interval_start + timedelta(minutes=15), interval_end),
+            ):
+                with self.subTest(start=start, end=end, direction=direction):
+                    self.assertEqual(resolver.resolve(direction, start, end), legacy.resolve(direction, start, end))
+
+    def test_attachment(self):
+        LegacyAttachment().attach_row_by_row(models.Consumption.objects.all())
+        expected = assignment()
+        models.Consumption.objects.update(tariff=None, rate=None, unit_rate=None, cost=None)
+
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.assertEqual(assignment(), expected)
+
+    def test_tariffs_updated_without_signal(self):
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        # e.g. by another process or a queryset update
+        models.Tariff.objects.update(valid_from=date(2030, 1, 1))
+
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.assertFalse(models.Consumption.objects.filter(tariff__isnull=False).exists())
+
+    def test_shared_by_the_run(self):
+        update = models.UpdateConsumption(None)
+        resolver = update.resolver
+        self.assertIs(update.resolver, resolver)
+
+        rate = models.Rate.objects.first()
+        for change in (
+            rate.save,
+            lambda: models.Rate.objects.filter(id=rate.id).update(unit_rate=0.5),
+            lambda: models.Tariff.objects.update(valid_until=date(2030, 1, 1)),
+            rate.delete,
+        ):
+            change()
+            self.assertIsNot(update.resolver, resolver)
+            resolver = update.resolver
+            self.assertIs(update.resolver, resolver)
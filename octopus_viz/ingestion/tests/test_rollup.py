@@ -0,0 +1,111 @@
+import collections
+from datetime import UTC, date, datetime
+
+from django.test import SimpleTestCase, TestCase
+
+from ingestion import models
+from ingestion.aggregator.timeseries import TimeSeries
+from ingestion.benchmark.dataset import SyntheticDataset
+
+
+# across the change to BST on 2024-03-31
+DATASET = SyntheticDataset(start=date(2024, 3, 25), days=14, meters=2)
+
+
+def rollup_days() -> dict[tuple[int, date], tuple[float, int]]:
+    """(consumption, readings) of the rollup per meter and day"""
+    days = collections.defaultdict(lambda: [0.0, 0])
+    for rollup in models.ConsumptionRollup.objects.all():
+        days[rollup.meter_id, rollup.day][0] += rollup.consumption
+        days[rollup.meter_id, rollup.day][1] += rollup.readings
+    return {key: (round(consumption, 6), readings) for key, (consumption, readings) in days.items()}
+
+
+def raw_days() -> dict[tuple[int, date], tuple[float, int]]:
+    """(consumption, readings) of the readings per meter and local day"""
+    days = collections.defaultdict(lambda: [0.0, 0])
+    for meter_id, interval_start, consumption in models.Consumption.objects.values_list(
+        'meter_id',
+        'interval_start',
+        'consumption',
+    ):
+        day = models.RollupConsumption.local_day(interval_start)
+        days[meter_id, day][0] += consumption
+        days[meter_id, day][1] += 1
+    return {key: (round(consumption, 6), readings) for key, (consumption, readings) in days.items()}
+
+
+def snapshot() -> tuple[list, list]:
+    rollup = models.ConsumptionRollup.objects.order_by('meter_id', 'day', 'slot', 'tariff_id', 'rate_id')
+    levels = models.ConsumptionLevel.objects.order_by('meter_id', 'resolution', 'start')
+    return (
+        [
+            (row.meter_id, row.day, row.slot, row.tariff_id, row.rate_id, round(row.consumption, 6), row.readings)
+            for row in rollup
+        ],
+        [(row.meter_id, row.resolution, row.start, round(row.consumption, 6), row.readings) for row in levels],
+    )
+
+
+class RollupTest(TestCase):
+    def setUp(self):
+        DATASET.build()
+        models.UpdateConsumption(None).gather_and_update_rows(all_rows=True)
+        self.meters = list(models.Meter.objects.order_by('id').values_list('id', flat=True))
+
+    def assert_up_to_date(self):
+        self.assertEqual(rollup_days(), raw_days())
+        refreshed = snapshot()
+        models.RollupConsumption().rebuild()
+        self.assertEqual(refreshed, snapshot())
+
+    def test_rollup_matches_the_readings(self):
+        # the readings of the last UTC day end on the next local day during BST
+        self.assertEqual(len(raw_days()), 2 * (DATASET.days + 1))
+        self.assert_up_to_date()
+
+    def test_delete_readings(self):
+        models.Consumption.objects.filter(
+            meter_id=self.meters[0],
+            interval_start__gte=datetime(2024, 3, 30, 22, tzinfo=UTC),
+            interval_start__lt=datetime(2024, 4, 1, 3, tzinfo=UTC),
+        ).delete()
+        self.assert_up_to_date()
+
+    def test_delete_every_reading_of_a_day(self):
+        models.Consumption.objects.filter(
+            meter_id=self.meters[1],
+            interval_start__gte=models.RollupConsumption.local_midnight(date(2024, 4, 2)),
+            interval_start__lt=models.RollupConsumption.local_midnight(date(2024, 4, 3)),
+        ).delete()
+        self.assertNotIn((self.meters[1], date(2024, 4, 2)), rollup_days())
+        self.assert_up_to_date()
+
+    def test_delete_a_reading(self):
+        models.Consumption.objects.filter(meter_id=self.meters[0]).latest('interval_start').delete()
+        self.assert_up_to_date()
+
+
+class PickResolutionTest(SimpleTestCase):
+    def pick(self, start: date, end: date, points: int) -> models.Resolution:
+        return TimeSeries(models.Direction.IMPORTING, start, end).pick_resolution(points)
+
+    def test_aligned_periods(self):
+        # from a Monday to a Monday, from the first of a month to the first of a month or both
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2025, 1, 6), 50), models.Resolution.WEEK)
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2025, 1, 6), 10), models.Resolution.WEEK)
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2025, 1, 1), 10), models.Resolution.MONTH)
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2024, 4, 1), 3), models.Resolution.MONTH)
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2024, 4, 1), 10), models.Resolution.WEEK)
+
+    def test_unaligned_periods(self):
+        # the buckets of the weeks and months would hold readings out of the period
+        self.assertEqual(self.pick(date(2024, 1, 1), date(2025, 1, 1), 50), models.Resolution.DAY)
+        self.assertEqual(self.pick(date(2024, 1, 2), date(2025, 1, 2), 10), models.Resolution.DAY)
+        self.assertEqual(self.pick(date(2024, 1, 2), date(2024, 1, 9), 5), models.Resolution.DAY)
+        self.assertEqual(self.pick(date(2024, 1, 2), date(2024, 1, 3), 10), models.Resolution.HOUR)
+
+    def test_half_hours(self):
+        # more points than hours, down to the readings
+        self.assertEqual(self.pick(date(2024, 1, 2), date(2024, 1, 3), 30), models.Resolution.HALF_HOUR)
+        self.assertEqual(self.pick(date(2024, 1, 2), date(2024, 1, 3), 1000), models.Resolution.HALF_HOUR)
@@ -0,0 +1,63 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ingestion.aggregator.timeseries import DOWNSAMPLERS, LttbDownsampler, MinMaxDownsampler, Sample
+
+
+START, END = 0.0, 48 * 1800.0
+
+
+def samples(count: int) -> list[Sample]:
+    """count samples at the same interval between START and END"""
+    rnd = random.Random(count)
+    step = (END - START) / count
+    return [(START + i * step, rnd.uniform(0, 10)) for i in range(count)]
+
+
+class DownsamplerTest(SimpleTestCase):
+    def test_output_size(self):
+        for method, downsampler in DOWNSAMPLERS.items():
+            for count, points in ((1000, 10), (1000, 11), (97, 96), (5000, 1000)):
+                with self.subTest(method=method, count=count, points=points):
+                    found = list(downsampler(START, END, points).process(samples(count)))
+                    self.assertLessEqual(len(found), points)
+                    self.assertGreaterEqual(len(found), points - 1)
+                    self.assertEqual(found, sorted(found))
+
+    def test_small_input_is_unchanged(self):
+        # all the samples in the first buckets
+        bunched = [(START + i, float(i % 3)) for i in range(10)]
+        for method, downsampler in DOWNSAMPLERS.items():
+            for points, values in ((10, bunched), (10, samples(7)), (4, samples(1)), (4, [])):
+                with self.subTest(method=method, points=points, count=len(values)):
+                    self.assertEqual(list(downsampler(START, END, points).process(values)), values)
+
+    def test_lttb_keeps_the_ends(self):
+        values = samples(1000)
+        found = list(LttbDownsampler(START, END, 20).process(values))
+        self.assertEqual(found[0], values[0])
+        self.assertEqual(found[-1], values[-1])
+
+    def test_minmax_keeps_the_peaks(self):
+        values = samples(1000)
+        downsampler = MinMaxDownsampler(START, END, 20)
+        found = list(downsampler.process(values))
+
+        buckets = {}
+        for t, y in values:
+            buckets.setdefault(downsampler.bucket(t), []).append(y)
+        kept = {}
+        for t, y in found:
+            kept.setdefault(downsampler.bucket(t), []).append(y)
+        self.assertEqual(kept.keys(), buckets.keys())
+        for bucket, ys in buckets.items():
+            with self.subTest(bucket=bucket):
+                self.assertEqual(sorted(kept[bucket]), sorted({min(ys), max(ys)}))
+
+    def test_points(self):
+        for downsampler in DOWNSAMPLERS.values():
+            with self.assertRaises(ValueError):
+                downsampler(START, END, 3)
+            with self.assertRaises(ValueError):
+                downsampler(END, START, 10)
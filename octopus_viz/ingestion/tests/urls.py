@@ -0,0 +1,18 @@
+from django.contrib import admin
+from django.urls import path
+
+from ingestion.views import configuration, graphs, home
+
+
+# the pages of the menu and the admin (ingestion.urls also routes a view that is not in the tree)
+urlpatterns = [
+    path('', home.HomeView.as_view(), name='home'),
+    path('monthly/', graphs.MonthlyConsumptionGraphView.as_view(), name='monthly_consumption_graph'),
+    path('tariff/', graphs.MonthlyTariffGraphView.as_view(), name='monthly_tariff_graph'),
+    path('timeseries/', graphs.TimeSeriesGraphView.as_view(), name='timeseries_graph'),
+    path('monthly_data/', graphs.MonthlyGraphData.as_view(), name='monthly_graph_data'),
+    path('tariff_data/', graphs.TariffGraphData.as_view(), name='tariff_graph_data'),
+    path('timeseries_data/', graphs.TimeSeriesGraphData.as_view(), name='timeseries_graph_data'),
+    path('config/new_flux', configuration.AddOctopusTariffView.as_view(), name='add_new_flux_form'),
+    path('admin/', admin.site.urls),
+]
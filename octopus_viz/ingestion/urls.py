@@ -11,9 +11,11 @@ urlpatterns = [
     path('', home.HomeView.as_view(), name='home'),
     path('monthly/', graphs.MonthlyConsumptionGraphView.as_view(), name='monthly_consumption_graph'),
     path('tariff/', graphs.MonthlyTariffGraphView.as_view(), name='monthly_tariff_graph'),
+    path('timeseries/', graphs.TimeSeriesGraphView.as_view(), name='timeseries_graph'),
     # data calls
     path('monthly_data/', graphs.MonthlyGraphData.as_view(), name='monthly_graph_data'),
     path('tariff_data/', graphs.TariffGraphData.as_view(), name='tariff_graph_data'),
+    path('timeseries_data/', graphs.TimeSeriesGraphData.as_view(), name='timeseries_graph_data'),
     # configuration forms
     path('config/new_flux', configuration.AddOctopusTariffView.as_view(), name='add_new_flux_form'),
     path('config/new_flux/process', configuration.ProcessOctopusTariffView.as_view(), name='process_new_flux_form'),
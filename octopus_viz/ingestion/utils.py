@@ -1,3 +1,9 @@
+import itertools
+from collections.abc import Iterable
+from typing import TypeVar
+
+T = TypeVar('T')
+
 # TODO(tr) Use an actual package like babel or something from django to handle other currencies
 _currencies = {
     'GBP': ['£'],
@@ -23,3 +29,10 @@ def format_currency(value: float, currency: str) -> str:
     if currency in _symbol_as_suffix:
         return f'{amount}{symbol}'
     return f'{symbol}{amount}'
+
+
+def in_batches(iterable: Iterable[T], size: int) -> Iterable[list[T]]:
+    """Split iterable into lists of at most size elements, without consuming it all first"""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
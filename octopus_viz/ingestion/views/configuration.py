@@ -9,6 +9,7 @@ from django.utils.translation import gettext as _
 from ingestion import models
 from ingestion.forms.configuration import NewFluxTariffForm
 from ingestion.management.tariff_management import add_new_flux_tariff, finish_current_tariff
+from ingestion.views.home import HealthSnapshot
 from ingestion.views.utils import TariffCardsFactory
 
 logger = logging.getLogger(__name__)
@@ -52,5 +53,6 @@ class ProcessOctopusTariffView(View):
 
             logger.info('Reassigning rows to new tariff')
             models.UpdateConsumption(logger).gather_and_update_rows(True)
+            HealthSnapshot.invalidate()
 
         return redirect(urls.reverse('add_new_flux_form'))
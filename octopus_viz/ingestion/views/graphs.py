@@ -1,19 +1,29 @@
 import abc
-from datetime import date
+from datetime import date, datetime
 
 from django import urls
 from django.db.models import QuerySet
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views import View
 from django.utils.translation import gettext as _
 
 from ingestion import models
-from ingestion.aggregator.consumption import PeriodAggregator, ConsumptionAggregator, TariffAggregator
-from ingestion.forms.graphs import MonthlyGraphForm
+from ingestion.aggregator.consumption import ConsumptionAggregator, NetAggregator
+from ingestion.aggregator.sql import SqlPeriodAggregator, SqlTariffAggregator
+from ingestion.aggregator.timeseries import Sample, TimeSeries
+from ingestion.forms.graphs import MonthlyGraphForm, TimeSeriesGraphForm
+from ingestion.graph_cache import GraphCache, next_month
+from ingestion.views.payload import Column, GraphPayload
 
 
 class GraphDataView(abc.ABC):
+    # name of the view in the graph cache
+    cache_name: str
+
     def _plotly_layout(self, *, ylabel: str) -> dict:
         """Build the layout part of the plotly element.
 
@@ -33,98 +43,111 @@ class GraphDataView(abc.ABC):
         Expected to be handled as the response part of an ajax request:
         `Plotly.newPlot('id', [data], layout);`
 
-        Note: the response from this endpoint returns data as a list of data elements.
+        Note: the response from this endpoint returns data as a list of data elements. The columns
+        are turned into the customdata of the points by the page, earliest and latest are seconds
+        since epoch (see `GraphPayload`).
         """
-        x_axis = []
-        y_axis = []
-        custom_data = []
-
-        for key in sorted(agg.data.keys()):
-            x_axis.append(key)
-            row = agg.data[key]
-            custom_data.append(row.as_dict())
-
-            if show_price:
-                y_axis.append(f'{row.price:.4f}')
-            else:
-                y_axis.append(f'{row.consumption:.4f}')
+        keys = sorted(agg.data.keys())
+        rows = [agg.data[key] for key in keys]
+        consumption = Column(row.consumption for row in rows)
+        price = Column(row.price for row in rows)
 
         # See plot.js documentation
         return {
-            'x': x_axis,
-            'y': y_axis,
+            'x': keys,
+            'y': price if show_price else consumption,
             # fmt: off
             'name': label,
             # fmt: on
             'type': 'bar',
             'hovertemplate': (
-                f'%{{x}}: %{{customdata.consumption:0.2f}} %{{customdata.metric_unit}}<br>'
-                f'{label}: %{{customdata.price:0.2f}} %{{customdata.currency}}<br>'
+                f'%{{x}}: %{{customdata.consumption:0.2f}} {agg.metric_unit or ""}<br>'
+                f'{label}: %{{customdata.price:0.2f}} {agg.currency or ""}<br>'
                 f'period: %{{customdata.earliest|%Y-%m-%d}} to %{{customdata.latest|%Y-%m-%d}}'
             ),
-            'customdata': custom_data,
+            'columns': {
+                'consumption': consumption,
+                'price': price,
+                'earliest': Column((row.earliest.timestamp() for row in rows), dtype='f8', digits=None),
+                'latest': Column((row.latest.timestamp() for row in rows), dtype='f8', digits=None),
+            },
         }
 
     @classmethod
     def _info_data(cls, agg: ConsumptionAggregator, *, label: str):
         """Used to build the table info on the page.
 
-        Expected to be used to build the content of a table as part of the ajax response.
+        Expected to be used to build the content of a table as part of the ajax response, the units
+        are in the header.
         """
         total_consumption = 0
         total_price = 0
-        # derived from data
-        metric_unit = ''
-        currency = ''
         for entry in agg.data.values():
             total_consumption += entry.consumption
-            total_price += entry.price
-            metric_unit = entry.metric_unit
-            currency = entry.currency
+            total_price += entry.price or 0
 
         return {
             'label': label,
             'total_consumption': f'{total_consumption:>08.4f}',
-            'metric_unit': metric_unit,
             'total_price': f'{total_price:>08.4f}',
-            'currency': currency,
         }
 
     @classmethod
-    def gather_data(cls, start: date, end: date, direction: models.Direction) -> QuerySet:
+    def gather_data(cls, start: date, end: date, direction: models.Direction | None = None) -> QuerySet:
+        """Readings of the direction, or of both directions when None"""
+        directions = [direction] if direction is not None else list(models.Direction)
         return models.Consumption.objects.filter(
             interval_start__gte=start,
             interval_start__lt=end,
-            meter__mpan__direction=direction,
+            meter__mpan__direction__in=directions,
         ).select_related('meter__mpan')
 
+    @classmethod
+    def gather_rollup(cls, start: date, end: date, direction: models.Direction | None = None) -> QuerySet:
+        """Same period as gather_data but read from the rollup (aggregated the same way)"""
+        # IN instead of no filter, so that the (direction, day) index is used
+        directions = [direction] if direction is not None else list(models.Direction)
+        return models.ConsumptionRollup.objects.filter(
+            day__gte=start,
+            day__lt=end,
+            direction__in=directions,
+        ).select_related('meter', 'tariff', 'rate')
+
     @abc.abstractmethod
-    def build_aggregator(self, queryset: QuerySet, **kwargs) -> ConsumptionAggregator: ...
+    def build_aggregators(self, queryset: QuerySet, **kwargs) -> dict[models.Direction, ConsumptionAggregator]:
+        """An aggregator per direction of the rows of queryset, which has both directions"""
+
+    def net_available(self, show_price: bool) -> bool:
+        """Whether the keys of the 2 directions are the same periods, that can be subtracted"""
+        return True
 
     def process_form(self, form: MonthlyGraphForm):
         data = []
         layout = {}
+        header = {}
         import_lbl = _('import')
         export_lbl = _('export')
         info = []
         if form.is_valid():
             start_month: date = form.cleaned_data['month']
             show_price = form.cleaned_data['show_price']
-            if start_month.month < 12:
-                end_month = start_month.replace(month=start_month.month + 1)
-            else:
-                end_month = start_month.replace(month=1, year=start_month.year + 1)
+            end_month = next_month(start_month)
 
             currency = ''
             metric_unit = ''
-            for direction, label in (
-                (models.Direction.IMPORTING, import_lbl),
-                (models.Direction.EXPORTING, export_lbl),
-            ):
-                agg = self.build_aggregator(
-                    self.gather_data(start_month, end_month, direction),
-                    show_price=show_price,
-                )
+            aggregators = self.build_aggregators(
+                self.gather_rollup(start_month, end_month),
+                show_price=show_price,
+            )
+            traces = [
+                (aggregators[models.Direction.IMPORTING], import_lbl),
+                (aggregators[models.Direction.EXPORTING], export_lbl),
+            ]
+            if form.cleaned_data['show_net'] and self.net_available(show_price):
+                net = NetAggregator().subtract(*(agg for agg, _label in traces))
+                traces.append((net, _('net')))
+
+            for agg, label in traces:
                 data.append(
                     self._plotly_data(
                         agg,
@@ -133,34 +156,138 @@ class GraphDataView(abc.ABC):
                     ),
                 )
                 info.append(self._info_data(agg, label=label))
-                currency = agg.currency
-                metric_unit = agg.metric_unit
+                currency = agg.currency or currency
+                metric_unit = agg.metric_unit or metric_unit
 
             layout = self._plotly_layout(ylabel=currency if show_price else metric_unit)
+            header = {'metric_unit': metric_unit, 'currency': currency}
 
         return {
+            'header': header,
             'graph': data,
             'info': info,
             'layout': layout,
         }
 
+    def cached_response(self, request: HttpRequest, form: MonthlyGraphForm) -> HttpResponse:
+        """Response of process_form from the graph cache, revalidated with ETag/Last-Modified"""
+        if not form.is_valid():
+            return GraphPayload.compress(request, GraphPayload.response(request, self.process_form(form)))
+
+        data, etag, last_modified = GraphCache.get_or_compute(
+            f'{self.cache_name}-net' if form.cleaned_data['show_net'] else self.cache_name,
+            form.cleaned_data['month'],
+            form.cleaned_data['show_price'],
+            lambda: self.process_form(form),
+        )
+        etag = quote_etag(etag)
+        last_modified = int(last_modified)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = GraphPayload.response(request, data)
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        # the browser can keep the data but must check it is still the current version
+        patch_cache_control(response, private=True, no_cache=True)
+        return GraphPayload.compress(request, response)
+
 
 class MonthlyGraphData(View, GraphDataView):
-    def build_aggregator(self, queryset: QuerySet, **kwargs) -> PeriodAggregator:
-        return PeriodAggregator().process(queryset)
+    cache_name = 'monthly'
+
+    def build_aggregators(self, queryset: QuerySet, **kwargs) -> dict[models.Direction, ConsumptionAggregator]:
+        return SqlPeriodAggregator.process_directions(queryset)
 
     def get(self, request: HttpRequest):
         form = MonthlyGraphForm(request.GET)
-        return JsonResponse(self.process_form(form))
+        return self.cached_response(request, form)
 
 
 class TariffGraphData(View, GraphDataView):
-    def build_aggregator(self, queryset: QuerySet, *, show_price, **kwargs) -> ConsumptionAggregator:
-        return TariffAggregator(by_price=show_price).process(queryset)
+    cache_name = 'tariff'
+
+    def build_aggregators(
+        self,
+        queryset: QuerySet,
+        *,
+        show_price,
+        **kwargs,
+    ) -> dict[models.Direction, ConsumptionAggregator]:
+        return SqlTariffAggregator.process_directions(queryset, by_price=show_price)
+
+    def net_available(self, show_price: bool) -> bool:
+        # the unit rates of the import and of the export are not the same
+        return not show_price
 
     def get(self, request: HttpRequest):
         form = MonthlyGraphForm(request.GET)
-        return JsonResponse(self.process_form(form))
+        return self.cached_response(request, form)
+
+
+class TimeSeriesGraphData(View):
+    """A line per direction over any period, downsampled by the server to the points requested"""
+
+    @classmethod
+    def _plotly_data(cls, samples: list[Sample], *, label: str, unit: str) -> dict:
+        tz = timezone.get_current_timezone()
+        return {
+            # minutes of the local time read as UTC, multiplied by x_scale into the milliseconds of
+            # plotly which shows the dates in UTC
+            'x': Column(
+                (int(t + datetime.fromtimestamp(t, tz).utcoffset().total_seconds()) // 60 for t, _ in samples),
+                dtype='i4',
+                digits=None,
+            ),
+            'x_scale': 60_000,
+            'y': Column(y for _, y in samples),
+            'name': label,
+            'type': 'scattergl',
+            'mode': 'lines',
+            'hovertemplate': f'%{{x}}: %{{y:0.2f}} {unit}',
+        }
+
+    @classmethod
+    def _info_data(cls, series: TimeSeries, *, label: str) -> dict:
+        return {
+            'label': label,
+            'total_consumption': f'{series.total_consumption:>08.4f}',
+            'total_price': f'{series.total_price:>08.4f}',
+        }
+
+    def process_form(self, form: TimeSeriesGraphForm) -> dict:
+        data = []
+        info = []
+        layout = {}
+        header = {}
+        if form.is_valid():
+            show_price = form.cleaned_data['show_price']
+            unit = metric_unit = currency = ''
+            resolution = models.Resolution.HALF_HOUR
+            for direction, label in (
+                (models.Direction.IMPORTING, _('import')),
+                (models.Direction.EXPORTING, _('export')),
+            ):
+                series = TimeSeries(direction, form.cleaned_data['start'], form.cleaned_data['end'], show_price)
+                samples = series.downsample(form.cleaned_data['points'], form.cleaned_data['method'])
+                metric_unit, currency = series.metric_unit(), series.currency()
+                unit = currency if show_price else metric_unit
+                resolution = series.resolution
+                data.append(self._plotly_data(samples, label=label, unit=unit))
+                info.append(self._info_data(series, label=label))
+            header = {'metric_unit': metric_unit, 'currency': currency, 'resolution': resolution.label}
+            # the values are the sums of the buckets of the level read
+            layout = {'yaxis': {'title': f'{unit} / {resolution.label}'}, 'xaxis': {'type': 'date'}}
+
+        return {
+            'header': header,
+            'graph': data,
+            'info': info,
+            'layout': layout,
+        }
+
+    def get(self, request: HttpRequest):
+        form = TimeSeriesGraphForm(request.GET)
+        return GraphPayload.compress(request, GraphPayload.response(request, self.process_form(form)))
 
 
 class MonthlyConsumptionGraphView(View):
@@ -187,3 +314,16 @@ class MonthlyTariffGraphView(View):
                 'data_url': urls.reverse('tariff_graph_data'),
             },
         )
+
+
+class TimeSeriesGraphView(View):
+    def get(self, request: HttpRequest):
+        form = TimeSeriesGraphForm()
+        return render(
+            request,
+            'ingestion/monthly_graph.html',
+            context={
+                'form': form,
+                'data_url': urls.reverse('timeseries_graph_data'),
+            },
+        )
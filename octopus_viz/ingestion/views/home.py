@@ -1,36 +1,94 @@
+import dataclasses
 import logging
-from datetime import timedelta
-from typing import Iterable
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import ClassVar, Self
 
 from django import urls
 from django.conf import settings
-from django.db.models import Max
+from django.db.models import F, QuerySet, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext as _, ngettext
 from django.views.generic import TemplateView
 
 from ingestion import models
-from ingestion.views.utils import TariffCardsFactory, CardInfo
+from ingestion.health_cache import HealthCache
+from ingestion.views.utils import TariffCardsFactory, TariffsByDirection, CardInfo
 
 logger = logging.getLogger(__name__)
 
 
+@dataclasses.dataclass
+class HealthSnapshot:
+    """What the home page checks, gathered with a few queries (the readings are not counted, their
+    counters are read) and cached for a short time.
+
+    The cards are built from it on each request, so they are translated in the language of the
+    request.
+    """
+
+    CACHE_KEY: ClassVar[str] = HealthCache.CACHE_KEY
+
+    # (meter name, interval_start of its last reading) of the meters with readings
+    last_entries: list[tuple[str, datetime]]
+    detached_rows: int
+    mpan_without_api_key: int
+    mpan_without_meter: int
+    tariffs: TariffsByDirection
+
+    @classmethod
+    def last_entries_query(cls) -> QuerySet:
+        return (
+            models.Meter.objects
+            .select_related('mpan')
+            .annotate(
+                last_loaded=F('counters__last_interval_start'),
+                detached_rows=Coalesce('counters__detached', Value(0)),
+            )
+            .order_by('id')
+        )
+
+    @classmethod
+    def gather(cls) -> Self:
+        meters = list(cls.last_entries_query())
+        mpan_counts = models.MpanFilters.configuration_counts()
+        return cls(
+            last_entries=[(str(meter), meter.last_loaded) for meter in meters if meter.last_loaded is not None],
+            detached_rows=sum(meter.detached_rows for meter in meters),
+            mpan_without_api_key=mpan_counts['without_api_key'],
+            mpan_without_meter=mpan_counts['without_meter'],
+            tariffs=models.TariffFilters.current_and_last_tariffs(models.EnergyType.ELECTRICITY),
+        )
+
+    @classmethod
+    def get(cls) -> Self:
+        timeout = getattr(settings, 'OCTOPUS_HEALTH_SNAPSHOT_SECONDS', 30)
+        if not timeout:
+            return cls.gather()
+        return HealthCache.cache().get_or_set(cls.CACHE_KEY, cls.gather, timeout)
+
+    @classmethod
+    def invalidate(cls):
+        HealthCache.invalidate()
+
+
 class HomeView(TemplateView):
     template_name = 'ingestion/index.html'
 
-    def _last_entry_card(self) -> Iterable[CardInfo]:
-        last_entries = models.Consumption.objects.values('meter_id').annotate(
-            last_loaded=Max('interval_start'),
-        )
+    @classmethod
+    def last_entries(cls) -> QuerySet:
+        return HealthSnapshot.last_entries_query()
+
+    def _last_entry_card(self, snapshot: HealthSnapshot) -> Iterable[CardInfo]:
         outdated_meters = 0
         threshold = timedelta(days=settings.OFFER_DATA_DOWNLOAD_AFTER_DAYS)
-        for row in last_entries:
-            meter_name = str(models.Meter.objects.get(id=row['meter_id']))
-            when = row['last_loaded'].date().isoformat()
+        for meter_name, last_loaded in snapshot.last_entries:
+            when = last_loaded.date().isoformat()
             card = CardInfo(
                 _('Last entry for %(meter)s was on %(when)s') % dict(meter=meter_name, when=when),
             )
-            if timezone.now() - row['last_loaded'] >= threshold:
+            if timezone.now() - last_loaded >= threshold:
                 outdated_meters += 1
                 yield card.as_warning()
             else:
@@ -54,17 +112,17 @@ class HomeView(TemplateView):
                 .as_warning()
             )
 
-    def _consumption_cards(self) -> Iterable[CardInfo]:
-        detached_consumption = models.UpdateConsumption.gather_detached_rows(models.Consumption.objects).count()
+    def _consumption_cards(self, snapshot: HealthSnapshot) -> Iterable[CardInfo]:
+        detached_consumption = snapshot.detached_rows
         if detached_consumption == 0:
             yield CardInfo(_('Found no detached consumption entries')).as_success()
         else:
             # TODO(tr) If admin add link to get data from octopus?
             yield CardInfo(_('Found %(count)d detached entries') % dict(count=detached_consumption)).as_warning()
 
-    def _mpan_cards(self) -> Iterable[CardInfo]:
-        no_api_mpan = models.MpanFilters.mpan_without_api_key().count()
-        no_meter_mpan = models.MpanFilters.mpan_without_meter().count()
+    def _mpan_cards(self, snapshot: HealthSnapshot) -> Iterable[CardInfo]:
+        no_api_mpan = snapshot.mpan_without_api_key
+        no_meter_mpan = snapshot.mpan_without_meter
         if no_api_mpan == 0 and no_meter_mpan == 0:
             yield CardInfo(_('MPAN configuration verified')).as_success()
         else:
@@ -77,10 +135,11 @@ class HomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cards: list[CardInfo] = list(self._last_entry_card())
-        cards.extend(self._consumption_cards())
-        cards.extend(self._mpan_cards())
-        cards.extend(TariffCardsFactory.electricity_tariff_cards())
+        snapshot = HealthSnapshot.get()
+        cards: list[CardInfo] = list(self._last_entry_card(snapshot))
+        cards.extend(self._consumption_cards(snapshot))
+        cards.extend(self._mpan_cards(snapshot))
+        cards.extend(TariffCardsFactory.electricity_tariff_cards(snapshot.tariffs))
 
         context.update({
             'title': _('Data Visualisation'),
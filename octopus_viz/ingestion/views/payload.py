@@ -0,0 +1,157 @@
+import array
+import base64
+import json
+import math
+import sys
+from collections.abc import Iterable
+from typing import Any, ClassVar
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the standard json module is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency, only gzip is offered without it
+    brotli = None
+
+
+class Column(list):  # noqa: FURB189 - a list subclass is encoded as a list by json and orjson
+    """Numbers of a column of a graph payload, sent as a JSON list or as a typed array.
+
+    dtype is the typed array used by `GraphPayload.typed`: 'f4' is enough for the plotted values,
+    the times need 'f8' or 'i4' (whole minutes). The values are rounded to digits decimals, which
+    keeps the JSON lists short. None is sent as null in a list and as NaN in a typed array.
+    """
+
+    # array typecodes of the dtypes
+    TYPECODES: ClassVar[dict[str, str]] = {'f4': 'f', 'f8': 'd', 'i4': 'i'}
+
+    def __init__(self, values: Iterable[float | None] = (), dtype: str = 'f4', digits: int | None = 4):
+        if digits is not None:
+            values = (None if v is None else round(v, digits) for v in values)
+        super().__init__(values)
+        self.dtype = dtype
+
+    def typed_array(self) -> dict:
+        """Base64 typed array, as understood by plotly.js: `{'dtype': 'f4', 'bdata': '...'}`"""
+        values = array.array(self.TYPECODES[self.dtype], (math.nan if v is None else v for v in self))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return {'dtype': self.dtype, 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+class GraphPayload:
+    """Encoding of the graph responses.
+
+    The traces hold `Column`s of numbers instead of a dict per point, the units are in a header
+    shared by the traces. The columns are sent as typed arrays when binary is asked (`?binary=1`):
+    smaller, but they compress worse than the JSON lists so the page asks for the lists. The JSON
+    is encoded with orjson when it is installed and compressed with brotli (when installed) or
+    gzip, as accepted by the browser.
+    """
+
+    # smaller contents are not worth compressing
+    MIN_COMPRESS_SIZE = 200
+    BROTLI_QUALITY = 5
+    # offered in this order of preference
+    ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    @classmethod
+    def typed(cls, data: Any) -> Any:
+        """data with its columns replaced by typed arrays"""
+        if isinstance(data, Column):
+            return data.typed_array()
+        if isinstance(data, dict):
+            return {key: cls.typed(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [cls.typed(value) for value in data]
+        return data
+
+    @classmethod
+    def dumps(cls, data: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), allow_nan=False).encode()
+
+    @classmethod
+    def wants_binary(cls, request: HttpRequest) -> bool:
+        return request.GET.get('binary') in ('1', 'true')
+
+    @classmethod
+    def accepted_encodings(cls, accept_encoding: str) -> dict[str, float]:
+        """Quality of each encoding of an Accept-Encoding header"""
+        accepted = {}
+        for item in accept_encoding.split(','):
+            name, _, params = item.partition(';')
+            name = name.strip().lower()
+            if not name:
+                continue
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name] = quality
+        return accepted
+
+    @classmethod
+    def encoding(cls, request: HttpRequest) -> str | None:
+        """The best encoding accepted by the request, None for no compression"""
+        accepted = cls.accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for name in cls.ENCODINGS:
+            if accepted.get(name, accepted.get('*', 0.0)) > 0:
+                return name
+        return None
+
+    @classmethod
+    def compress_content(cls, content: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(content, quality=cls.BROTLI_QUALITY)
+        return compress_string(content)
+
+    @classmethod
+    def weaken_etag(cls, response: HttpResponse):
+        # like GZipMiddleware: the compressed content is not byte for byte the entity tagged
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = f'W/{etag}'
+
+    @classmethod
+    def compress(cls, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        """Compress the content of response if the request accepts it, to be called last"""
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.status_code == 304:
+            # same ETag as the compressed content it revalidates
+            if cls.encoding(request) is not None:
+                cls.weaken_etag(response)
+            return response
+        if response.has_header('Content-Encoding') or len(response.content) < cls.MIN_COMPRESS_SIZE:
+            return response
+        encoding = cls.encoding(request)
+        if encoding is None:
+            return response
+        content = cls.compress_content(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(content))
+        cls.weaken_etag(response)
+        return response
+
+    @classmethod
+    def response(cls, request: HttpRequest, data: dict) -> HttpResponse:
+        """The JSON response of data, not compressed yet: see `compress()`"""
+        if cls.wants_binary(request):
+            data = cls.typed(data)
+        return HttpResponse(cls.dumps(data), content_type='application/json')
@@ -5,6 +5,8 @@ from ingestion import models
 
 from django.utils.translation import gettext as _
 
+TariffsByDirection = dict[models.Direction, tuple[models.Tariff | None, models.Tariff | None]]
+
 
 @dataclasses.dataclass
 class CardInfo:
@@ -36,15 +38,12 @@ class TariffCardsFactory:
         return _('until %(until)s') % dict(until=tariff.valid_until)
 
     @classmethod
-    def electricity_tariff_cards(cls) -> Iterable[CardInfo]:
-        current_export_tariff = models.TariffFilters.current_tariff(
-            models.Direction.EXPORTING,
-            models.EnergyType.ELECTRICITY,
-        )
-        current_import_tariff = models.TariffFilters.current_tariff(
-            models.Direction.IMPORTING,
-            models.EnergyType.ELECTRICITY,
-        )
+    def electricity_tariff_cards(cls, tariffs: TariffsByDirection | None = None) -> Iterable[CardInfo]:
+        """Cards of the current (or last) tariffs, from `TariffFilters.current_and_last_tariffs`"""
+        if tariffs is None:
+            tariffs = models.TariffFilters.current_and_last_tariffs(models.EnergyType.ELECTRICITY)
+        current_export_tariff, last_export_tariff = tariffs[models.Direction.EXPORTING]
+        current_import_tariff, last_import_tariff = tariffs[models.Direction.IMPORTING]
 
         if current_export_tariff is not None:
             yield CardInfo(
@@ -55,10 +54,6 @@ class TariffCardsFactory:
                 ),
             ).as_success()
         else:
-            last_export_tariff = models.TariffFilters.last_tariff(
-                models.Direction.EXPORTING,
-                models.EnergyType.ELECTRICITY,
-            )
             if last_export_tariff is not None:
                 card_message = _(
                     'Did not find any exporting tariff active today. '
@@ -80,10 +75,6 @@ class TariffCardsFactory:
                 ),
             ).as_success()
         else:
-            last_import_tariff = models.TariffFilters.last_tariff(
-                models.Direction.IMPORTING,
-                models.EnergyType.ELECTRICITY,
-            )
             if last_import_tariff is not None:
                 card_message = _(
                     'Did not find any importing tariff active today. '
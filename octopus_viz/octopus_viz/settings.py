@@ -97,6 +97,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # shared with the management commands so the ingestion invalidates the graphs of the server
+    'graphs': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'graphs',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,3 +159,22 @@ LOGGING = {'version': 1, 'disable_existing_loggers': False, 'root': {'handler':
 # octopus viz settings
 
 OFFER_DATA_DOWNLOAD_AFTER_DAYS = 7
+
+# Point it to a local server to test the ingestion without connecting to Octopus
+OCTOPUS_API_URL = 'https://api.octopus.energy/v1'
+
+# Connections kept open per API key (at least --max-requests-per-key of data_ingestion)
+OCTOPUS_HTTP_POOL_SIZE = 10
+# Transient errors (429, 5xx, connection errors) are retried that many times, waiting an
+# exponential backoff with jitter from OCTOPUS_HTTP_BACKOFF_SECONDS, or the Retry-After of the
+# response, at most OCTOPUS_HTTP_MAX_BACKOFF_SECONDS
+OCTOPUS_HTTP_RETRIES = 5
+OCTOPUS_HTTP_BACKOFF_SECONDS = 0.5
+OCTOPUS_HTTP_MAX_BACKOFF_SECONDS = 60
+
+# Cache of the graph data (see CACHES)
+# a local memory cache only works if the ingestion runs in the server process
+OCTOPUS_GRAPH_CACHE = 'graphs'
+
+# Seconds the checks of the home page are cached for (per process), 0 to check on every request
+OCTOPUS_HEALTH_SNAPSHOT_SECONDS = 30